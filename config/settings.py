@@ -58,6 +58,94 @@ CHANNEL_LAYERS = {
     },
     
 }
+
+# 실시간 시세(KIS WebSocket) 틱 검증 모드
+# off: 디코딩된 틱을 DRF 검증 없이 바로 전송 (기본)
+# sample: N건 중 1건만 DRF 검증 후 실패 로그, all: 전수 검증 후 실패 틱 폐기 (디버그용)
+KIS_REALTIME_VALIDATION = 'off'
+KIS_REALTIME_VALIDATION_SAMPLE_RATE = 100
+
+# 종목/스트림(호가, 체결)별 최신 상태만 모아서 전송하는 주기 (ms, 0 이면 틱마다 즉시 전송)
+KIS_REALTIME_CONFLATION_MS = 100
+
+# 변경 필드(delta)만 보내다가 스트림별로 N건마다 전체 스냅샷(keyframe) 전송
+KIS_REALTIME_KEYFRAME_INTERVAL = 50
+
+# 틱 publisher 에서 미리 인코딩해 붙여 보낼 포맷 (Consumer 는 시청자 수와 무관하게 그대로 전달만 함)
+KIS_REALTIME_PREENCODE_FORMATS = ['json', 'array']
+
+# 구독 시 {"profile": "<이름>"} 으로 요청할 수 있는 필드 프로필 추가 / 변경 (기본 heatmap, ticker 는 wire_format.FIELD_PROFILES)
+# 예: {'chart': {'exec': ['STCK_PRPR', 'CNTG_VOL']}}
+KIS_REALTIME_FIELD_PROFILES = {}
+
+# 테마별 집계(평균/거래대금 가중 등락률, 상승/하락 종목 수, 주도주)를 theme_global 그룹으로 전송하는 주기 (ms, 0 이면 비활성)
+# 체결 틱으로 증분 갱신하고, 주기마다 바뀐 테마만 theme_update 프레임으로 보냄 (KIS 피드를 가진 프로세스 1곳에서 실행:
+# ingest 모드면 run_kis_ingest). 구독 시 {"theme_aggregates": true} 를 보낸 연결에만 전달
+THEME_AGGREGATE_INTERVAL_MS = 500
+
+# 종목별 마지막 체결/호가 스냅샷(Last Value Cache)을 Redis 캐시에 기록하는 주기(초)와 보관 시간(초)
+# 신규 구독자 즉시 스냅샷 전송 + 장중 히트맵 초기 가격에 사용
+KIS_LVC_FLUSH_SEC = 1.0
+KIS_LVC_TTL_SEC = 60 * 60 * 12
+
+# 호가창 스냅샷을 캐시에 기록하는 주기(초). ingest 모드에서 웹 워커의 호가창 API 가 이 값을 조회 (0 이면 기록 안 함)
+KIS_ORDER_BOOK_FLUSH_SEC = 1.0
+
+# 1초/1분/5분봉을 캐시에 기록하는 주기(초, 0 이면 기록 안 함)와 프로세스당 봉을 유지하는 최대 종목 수
+# 봉은 KIS 등록 해제와 무관하게 당일 유지하며, 최대 종목 수를 넘으면 가장 오래 체결이 없던 종목부터 정리
+KIS_CANDLE_FLUSH_SEC = 5.0
+KIS_CANDLE_MAX_CODES = 1000
+
+# KIS 실시간 웹소켓 주소 (None 이면 실서버). 부하 테스트 시 `python manage.py run_kis_replay` 주소로 지정
+# KIS_WS_APPROVAL_KEY 를 지정하면 approval key 발급 API 를 호출하지 않음 (리플레이 서버는 아무 값이나 허용)
+KIS_WS_BASE_URL = None
+KIS_WS_APPROVAL_KEY = None
+
+# KIS 웹소켓 세션당 실시간 등록 한도 (종목 1개 = 호가 + 체결 2슬롯)
+# 시청자 0명이 된 종목은 linger 초 동안 유지 후 해제(tr_type=2), 한도 도달 시 가장 오래 전에 시청된 종목부터 해제
+KIS_WS_MAX_REGISTRATIONS = 41
+KIS_WS_UNSUBSCRIBE_LINGER_SEC = 30
+
+# KIS 실시간 등록/해제 패킷 전송 속도 (세션별 토큰 버킷: 초당 RATE 개, 최대 BURST 개까지 연속 전송)
+# 히트맵처럼 수십 종목을 한 번에 구독해도 패킷을 일정 속도로 흘려보냄 (0 이면 제한 없음)
+KIS_WS_REGISTRATION_RATE = 20
+KIS_WS_REGISTRATION_BURST = 20
+
+# KIS 웹소켓 세션 풀: .env 의 앱키(g_appkey, g_appkey_2, ...) 1개당 세션 1개 (0 이면 등록된 앱키 전부 사용)
+# 종목 배정 방식 hash(일관 해싱, 여유 슬롯 없으면 다음 세션) / least_load(시청 슬롯이 가장 적은 세션)
+KIS_WS_MAX_SESSIONS = 0
+KIS_WS_SESSION_STRATEGY = 'hash'
+
+# KIS 수신 프레임 처리 태스크 수 / 태스크별 큐 크기 (가득 차면 프레임을 버리고 dropped 카운트 증가)
+KIS_RECV_WORKERS = 2
+KIS_RECV_QUEUE_SIZE = 5000
+
+# KIS 수신 원문 프레임 저널 디렉터리 (일자/세션별 .kisj 세그먼트, None 이면 기록 안 함)
+# 버퍼에 모아 N초마다 파일에 기록. 재생은 stock_price.services.tick_journal.TickJournalReader
+KIS_JOURNAL_DIR = None
+KIS_JOURNAL_FLUSH_SEC = 1.0
+
+# True: KIS 연결은 `python manage.py run_kis_ingest` 프로세스 1개가 전담하고,
+# 웹 워커는 채널 레이어로 구독/해제 intent 와 heartbeat(N초 주기)만 보냄 (워커 수만큼 KIS 중복 등록 방지)
+# False: 기존처럼 각 웹 프로세스가 직접 KIS 에 연결 (runserver 개발용)
+KIS_REALTIME_INGEST = False
+KIS_INGEST_HEARTBEAT_SEC = 10
+
+# /metrics (및 run_kis_ingest --metrics-port) 스크레이프를 허용할 주소 (IP 또는 CIDR, None 이면 제한 없음)
+# 목록 밖의 주소는 staff 로그인 사용자만 /metrics 조회 가능. 리버스 프록시 뒤라면 REMOTE_ADDR 기준이므로 프록시 설정 확인
+METRICS_ALLOWED_IPS = ["127.0.0.1", "::1"]
+
+# 브라우저 웹소켓 송신 버퍼: 연결당 대기 항목 수 (종목별로 최신 값만 유지, 넘치면 가장 오래된 항목 버림)
+# 한 번에 모아 보낸 배치 전송이 WS_SLOW_SEND_SEC 이상 3회 연속이면 전송 간격을 WS_SLOW_DOWNGRADE_INTERVAL_SEC 로 낮추고,
+# 낮춘 뒤에도 배치 전송이 WS_SLOW_DISCONNECT_SEC 이상 걸리면 연결 종료 (close code 4008)
+WS_OUTBOUND_MAX_ENTRIES = 256
+WS_SLOW_SEND_SEC = 0.5
+WS_SLOW_DOWNGRADE_INTERVAL_SEC = 1.0
+WS_SLOW_DISCONNECT_SEC = 10.0
+
+# watchlist 모드({"mode": "watchlist"}) 전송 간격(ms): 구독 종목 중 바뀐 종목만 모아 간격마다 프레임 1개로 전송
+WS_WATCHLIST_INTERVAL_MS = 250
+
 MIDDLEWARE = [
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
@@ -17,11 +17,13 @@ Including another URLconf
 from django.contrib import admin
 from django.urls import path, include
 from django.views.generic import RedirectView
+from stock_price.views import MetricsView
 
 urlpatterns = [
     path('admin/', admin.site.urls),
     path('stock_price/', include('stock_price.urls')),
     path('theme/', include('stock_theme.urls')),
+    path('metrics', MetricsView.as_view(), name='metrics'),
     path('', RedirectView.as_view(url='/theme/heatmap/', permanent=False)),
 
 ]
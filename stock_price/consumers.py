@@ -1,95 +1,365 @@
 import json
-import re
+import time
+import asyncio
 from channels.generic.websocket import AsyncWebsocketConsumer
-from .services.kis_ws_client import kis_client
+from django.conf import settings
+from .services.kis_ingest import realtime_feed
+from .services import wire_format
+from .services.local_hub import local_hub
+from .services.last_value_cache import lvc
+from .services.latency import latency, STAGE_SEND
+from .services.metrics import consumers_connected
+from .services.outbound_buffer import OutboundBuffer, merge_stock_events, merge_theme_updates, ACTION_DISCONNECT
+from .services.topics import expand_topics, group_by_code
 
 class StockConsumer(AsyncWebsocketConsumer):
     _logged_stocks = set() # 최초 1회 로그 출력 여부 확인용
+    outbox = None  # 송신 버퍼 (connect 전에는 없음 -> 바로 전송)
+    field_profile = None  # 전송 필드 프로필 (None: 전체 필드)
+    watchlist = False  # True: 바뀐 종목을 모아 일정 간격마다 프레임 1개로 전송
+    theme_aggregates = False  # True: 테마 집계(theme_update aggregates) 수신 (구독 시 opt-in)
 
     async def connect(self):
-        self.subscribed_stocks = set()
+        self.subscribed_topics = set()  # 구독 토픽 (exec:005930 / book:005930)
+        self.stream_seqs = {}  # (종목, 스트림) -> 마지막으로 보낸 seq
+        self.wire_format = wire_format.FORMAT_JSON
+        self.candle_intervals = set()  # 봉 마감 알림을 받을 봉 단위 (예: {"1m"})
         
         # URL에서 stock_code 추출 (Optional)
         self.url_stock_code = self.scope['url_route']['kwargs'].get('stock_code')
         
         await self.accept()
+        consumers_connected.inc()
+
+        # 틱은 연결별 송신 버퍼를 거쳐 별도 태스크가 전송 (느린 브라우저가 LocalHub 전달을 막지 않도록)
+        self.outbox = OutboundBuffer()
+        self._writer = asyncio.create_task(self._write_loop())
         print(f"[StockConsumer] Client connected. URL Code: {self.url_stock_code}")
 
         # 1. Global Group Join (For Theme Updates)
         await self.channel_layer.group_add("theme_global", self.channel_name)
 
-        # URL에 코드가 있으면 즉시 구독 (Legacy/Detail Page)
+        # URL에 코드가 있으면 즉시 구독 (Legacy/Detail Page, 체결 + 호가)
         if self.url_stock_code:
-            await self.add_subscription(self.url_stock_code)
+            await self.add_subscriptions([self.url_stock_code])
 
     async def receive(self, text_data):
         text_data_json = json.loads(text_data)
         message_type = text_data_json.get('type')
         data = text_data_json.get('data')
 
-        if message_type == 'subscribe' and data:
-            codes = data.get('codes', [])
+        if message_type == 'subscribe':
+            # {"type": "subscribe", "data": {"topics": ["exec:005930", "book:005930", ...]}}
+            # {"type": "subscribe", "data": {"codes": [...]}} 또는 {"type": "subscribe", "code": "005930"} 는 체결 + 호가
+            payload = data if isinstance(data, dict) else text_data_json
+            codes = payload.get('topics') or payload.get('codes') or payload.get('code') or []
             if isinstance(codes, str):
                 codes = [codes]
-            
-            for code in codes:
-                await self.add_subscription(code)
 
-    async def add_subscription(self, code):
-        clean_code = re.sub(r'[^0-9]', '', str(code))
-        if not clean_code: 
-            return
+            # 필드 프로필 ({"profile": "heatmap"} 또는 {"fields": ["STCK_PRPR", ...]}). 없으면 기존 설정 유지
+            if payload.get('fields') or payload.get('profile'):
+                await self.set_field_profile(payload.get('fields') or payload['profile'])
+
+            # compact 포맷 협상 (array / msgpack). 기본은 JSON
+            if payload.get('format'):
+                await self.set_wire_format(payload['format'])
+
+            # 전송 모드: stream(기본, 틱마다) / watchlist(바뀐 종목을 모아 간격마다 프레임 1개)
+            if payload.get('mode'):
+                self.set_mode(payload['mode'])
+
+            # 테마 집계 수신 여부 ({"theme_aggregates": true}), 없으면 기존 설정 유지
+            if payload.get('theme_aggregates') is not None:
+                self.theme_aggregates = bool(payload['theme_aggregates'])
+
+            # 봉 마감 알림 구독 ({"candles": ["1m", "5m"]}), 없으면 기존 구독 유지
+            if payload.get('candles') is not None:
+                intervals = payload['candles']
+                self.candle_intervals = {intervals} if isinstance(intervals, str) else set(intervals)
+
+            # 여러 종목을 한 번에 구독 (KIS 등록 패킷은 일괄 예약 후 pacer 로 전송, 완료되면 한 번에 응답)
+            await self.add_subscriptions(codes, ack=True)
 
-        if clean_code in self.subscribed_stocks:
+    async def set_wire_format(self, requested):
+        fmt = wire_format.negotiate(requested)
+        changed = fmt != self.wire_format
+        self.wire_format = fmt
+        if changed:
+            # 필드 사전은 포맷 전환 시 1회만 전송
+            await self.send_schema()
+
+    async def set_field_profile(self, requested):
+        """
+        전송 필드 프로필 설정 (같은 프로필 Consumer 끼리는 이벤트당 1회 투영 + 인코딩한 결과를 공유)
+        프로필이 바뀌면 이미 받은 필드와 섞이지 않도록 다음 틱부터 keyframe 으로 다시 시작
+        """
+        profile = wire_format.resolve_profile(requested)
+        if getattr(profile, 'key', None) == getattr(self.field_profile, 'key', None):
             return
+        self.field_profile = profile
+        self.stream_seqs.clear()
+        await self.send_schema()
 
-        # 1. 룸(Group) 가입
-        group_name = f"stock_{clean_code}"
-        await self.channel_layer.group_add(
-            group_name,
-            self.channel_name
-        )
+    def set_mode(self, mode):
+        """watchlist 모드면 송신 버퍼를 WS_WATCHLIST_INTERVAL_MS 간격으로 비움 (종목별 최신 상태만 남음)"""
+        self.watchlist = mode == 'watchlist'
+        if self.outbox is not None:
+            interval = getattr(settings, 'WS_WATCHLIST_INTERVAL_MS', 250) / 1000 if self.watchlist else 0.0
+            self.outbox.set_base_interval(interval)
 
-        # 2. 마스터에게 구독 요청 (실제 KIS 웹소켓 연결 관리)
-        await kis_client.subscribe(clean_code)
+    async def send_schema(self):
+        """compact 포맷이면 현재 프로필의 필드 사전 전송 (JSON 은 필드명이 그대로 가므로 불필요)"""
+        if self.wire_format != wire_format.FORMAT_JSON:
+            await self.send(text_data=json.dumps(wire_format.schema_message(self.wire_format, self.field_profile)))
 
-        self.subscribed_stocks.add(clean_code)
-        
-        if clean_code not in self._logged_stocks:
-             print(f"[StockConsumer] Subscribe requested for {clean_code}. Group: {group_name}")
-             self._logged_stocks.add(clean_code)
+    async def add_subscriptions(self, values, ack=False):
+        """
+        토픽('exec:005930' / 'book:005930') 또는 종목코드('005930' -> 체결 + 호가) 목록 일괄 구독
+        KIS 등록도 스트림(TR_ID) 단위로 요청하므로 체결만 보는 화면(히트맵)은 호가 슬롯을 쓰지 않음
+        ack=True 면 요청한 토픽 전체의 KIS 등록 패킷 전송이 끝난 뒤 {"type": "subscribed", "topics": [...]} 1건으로 응답
+        """
+        requested = expand_topics(values)
+        topics = [name for name in requested if name not in self.subscribed_topics]
+        if topics:
+            by_code = group_by_code(topics)
 
+            # 1. 프로세스 로컬 허브에 등록 (Redis 그룹 가입은 필요할 때 허브가 워커당 1번만 수행)
+            for name in topics:
+                await local_hub.subscribe(name, self)
+            self.subscribed_topics.update(topics)
+
+            # 2. 마지막 체결/호가 스냅샷 즉시 전송 (거래가 뜸한 종목도 다음 틱을 기다리지 않음)
+            #    KIS 등록 패킷은 속도 제한으로 전송이 늦어질 수 있으므로 기다리기 전에 캐시 1회 조회로 먼저 보냄
+            await self.send_snapshots(by_code)
+
+            # 3. 마스터에게 일괄 구독 요청 (refcount 는 한 번에 반영, 등록 패킷 전송은 다른 Consumer 를 막지 않음)
+            await realtime_feed().subscribe_many(list(by_code.items()))
+
+        if ack:
+            await self.send(text_data=json.dumps({"type": "subscribed", "topics": requested}))
+
+        for name in topics:
+            if name not in self._logged_stocks:
+                print(f"[StockConsumer] Subscribe requested for {name}. Local viewers: {local_hub.subscribers(name)}")
+                self._logged_stocks.add(name)
+
+
+    async def send_snapshots(self, by_code):
+        """
+        여러 종목의 Last Value Cache 스냅샷을 한 번에 조회해서 종목별 keyframe 으로 전송
+        by_code: {종목코드: 스트림 목록 (None 이면 전체)}
+        """
+        local = {code for code in by_code if lvc.local(code) is not None}
+        try:
+            snapshots = await lvc.snapshots_async(list(by_code))
+        except Exception as e:
+            print(f"[StockConsumer] Snapshot error for {len(by_code)} codes: {e}")
+            return
+        for code, streams in by_code.items():
+            if snapshots.get(code):
+                await self._send_snapshot(code, streams, snapshots[code], code in local)
+
+    async def send_snapshot(self, code, streams=None):
+        """종목 1개 스냅샷 전송 (send_snapshots 참고)"""
+        await self.send_snapshots({code: streams})
+
+    async def _send_snapshot(self, code, streams, snapshot, local):
+        """
+        Last Value Cache 의 종목 스냅샷을 keyframe 으로 전송 (streams 지정 시 해당 스트림만)
+        - 이 프로세스가 publish 한 값이면 seq 를 이어받아 다음 틱부터 delta 전송
+        - 다른 프로세스가 캐시에 기록한 값이면 seq 체계가 다를 수 있으므로 다음 틱은 keyframe 으로 전송
+        """
+        # 구독 직후 이미 받은(또는 전송 대기 중인) 라이브 틱보다 오래된 스냅샷은 보내지 않음
+        pending = self.outbox.get(code) if self.outbox is not None else None
+        pending_streams = {update["stream"] for update in pending["updates"]} if pending else set()
+        updates = [
+            {"stream": stream, "seq": value["seq"], "data": value["data"], "key": True, "volatile": not local}
+            for stream, value in snapshot.items()
+            if (streams is None or stream in streams)
+            and self.stream_seqs.get((code, stream)) is None and stream not in pending_streams
+        ]
+        if not updates:
+            return
+        await self.stock_update({"code": code, "updates": updates})
 
     async def disconnect(self, close_code):
+        consumers_connected.dec()
+        if getattr(self, '_writer', None):
+            self._writer.cancel()
         # Global Group Discard
         await self.channel_layer.group_discard("theme_global", self.channel_name)
 
-        # 모든 구독 그룹에서 탈퇴
-        for code in self.subscribed_stocks:
-            group_name = f"stock_{code}"
-            await self.channel_layer.group_discard(
-                group_name,
-                self.channel_name
-            )
-        print(f"[StockConsumer] Client disconnected. Cleared {len(self.subscribed_stocks)} subscriptions.")
+        # 모든 구독 토픽에서 탈퇴
+        for name in self.subscribed_topics:
+            await local_hub.unsubscribe(name, self)
+        print(f"[StockConsumer] Client disconnected. Cleared {len(self.subscribed_topics)} subscriptions.")
         
-        # 마스터에게 구독 취소 알림 (시청자 수 감소)
-        for code in self.subscribed_stocks:
-             await kis_client.unsubscribe(code)
+        # 마스터에게 구독 취소 알림 (스트림별 시청자 수 감소)
+        for code, streams in group_by_code(self.subscribed_topics).items():
+             await realtime_feed().unsubscribe(code, streams)
 
     async def stock_update(self, event):
         """
-        StockMaster가 Redis 그룹으로 쏜 데이터를 받아서
-        연결된 개별 클라이언트(브라우저)에게 전달
+        KIS 클라이언트가 LocalHub 로 보낸 데이터를 송신 버퍼에 넣음
+        브라우저가 밀려 있으면 같은 종목의 대기 중 업데이트와 합쳐 스트림별 1건으로 만듦
+        (건너뛴 delta 의 변경 필드도 누적되므로 watchlist 간격마다 keyframe 으로 돌아가지 않음)
+        """
+        if self.outbox is None:
+            await self._send_update(event)
+            return
+        self.outbox.put(event['code'], event, merge_stock_events)
+
+    async def _write_loop(self):
+        """송신 버퍼를 비우며 전송하고, 배치 전송 시간으로 느린 클라이언트를 판정"""
+        while True:
+            batch = await self.outbox.take()
+            started = time.monotonic()
+            if self.watchlist:
+                await self._send_batch(batch)
+            else:
+                for key, item in batch:
+                    try:
+                        if isinstance(item, str):
+                            await self.send(text_data=item)
+                        elif item.get('type') == 'theme_update':
+                            await self.send(text_data=self._theme_text(item))
+                        else:
+                            await self._send_update(item)
+                    except Exception as e:
+                        print(f"[StockConsumer] Send error for {key}: {e}")
+            action = self.outbox.assess(time.monotonic() - started)
+            if action == ACTION_DISCONNECT:
+                print(f"[StockConsumer] Slow client disconnected ({len(self.subscribed_topics)} subscriptions)")
+                await self.close(code=4008)
+                return
+            if action:
+                print(f"[StockConsumer] Slow client {action} (interval {self.outbox.interval}s)")
+
+    async def _send_batch(self, batch):
+        """
+        watchlist 모드: 이번 간격 동안 바뀐 종목들의 업데이트를 프레임 1개로 전송
+        종목별 인코딩 결과(다른 Consumer 와 공유)를 이어 붙이기만 하고, 봉 마감 알림은 따로 전송
+        """
+        payloads, events = [], []
+        for key, item in batch:
+            try:
+                if isinstance(item, str):
+                    await self.send(text_data=item)
+                elif item.get('type') == 'theme_update':
+                    await self.send(text_data=self._theme_text(item))
+                else:
+                    payloads.append(self._encode_update(item))
+                    events.append(item)
+            except Exception as e:
+                print(f"[StockConsumer] Send error for {key}: {e}")
+        if not payloads:
+            return
+        try:
+            text_data, bytes_data = wire_format.join_payloads(self.wire_format, payloads)
+            await self.send(text_data=text_data, bytes_data=bytes_data)
+        except Exception as e:
+            print(f"[StockConsumer] Batch send error ({len(payloads)} symbols): {e}")
+            return
+        now = time.time()
+        for event in events:
+            if 'ts' in event:
+                latency.record(STAGE_SEND, now - event['ts'])
+
+    async def _send_update(self, event):
+        """연결된 개별 클라이언트(브라우저)에게 전달"""
+        text_data, bytes_data = self._encode_update(event)
+        await self.send(text_data=text_data, bytes_data=bytes_data)
+        if 'ts' in event:
+            latency.record(STAGE_SEND, time.time() - event['ts'])
+
+    def _encode_update(self, event):
+        """
+        이 연결에 보낼 페이로드 (text_data, bytes_data)
+        - 스트림별 seq 가 이어지면 변경된 필드(delta)만 전송
+        - 구독 직후 첫 메시지 / seq 누락 / 주기적 keyframe 이면 전체 스냅샷(key) 전송
+        (업데이트가 여러 건이면 배열로 묶어서 한 번에 전송)
+        publisher 가 미리 인코딩한 페이로드(event['encoded'])가 있으면 그대로 전달하고,
+        없는 조합(구독 직후 keyframe, 필드 프로필 등)만 인코딩해서 같은 이벤트를 받는 Consumer 들과 공유
+        """
+        code = event['code']
+        updates = event['updates']
+        keys = []
+        for update in updates:
+            stream = update['stream']
+            seq = update['seq']
+            last_seq = self.stream_seqs.get((code, stream))
+            if update.get('volatile'):
+                # 다른 프로세스가 캐시에 남긴 스냅샷은 seq 체계가 다를 수 있으므로 다음 틱은 keyframe 으로
+                self.stream_seqs.pop((code, stream), None)
+            else:
+                self.stream_seqs[(code, stream)] = seq
+            # 밀려서 합쳐진 delta 는 합친 구간의 첫 seq(first_seq) 가 이어지면 delta 그대로 전송
+            keys.append(bool(update.get('key')) or last_seq is None or update.get('first_seq', seq) != last_seq + 1)
+
+        profile = self.field_profile
+        cache_key = wire_format.variant_key(self.wire_format, keys, profile)
+        encoded = event.setdefault('encoded', {})
+        payload = encoded.get(cache_key)
+        if payload is None:
+            messages = wire_format.build_messages(code, updates, keys, profile)
+            payload = encoded[cache_key] = wire_format.encode_updates(self.wire_format, messages, profile)
+        return payload
+
+    async def candle_close(self, event):
+        """
+        KIS 클라이언트가 보낸 봉 마감 이벤트 전달 (구독 요청 시 지정한 봉 단위만)
+        {"type": "candle", "code": "005930", "interval": "1m", "bar": {"t", "o", "h", "l", "c", "v"}}
+        """
+        if event['interval'] not in self.candle_intervals:
+            return
+        text = event.get('text')
+        if text is None:
+            text = event['text'] = json.dumps({
+                "type": "candle", "code": event['code'], "interval": event['interval'], "bar": event['bar'],
+            })
+        if self.outbox is None:
+            await self.send(text_data=text)
+        else:
+            self.outbox.put(("candle", event['code'], event['interval']), text)
+
+    async def stream_status(self, event):
         """
-        if 'data' in event:
-             await self.send(text_data=json.dumps(event['data']))
+        KIS 등록 슬롯 상태 알림 전달 (시청 중인 종목으로 가득 차 대기 중 -> queued, 빈 슬롯에 등록됨 -> live)
+        {"type": "stream_status", "topic": "exec:005930", "code": "005930", "status": "queued"}
+        """
+        text = event.get('text')
+        if text is None:
+            text = event['text'] = json.dumps({
+                "type": "stream_status", "topic": event['topic'], "code": event['code'], "status": event['status'],
+            })
+        if self.outbox is None:
+            await self.send(text_data=text)
         else:
-             await self.send(text_data=json.dumps(event))
+            self.outbox.put(("status", event['topic']), text)
 
     async def theme_update(self, event):
         """
-        ThemeSyncService가 'theme_global' 그룹으로 쏜 데이터를 전달
+        'theme_global' 그룹으로 온 테마 이벤트를 송신 버퍼를 거쳐 전달
+        - ThemeSyncService: 테마 구성 변경 알림 ({'data': {...}}) -> 모든 연결, 밀리면 최신 알림만
+        - theme_aggregates: 바뀐 테마의 집계 ({'aggregates': [[id, count, avg, wavg, up, down, leader, leader_rate], ...]})
+          -> opt-in 한 연결에만, 밀리면 테마별 최신 행으로 합침
         """
-        # event: {'type': 'theme_update', 'message': 'New theme added', 'stock': ...}
-        await self.send(text_data=json.dumps(event))
+        # event: {'type': 'theme_update', ..., 'text': 미리 인코딩된 JSON}
+        if 'aggregates' in event:
+            if not self.theme_aggregates:
+                return
+            if self.outbox is not None:
+                self.outbox.put(("theme", "aggregates"), event, merge_theme_updates)
+                return
+        elif self.outbox is not None:
+            self.outbox.put(("theme", "sync"), self._theme_text(event))
+            return
+        await self.send(text_data=self._theme_text(event))
+
+    @staticmethod
+    def _theme_text(event):
+        """미리 인코딩된 텍스트가 없으면 (밀려서 합친 집계 등) type 과 본문만 인코딩"""
+        text = event.get('text')
+        if text is None:
+            text = json.dumps({k: v for k, v in event.items() if k != 'text'}, separators=(',', ':'))
+        return text
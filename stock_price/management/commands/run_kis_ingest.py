@@ -0,0 +1,26 @@
+from django.core.management.base import BaseCommand
+from stock_price.services.kis_ingest import IngestServer
+from stock_price.services.kis_session_pool import kis_pool
+from stock_price.services.metrics import serve_metrics
+import asyncio
+
+
+class Command(BaseCommand):
+    help = 'Run the KIS realtime ingest process (owns KIS WebSocket sessions, publishes ticks to the channel layer)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--metrics-port', type=int, default=0,
+                            help='Serve Prometheus metrics for this process on the given port (0: disabled)')
+
+    def handle(self, *args, **options):
+        self.stdout.write(f"Starting KIS ingest with {len(kis_pool.sessions)} session(s)...")
+        try:
+            asyncio.run(self.run(options['metrics_port']))
+        except KeyboardInterrupt:
+            self.stdout.write(self.style.SUCCESS('KIS ingest stopped.'))
+
+    async def run(self, metrics_port):
+        # ingest 프로세스는 HTTP 를 서빙하지 않으므로 수신/슬롯 지표는 별도 포트로 노출
+        if metrics_port:
+            self.metrics_server = await serve_metrics(port=metrics_port)
+        await IngestServer(kis_pool).run()
@@ -0,0 +1,40 @@
+from django.core.management.base import BaseCommand, CommandError
+from stock_price.services.kis_replay import KISReplayServer, parse_speed
+from stock_price.services.tick_journal import journal_segments
+import asyncio
+
+
+class Command(BaseCommand):
+    help = 'Run a local KIS realtime WebSocket stand-in that replays journaled or synthetic frames (set KIS_WS_BASE_URL to point at it)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--host', default='127.0.0.1')
+        parser.add_argument('--port', type=int, default=21000)
+        parser.add_argument('--journal', help='Tick journal directory (KIS_JOURNAL_DIR). Omit for synthetic frames')
+        parser.add_argument('--day', help='Journal day to replay (YYYYMMDD), default: all segments')
+        parser.add_argument('--speed', default='1x', help="Playback speed: 1x, 10x, ... or 'max'")
+        parser.add_argument('--rate', type=float, default=5.0, help='Synthetic frames per second per registration at 1x')
+        parser.add_argument('--max-registrations', type=int, default=41, help='Registrations per connection before MAX SUBSCRIBE OVER')
+        parser.add_argument('--seed', type=int, help='Random seed for the synthetic feed')
+
+    def handle(self, *args, **options):
+        try:
+            speed = parse_speed(options['speed'])
+        except ValueError as e:
+            raise CommandError(str(e))
+
+        paths = []
+        if options['journal']:
+            paths = journal_segments(options['journal'], day=options['day'])
+            if not paths:
+                raise CommandError(f"No journal segments found in {options['journal']}")
+
+        server = KISReplayServer(
+            journal_paths=paths, speed=speed, rate=options['rate'],
+            max_registrations=options['max_registrations'], seed=options['seed'],
+        )
+        self.stdout.write(f"Point the app at it with KIS_WS_BASE_URL='ws://{options['host']}:{options['port']}' and any KIS_WS_APPROVAL_KEY")
+        try:
+            asyncio.run(server.run(options['host'], options['port']))
+        except KeyboardInterrupt:
+            self.stdout.write(self.style.SUCCESS('KIS replay server stopped.'))
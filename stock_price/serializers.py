@@ -82,82 +82,10 @@ class StockResponseSerializer(serializers.Serializer):
     def parse_from_raw(cls, raw_data):
         """
         0|H0STCNT0|001|005930^... 형태의 로우 데이터를 파싱하여 딕셔너리로 반환
+        (필드 변환은 services.kis_decoder 의 H0STCNT0 테이블을 사용)
         """
-        try:
-            # 1. 메타 데이터 분리 (Pipe | 구분)
-            parts = raw_data.split('|')
-            if len(parts) < 4:
-                return None  # 올바르지 않은 형식
-            
-            # parts[0]: 암호화여부, parts[1]: TR_ID, parts[2]: 개수, parts[3]: 실제데이터(들)
-            # 여기서는 편의상 첫 번째 데이터 블록만 처리하거나 ^로 전체를 나눔
-            
-            # 실제 데이터 부분 (마지막 요소)
-            content = parts[3]
-            
-            # 2. 데이터 필드 분리 (Caret ^ 구분)
-            fields = content.split('^')
-            
-            # 필드 개수가 부족하면 처리 불가 (API 스펙에 따라 46개 내외)
-            # 안전하게 매핑 (인덱스 에러 방지)
-            def get_val(idx, type_func=str):
-                try:
-                    val = fields[idx]
-                    return type_func(val)
-                except (IndexError, ValueError):
-                    return None
-
-            data = {
-                "MKSC_SHRN_ISCD": get_val(0),
-                "STCK_CNTG_HOUR": get_val(1),
-                "STCK_PRPR": get_val(2, float),
-                "PRDY_VRSS_SIGN": get_val(3),
-                "PRDY_VRSS": get_val(4, float),
-                "PRDY_CTRT": get_val(5, float),
-                "WGHN_AVRG_STCK_PRC": get_val(6, float),
-                "STCK_OPRC": get_val(7, float),
-                "STCK_HGPR": get_val(8, float),
-                "STCK_LWPR": get_val(9, float),
-                "ASKP1": get_val(10, float),
-                "BIDP1": get_val(11, float),
-                "CNTG_VOL": get_val(12, float),
-                "ACML_VOL": get_val(13, float),
-                "ACML_TR_PBMN": get_val(14, float),
-                "SELN_CNTG_CSNU": get_val(15, float),
-                "SHNU_CNTG_CSNU": get_val(16, float),
-                "NTBY_CNTG_CSNU": get_val(17, float),
-                "CTTR": get_val(18, float),
-                "SELN_CNTG_SMTN": get_val(19, float),
-                "SHNU_CNTG_SMTN": get_val(20, float),
-                "CCLD_DVSN": get_val(21),
-                "SHNU_RATE": get_val(22, float),
-                "PRDY_VOL_VRSS_ACML_VOL_RATE": get_val(23, float),
-                "OPRC_HOUR": get_val(24),
-                "OPRC_VRSS_PRPR_SIGN": get_val(25),
-                "OPRC_VRSS_PRPR": get_val(26, float),
-                "HGPR_HOUR": get_val(27),
-                "HGPR_VRSS_PRPR_SIGN": get_val(28),
-                "HGPR_VRSS_PRPR": get_val(29, float),
-                "LWPR_HOUR": get_val(30),
-                "LWPR_VRSS_PRPR_SIGN": get_val(31),
-                "LWPR_VRSS_PRPR": get_val(32, float),
-                "BSOP_DATE": get_val(33),
-                "NEW_MKOP_CLS_CODE": get_val(34),
-                "TRHT_YN": get_val(35),
-                "ASKP_RSQN1": get_val(36, float),
-                "BIDP_RSQN1": get_val(37, float),
-                "TOTAL_ASKP_RSQN": get_val(38, float),
-                "TOTAL_BIDP_RSQN": get_val(39, float),
-                "VOL_TNRT": get_val(40, float),
-                "PRDY_SMNS_HOUR_ACML_VOL": get_val(41, float),
-                "PRDY_SMNS_HOUR_ACML_VOL_RATE": get_val(42, float),
-                "HOUR_CLS_CODE": get_val(43),
-                "MRKT_TRTM_CLS_CODE": get_val(44),
-                "VI_STND_PRC": get_val(45, float),
-            }
-            return data
-        except Exception:
-            return None
+        from .services.kis_decoder import DECODERS, TR_ID_EXEC
+        return DECODERS[TR_ID_EXEC].decode(raw_data)
 
 class StockAskingPriceResponseSerializer(serializers.Serializer):
     """
@@ -231,89 +159,12 @@ class StockAskingPriceResponseSerializer(serializers.Serializer):
 
     @classmethod
     def parse_from_raw(cls, raw_data):
-        try:
-            parts = raw_data.split('|')
-            if len(parts) < 4:
-                return None
-            content = parts[3]
-            fields = content.split('^')
-            
-            def get_val(idx, type_func=str):
-                try:
-                    val = fields[idx]
-                    return type_func(val)
-                except (IndexError, ValueError):
-                    return None
-
-            return {
-                "MKSC_SHRN_ISCD": get_val(0),
-                "BSOP_HOUR": get_val(1),
-                "HOUR_CLS_CODE": get_val(2),
-                "ASKP1": get_val(3, float),
-                "ASKP2": get_val(4, float),
-                "ASKP3": get_val(5, float),
-                "ASKP4": get_val(6, float),
-                "ASKP5": get_val(7, float),
-                "ASKP6": get_val(8, float),
-                "ASKP7": get_val(9, float),
-                "ASKP8": get_val(10, float),
-                "ASKP9": get_val(11, float),
-                "ASKP10": get_val(12, float),
-                "BIDP1": get_val(13, float),
-                "BIDP2": get_val(14, float),
-                "BIDP3": get_val(15, float),
-                "BIDP4": get_val(16, float),
-                "BIDP5": get_val(17, float),
-                "BIDP6": get_val(18, float),
-                "BIDP7": get_val(19, float),
-                "BIDP8": get_val(20, float),
-                "BIDP9": get_val(21, float),
-                "BIDP10": get_val(22, float),
-                "ASKP_RSQN1": get_val(23, float),
-                "ASKP_RSQN2": get_val(24, float),
-                "ASKP_RSQN3": get_val(25, float),
-                "ASKP_RSQN4": get_val(26, float),
-                "ASKP_RSQN5": get_val(27, float),
-                "ASKP_RSQN6": get_val(28, float),
-                "ASKP_RSQN7": get_val(29, float),
-                "ASKP_RSQN8": get_val(30, float),
-                "ASKP_RSQN9": get_val(31, float),
-                "ASKP_RSQN10": get_val(32, float),
-                "BIDP_RSQN1": get_val(33, float),
-                "BIDP_RSQN2": get_val(34, float),
-                "BIDP_RSQN3": get_val(35, float),
-                "BIDP_RSQN4": get_val(36, float),
-                "BIDP_RSQN5": get_val(37, float),
-                "BIDP_RSQN6": get_val(38, float),
-                "BIDP_RSQN7": get_val(39, float),
-                "BIDP_RSQN8": get_val(40, float),
-                "BIDP_RSQN9": get_val(41, float),
-                "BIDP_RSQN10": get_val(42, float),
-                "TOTAL_ASKP_RSQN": get_val(43, float),
-                "TOTAL_BIDP_RSQN": get_val(44, float),
-                "OVTM_TOTAL_ASKP_RSQN": get_val(45, float),
-                "OVTM_TOTAL_BIDP_RSQN": get_val(46, float),
-                "ANTC_CNPR": get_val(47, float),
-                "ANTC_CNQN": get_val(48, float),
-                "ANTC_VOL": get_val(49, float),
-                "ANTC_CNTG_VRSS": get_val(50, float),
-                "ANTC_CNTG_VRSS_SIGN": get_val(51),
-                "ANTC_CNTG_PRDY_CTRT": get_val(52, float),
-                "ACML_VOL": get_val(53, float),
-                "TOTAL_ASKP_RSQN_ICDC": get_val(54, float),
-                "TOTAL_BIDP_RSQN_ICDC": get_val(55, float),
-                "OVTM_TOTAL_ASKP_ICDC": get_val(56, float),
-                "OVTM_TOTAL_BIDP_ICDC": get_val(57, float),
-                "STCK_DEAL_CLS_CODE": get_val(58),
-                "KMID_PRC": get_val(59, float),
-                "KMID_TOTAL_RSQN": get_val(60, float),
-                "KMID_CLS_CODE": get_val(61),
-                "NMID_PRC": get_val(62, float),
-                "NMID_TOTAL_RSQN": get_val(63, float),
-                "NMID_CLS_CODE": get_val(64),
-            }
-        except Exception:
-            return None
+        """
+        0|H0UNASP0|001|005930^... 형태의 로우 데이터를 파싱하여 딕셔너리로 반환
+        (필드 변환은 services.kis_decoder 의 H0UNASP0 테이블을 사용)
+        """
+        from .services.kis_decoder import DECODERS, TR_ID_HOGA
+        return DECODERS[TR_ID_HOGA].decode(raw_data)
 
 
 # --- Ranking API Serializers ---
@@ -1,2 +1,2 @@
-from .kis_ws_client import kis_client
+from .kis_session_pool import kis_pool
 from .kis_rest_client import kis_rest_client
\ No newline at end of file
@@ -0,0 +1,96 @@
+import asyncio
+from django.conf import settings
+from django.core.cache import cache
+
+
+class CacheMirror:
+    """
+    KIS 세션을 가진 프로세스의 종목별 메모리 상태(호가창, 봉)를 Django 캐시(Redis)에 복제
+    - mark(code): 바뀐 종목 표시 -> flush_sec 마다 바뀐 종목만 모아서 set_many (LastValueCache 와 같은 방식)
+    - drop(code): 해제된 종목은 다음 flush 때 캐시에서도 삭제
+    - get(code): 다른 프로세스(웹 워커의 뷰)에서 조회
+    export(code) 는 이벤트 루프 스레드에서 호출되어 캐시에 쓸 값을 복사해 돌려줘야 함 (기록은 스레드에서 수행)
+    multi=True 면 export(code) 가 {캐시 키: 값} 을 돌려줌 (종목 1개를 여러 키로 나눠 바뀐 부분만 기록, drop 은 종목 키만 삭제)
+    rewind(code): 기록 실패 시 호출 -> 다음 export 가 바뀐 부분이 아닌 전체를 다시 돌려주도록 되돌림
+    """
+    def __init__(self, key_format, export, flush_sec, ttl_sec=None, multi=False, rewind=None):
+        self.key_format = key_format
+        self.export = export
+        self.multi = multi
+        self.rewind = rewind
+        self.flush_sec = flush_sec
+        self.ttl_sec = ttl_sec or getattr(settings, 'KIS_LVC_TTL_SEC', 60 * 60 * 12)
+        self._dirty = set()
+        self._dropped = set()
+        self._flush_task = None
+
+    def key(self, stock_code):
+        return self.key_format.format(code=stock_code)
+
+    def mark(self, stock_code):
+        self._dirty.add(stock_code)
+        self._dropped.discard(stock_code)
+        self._ensure_flush()
+
+    def drop(self, stock_code):
+        self._dirty.discard(stock_code)
+        self._dropped.add(stock_code)
+        self._ensure_flush()
+
+    def _ensure_flush(self):
+        if self.flush_sec <= 0:
+            return
+        try:
+            loop = asyncio.get_running_loop()
+        except RuntimeError:
+            return  # 이벤트 루프 밖에서는 flush() 를 직접 호출
+        task = self._flush_task
+        if task is None or task.done() or task.get_loop() is not loop:
+            self._flush_task = loop.create_task(self._flush_loop())
+
+    def collect(self):
+        """기록할 값 / 삭제할 키를 꺼냄 (이벤트 루프 스레드에서 호출)"""
+        dirty, self._dirty = self._dirty, set()
+        dropped, self._dropped = self._dropped, set()
+        values = {}
+        for code in dirty:
+            value = self.export(code)
+            if value is None:
+                continue
+            if self.multi:
+                values.update(value)
+            else:
+                values[self.key(code)] = value
+        return values, [self.key(code) for code in dropped]
+
+    def write(self, values, deleted):
+        if values:
+            cache.set_many(values, self.ttl_sec)
+        if deleted:
+            cache.delete_many(deleted)
+        return len(values) + len(deleted)
+
+    def flush(self):
+        """바뀐 종목을 캐시에 일괄 기록 (동기)"""
+        return self.write(*self.collect())
+
+    async def _flush_loop(self):
+        while self._dirty or self._dropped:
+            await asyncio.sleep(self.flush_sec)
+            dirty, dropped = set(self._dirty), set(self._dropped)
+            try:
+                await asyncio.to_thread(self.write, *self.collect())
+            except Exception as e:
+                print(f"[CacheMirror] Flush error ({self.key_format}): {e}")
+                self._retry(dirty, dropped)
+
+    def _retry(self, dirty, dropped):
+        # 그 사이 다시 표시/해제된 종목은 최신 상태를 따름
+        for code in dirty - self._dropped:
+            if self.rewind is not None:
+                self.rewind(code)
+            self._dirty.add(code)
+        self._dropped |= dropped - self._dirty
+
+    def get(self, stock_code):
+        return cache.get(self.key(stock_code))
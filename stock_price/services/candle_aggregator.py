@@ -0,0 +1,216 @@
+from array import array
+from collections import OrderedDict
+from django.conf import settings
+from django.core.cache import cache
+from .cache_mirror import CacheMirror
+from .kis_decoder import DECODERS, TR_ID_EXEC
+
+# 봉 단위 -> (초, 링 버퍼 크기). 1초봉은 최근 1시간, 1분/5분봉은 장 전체(09:00~15:30 + 여유)
+INTERVALS = {
+    "1s": (1, 3600),
+    "1m": (60, 420),
+    "5m": (300, 90),
+}
+
+_EXEC = DECODERS[TR_ID_EXEC]
+_PRICE = _EXEC.index['STCK_PRPR']
+_VOLUME = _EXEC.index['CNTG_VOL']
+_HOUR = _EXEC.index['STCK_CNTG_HOUR']
+
+_DAY_ROLLOVER = 3600  # 봉 시작 시각이 1시간 이상 거꾸로 가면 새 거래일로 보고 초기화
+
+# 캐시에는 봉 단위별로 CHUNK_BARS 개씩 나눈 청크 키로 기록 (flush 마다 바뀐 청크만 다시 씀)
+CHUNK_BARS = 60
+CHUNK_KEY = "candles:{code}:{interval}:{epoch}:{chunk}"
+
+
+def _seconds(hhmmss):
+    """'HHMMSS' -> 자정 이후 초"""
+    return int(hhmmss[0:2]) * 3600 + int(hhmmss[2:4]) * 60 + int(hhmmss[4:6])
+
+
+def _hhmmss(seconds):
+    return f"{seconds // 3600:02d}:{seconds // 60 % 60:02d}:{seconds % 60:02d}"
+
+
+def _bar(row):
+    start, o, h, l, c, v = row
+    return {"t": _hhmmss(start), "o": o, "h": h, "l": l, "c": c, "v": v}
+
+
+class CandleSeries:
+    """
+    한 종목 / 한 봉 단위의 OHLCV 링 버퍼 (미리 할당된 배열, 마지막 칸이 진행 중인 봉)
+    체결이 없는 구간은 빈 봉을 만들지 않음
+    """
+    __slots__ = ('interval', 'capacity', 'start', 'open', 'high', 'low', 'close', 'volume', 'head', 'count',
+                 'total', 'epoch', '_exported')
+
+    def __init__(self, interval, capacity):
+        self.interval = interval
+        self.capacity = capacity
+        self.start = array('l', [0] * capacity)
+        self.open, self.high, self.low, self.close, self.volume = (array('d', bytes(8 * capacity)) for _ in range(5))
+        self.head = 0
+        self.count = 0
+        self.total = 0      # 이번 거래일에 시작된 봉 수 (봉 번호 = 0 부터, 마지막 봉 번호 = total - 1)
+        self.epoch = 0      # 거래일 변경으로 초기화된 횟수 (캐시 청크 키 구분)
+        self._exported = None  # 마지막 export 시점의 (epoch, total)
+
+    def add(self, seconds, price, volume):
+        """체결 1건 반영. 새 봉이 시작되면 직전(마감된) 봉을 반환"""
+        bucket = seconds - seconds % self.interval
+        head = self.head
+        if self.count:
+            current = self.start[head]
+            if bucket <= current and current - bucket < _DAY_ROLLOVER:
+                # 같은 봉 (늦게 도착한 체결도 진행 중인 봉에 합산)
+                if price > self.high[head]:
+                    self.high[head] = price
+                if price < self.low[head]:
+                    self.low[head] = price
+                self.close[head] = price
+                self.volume[head] += volume
+                return None
+            if bucket < current:
+                self.count = 0  # 거래일 변경
+                self.total = 0
+                self.epoch += 1
+        closed = self.bar(head) if self.count else None
+
+        head = self.head = (head + 1) % self.capacity if self.count else 0
+        self.count = min(self.count + 1, self.capacity)
+        self.total += 1
+        self.start[head] = bucket
+        self.open[head] = self.high[head] = self.low[head] = self.close[head] = price
+        self.volume[head] = volume
+        return closed
+
+    def bar(self, i):
+        return _bar(self.row(i))
+
+    def row(self, i):
+        """캐시 기록용 평탄한 튜플 (시작 초, o, h, l, c, v)"""
+        return (self.start[i], self.open[i], self.high[i], self.low[i], self.close[i], self.volume[i])
+
+    def changed_chunks(self):
+        """
+        직전 호출 이후 바뀐 봉이 속한 청크만 {청크 번호: (첫 봉 번호, [row, ...])} 로 반환
+        직전에 진행 중이던 봉부터 다시 읽으므로 복사량은 바뀐 봉 수 + 청크 1개 이내 (링 전체를 복사하지 않음)
+        """
+        oldest = self.total - self.count
+        exported = self._exported
+        first = oldest if exported is None or exported[0] != self.epoch else max(oldest, exported[1] - 1)
+        self._exported = (self.epoch, self.total)
+        chunks = {}
+        for chunk in range(first // CHUNK_BARS, (self.total - 1) // CHUNK_BARS + 1) if self.total else ():
+            lo, hi = max(chunk * CHUNK_BARS, oldest), min((chunk + 1) * CHUNK_BARS, self.total)
+            chunks[chunk] = (lo, [self.row((self.head - (self.total - 1 - i)) % self.capacity) for i in range(lo, hi)])
+        return chunks
+
+    def bars(self, limit=None):
+        """오래된 봉 -> 최신 봉 순서 (마지막은 진행 중인 봉)"""
+        count = self.count if limit is None else max(0, min(limit, self.count))
+        first = self.head - count + 1
+        return [self.bar((first + i) % self.capacity) for i in range(count)]
+
+
+class CandleAggregator:
+    """
+    종목별 1초/1분/5분 OHLCV 집계기 (체결 틱 원문 필드에서 바로 가격/체결량/시각을 읽음)
+    봉은 KIS 등록 해제(linger 만료)와 무관하게 당일 유지하고, 종목 수가 max_codes 를 넘으면 가장 오래 체결이 없던 종목부터 정리
+    바뀐 종목의 봉은 주기적으로 캐시에 기록 -> ingest 모드의 웹 워커 등 다른 프로세스의 뷰에서 조회
+    (종목 키 candles:{code} 에는 봉 단위별 (epoch, total, count) 만, 봉은 CHUNK_KEY 청크로 나눠 바뀐 청크만 기록)
+    """
+    def __init__(self, intervals=None, max_codes=None, flush_sec=None):
+        self.intervals = intervals or INTERVALS
+        self.max_codes = max_codes or getattr(settings, 'KIS_CANDLE_MAX_CODES', 1000)
+        self._series = OrderedDict()
+        self.mirror = CacheMirror(
+            "candles:{code}", self._export,
+            getattr(settings, 'KIS_CANDLE_FLUSH_SEC', 5.0) if flush_sec is None else flush_sec,
+            multi=True, rewind=self._rewind,
+        )
+
+    def series(self, stock_code, interval):
+        return self._series.get(stock_code, {}).get(interval)
+
+    def bars(self, stock_code, interval, limit=None):
+        """
+        봉 목록 (이 프로세스에 없으면 캐시에 기록된 청크에서, 둘 다 없으면 None). 캐시 조회가 있으므로 동기 뷰에서 호출
+        """
+        series = self.series(stock_code, interval)
+        if series is not None:
+            return series.bars(limit)
+        meta = (self.mirror.get(stock_code) or {}).get(interval)
+        if meta is None:
+            return None
+        epoch, total, count = meta
+        oldest = total - count if limit is None else max(total - count, total - max(0, limit))
+        if oldest >= total:
+            return []
+        keys = [
+            CHUNK_KEY.format(code=stock_code, interval=interval, epoch=epoch, chunk=chunk)
+            for chunk in range(oldest // CHUNK_BARS, (total - 1) // CHUNK_BARS + 1)
+        ]
+        chunks = cache.get_many(keys)
+        bars = []
+        for key in keys:
+            first, rows = chunks.get(key, (0, ()))
+            bars += [_bar(row) for i, row in enumerate(rows, first) if oldest <= i < total]
+        return bars
+
+    def _rewind(self, stock_code):
+        for candles in self._series.get(stock_code, {}).values():
+            candles._exported = None
+
+    def _export(self, stock_code):
+        # 바뀐 청크만 튜플 리스트로 복사해서 넘김 (기록 스레드가 pickle 하는 동안 수신 루프가 배열을 갱신해도 무관)
+        series = self._series.get(stock_code)
+        if series is None:
+            return None
+        values, meta = {}, {}
+        for interval, candles in series.items():
+            for chunk, rows in candles.changed_chunks().items():
+                values[CHUNK_KEY.format(code=stock_code, interval=interval, epoch=candles.epoch, chunk=chunk)] = rows
+            meta[interval] = (candles.epoch, candles.total, candles.count)
+        values[self.mirror.key(stock_code)] = meta
+        return values
+
+    def add(self, tick):
+        """
+        체결 틱 반영
+        Returns: 이번 틱으로 마감된 봉 [(봉 단위, bar dict), ...]
+        """
+        fields = tick.fields
+        try:
+            seconds = _seconds(fields[_HOUR])
+            price = float(fields[_PRICE])
+            volume = float(fields[_VOLUME])
+        except (IndexError, ValueError):
+            return []
+
+        series = self._series.get(tick.code)
+        if series is None:
+            series = self._series[tick.code] = {
+                name: CandleSeries(interval, capacity) for name, (interval, capacity) in self.intervals.items()
+            }
+            while len(self._series) > self.max_codes:
+                self.forget(next(iter(self._series)))
+        else:
+            self._series.move_to_end(tick.code)
+        self.mirror.mark(tick.code)
+        closed = []
+        for name, candles in series.items():
+            bar = candles.add(seconds, price, volume)
+            if bar is not None:
+                closed.append((name, bar))
+        return closed
+
+    def forget(self, stock_code):
+        if self._series.pop(stock_code, None) is not None:
+            self.mirror.drop(stock_code)
+
+
+# 모듈 레벨에서 인스턴스 생성 (프로세스당 1개)
+candles = CandleAggregator()
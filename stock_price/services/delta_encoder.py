@@ -0,0 +1,47 @@
+class _StreamState:
+    __slots__ = ('seq', 'snapshot', 'since_key')
+
+    def __init__(self):
+        self.seq = 0
+        self.snapshot = None
+        self.since_key = 0
+
+
+class DeltaEncoder:
+    """
+    스트림(종목, 호가/체결)별 마지막 전송 스냅샷을 기억하고, 바뀐 필드만 추려내는 인코더
+    - 모든 업데이트에 스트림 단위 seq 를 붙임 (Consumer 가 누락 여부를 판단)
+    - 첫 업데이트와 keyframe_interval 마다 전체 스냅샷(key)을 보냄
+    """
+    def __init__(self, keyframe_interval=50):
+        self.keyframe_interval = max(1, keyframe_interval)
+        self._streams = {}
+
+    def encode(self, stock_code, stream, data):
+        """
+        Returns: {"stream", "seq", "data"(전체), "delta"(변경분) 또는 "key": True}
+        """
+        key = (stock_code, stream)
+        state = self._streams.get(key)
+        if state is None:
+            state = self._streams[key] = _StreamState()
+            keyframe = True
+        else:
+            state.since_key += 1
+            keyframe = state.since_key >= self.keyframe_interval
+
+        state.seq += 1
+        update = {"stream": stream, "seq": state.seq, "data": data}
+        if keyframe:
+            state.since_key = 0
+            update["key"] = True
+        else:
+            # 필드 값은 모두 str/float/None 이라 items() 집합 연산으로 한 번에 diff
+            update["delta"] = dict(data.items() - state.snapshot.items())
+        state.snapshot = data
+        return update
+
+    def forget(self, stock_code, stream=None):
+        """시청자가 없어진 종목(stream 지정 시 해당 스트림만)의 스냅샷 정리"""
+        for key in [key for key in self._streams if key[0] == stock_code and stream in (None, key[1])]:
+            del self._streams[key]
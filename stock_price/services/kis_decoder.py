@@ -0,0 +1,191 @@
+from collections import namedtuple
+from itertools import compress
+from operator import itemgetter, ne
+from rest_framework import serializers
+from ..serializers import StockResponseSerializer, StockAskingPriceResponseSerializer
+
+TR_ID_HOGA = "H0UNASP0"
+TR_ID_HOGA_ELW = "H0STASP0"
+TR_ID_EXEC = "H0STCNT0"
+
+
+def build_field_table(serializer_class, count=None):
+    """
+    Serializer 필드 선언 순서(= KIS 응답 필드 순서)로 (필드명, 변환함수) 테이블 생성
+    FloatField -> float, 그 외 -> str (원문 그대로)
+    """
+    table = []
+    for name, field in serializer_class._declared_fields.items():
+        conv = float if isinstance(field, serializers.FloatField) else str
+        table.append((name, conv))
+    return tuple(table[:count])
+
+
+# TR_ID 별 필드 테이블 (H0STASP0 는 KRX 단독 호가로 NXT/중간가 필드 6개가 없음)
+FIELD_TABLES = {
+    TR_ID_EXEC: build_field_table(StockResponseSerializer),
+    TR_ID_HOGA: build_field_table(StockAskingPriceResponseSerializer),
+    TR_ID_HOGA_ELW: build_field_table(StockAskingPriceResponseSerializer, 59),
+}
+
+
+class TickDecoder:
+    """
+    필드 테이블 하나로부터 미리 컴파일된 실시간 프레임 디코더.
+
+    - records(): '^' 로 한 번만 split 하여 레코드(원문 문자열 튜플)로 자름 (형변환 없음)
+    - to_dict(): 위치 기반 getter 로 문자열/숫자 필드를 한 번에 변환하여 dict 생성
+      같은 종목의 직전 레코드가 있으면 값이 바뀐 필드만 변환하고 나머지는 직전 dict 를 재사용
+      (실시간 틱은 호가/시각/체결가 일부만 바뀌고 대부분의 필드가 그대로이므로)
+    형변환은 실제로 dict 가 필요한 시점에만 수행되므로 수신 루프 부담이 작다.
+    to_dict() 결과는 다음 레코드 변환의 기준으로 재사용되므로 호출자는 수정하지 말고 복사해서 쓸 것.
+    """
+    def __init__(self, tr_id, field_table):
+        self.tr_id = tr_id
+        self.names = tuple(name for name, _ in field_table)
+        self.convs = tuple(conv for _, conv in field_table)
+        self.field_count = len(self.names)
+        self.index = {name: i for i, name in enumerate(self.names)}
+
+        float_idx = [i for i, conv in enumerate(self.convs) if conv is float]
+        str_idx = [i for i, conv in enumerate(self.convs) if conv is not float]
+        self._float_names = tuple(self.names[i] for i in float_idx)
+        self._str_names = tuple(self.names[i] for i in str_idx)
+        self._get_floats = itemgetter(*float_idx)
+        self._get_strs = itemgetter(*str_idx)
+        self._positions = range(self.field_count)
+        self._previous = {}  # 종목코드(첫 필드) -> (직전 레코드, 직전 dict)
+
+    def records(self, content, count=1):
+        """
+        parts[3] 영역을 레코드 단위(필드 문자열 튜플) 리스트로 분리
+        체결이 몰리면 parts[2] 개수만큼의 레코드가 ^ 로 이어 붙어서 한 프레임에 옴
+        """
+        fields = content.split('^')
+        total = len(fields)
+        if count <= 1 and total <= self.field_count:
+            return [tuple(fields)]
+
+        # 레코드당 필드 수: 개수로 나누어 떨어지면 그 값을, 아니면 테이블 길이를 사용
+        n = total // count if count > 1 and total % count == 0 else self.field_count
+        return [tuple(fields[i:i + n]) for i in range(0, total, n)]
+
+    def to_dicts(self, records):
+        """레코드 배치를 dict 리스트로 변환"""
+        return [self.to_dict(fields) for fields in records]
+
+    def to_dict(self, fields):
+        """레코드 하나를 {필드명: 값} 으로 변환 (변환 실패/누락 필드는 None)"""
+        if len(fields) != self.field_count:
+            return self._to_dict_safe(fields)
+        previous = self._previous.get(fields[0])
+        if previous is not None:
+            data = self._to_dict_changed(fields, *previous)
+        else:
+            try:
+                data = dict(zip(self._str_names, self._get_strs(fields)))
+                data.update(zip(self._float_names, map(float, self._get_floats(fields))))
+            except ValueError:
+                data = self._to_dict_safe(fields)
+        self._previous[fields[0]] = (fields, data)
+        return data
+
+    def _to_dict_changed(self, fields, prev_fields, prev_data):
+        # 직전 dict 를 복사한 뒤 원문 문자열이 달라진 위치만 다시 변환
+        data = prev_data.copy()
+        names, convs = self.names, self.convs
+        for i in compress(self._positions, map(ne, fields, prev_fields)):
+            try:
+                data[names[i]] = convs[i](fields[i])
+            except ValueError:
+                data[names[i]] = None
+        return data
+
+    def forget(self, code):
+        """해제된 종목의 직전 레코드 정리"""
+        self._previous.pop(code, None)
+
+    def _to_dict_safe(self, fields):
+        # 빈 값/필드 누락이 섞인 레코드용 (기존 get_val 과 동일한 의미)
+        data = {}
+        count = len(fields)
+        for i, name in enumerate(self.names):
+            if i >= count:
+                data[name] = None
+                continue
+            try:
+                data[name] = self.convs[i](fields[i])
+            except ValueError:
+                data[name] = None
+        return data
+
+    def value(self, fields, name):
+        """레코드에서 단일 필드만 변환해서 꺼냄"""
+        i = self.index[name]
+        try:
+            return self.convs[i](fields[i])
+        except (IndexError, ValueError):
+            return None
+
+    def decode(self, raw_data):
+        """0|TR_ID|001|... 프레임의 첫 번째 레코드를 dict 로 반환 (parse_from_raw 호환)"""
+        try:
+            parts = raw_data.split('|', 3)
+            if len(parts) < 4:
+                return None
+            return self.to_dict(self.records(parts[3])[0])
+        except Exception:
+            return None
+
+
+DECODERS = {tr_id: TickDecoder(tr_id, table) for tr_id, table in FIELD_TABLES.items()}
+
+
+def get_decoder(tr_id):
+    return DECODERS.get(tr_id)
+
+
+class KISTick(namedtuple('KISTick', 'tr_id code fields')):
+    """
+    디코딩된 실시간 틱 1건 (불변, 튜플 기반)
+    fields 는 디코더 테이블 순서의 원문 문자열 튜플이며, 형변환은 필요할 때만 수행
+    """
+    __slots__ = ()
+
+    @property
+    def decoder(self):
+        return DECODERS[self.tr_id]
+
+    def value(self, name):
+        return DECODERS[self.tr_id].value(self.fields, name)
+
+    def to_dict(self):
+        return DECODERS[self.tr_id].to_dict(self.fields)
+
+
+def _record_count(value):
+    try:
+        return int(value)
+    except ValueError:
+        return 1
+
+
+def decode_frame(raw_data):
+    """
+    실시간 파이프(|) 프레임을 (decoder, records) 로 분리
+    records 는 프레임에 담긴 N개 레코드 전체 (0|H0STCNT0|003|... -> 3개)
+    지원하지 않는 TR_ID 이거나 형식이 맞지 않으면 None
+    """
+    parts = raw_data.split('|', 3)
+    if len(parts) < 4:
+        return None
+    decoder = DECODERS.get(parts[1])
+    if decoder is None or not parts[3]:
+        return None
+    if parts[2] == '001':
+        # 단일 레코드 프레임(대부분)은 records() 를 거치지 않고 바로 분리
+        fields = parts[3].split('^')
+        if len(fields) <= decoder.field_count:
+            return decoder, [tuple(fields)]
+        return decoder, decoder.records(parts[3])
+    return decoder, decoder.records(parts[3], _record_count(parts[2]))
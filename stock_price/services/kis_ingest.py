@@ -0,0 +1,223 @@
+import os
+import socket
+import asyncio
+from collections import Counter
+from channels.layers import get_channel_layer
+from django.conf import settings
+from django.core.cache import cache
+from .kis_session_pool import kis_pool
+from .theme_aggregates import theme_aggregates
+from . import metrics
+from .topics import ALL_STREAMS, topic, expand_topics, group_by_code
+
+INGEST_GROUP = "kis_ingest"                 # 웹 워커 -> ingest 프로세스 구독 intent 채널 그룹
+SLOT_USAGE_CACHE_KEY = "kis_ingest:slot_usage"  # ingest 프로세스가 주기적으로 기록하는 슬롯 현황
+
+
+def worker_id():
+    return f"{socket.gethostname()}:{os.getpid()}"
+
+
+def ingest_enabled():
+    """True 면 KIS 연결은 run_kis_ingest 프로세스가 전담하고 웹 워커는 intent 만 보냄"""
+    return getattr(settings, 'KIS_REALTIME_INGEST', False)
+
+
+_intent_client = None
+
+
+def realtime_feed():
+    """Consumer 가 사용할 구독 대상: ingest 모드면 워커 intent 클라이언트, 아니면 이 프로세스의 세션 풀"""
+    global _intent_client
+    if not ingest_enabled():
+        return kis_pool
+    if _intent_client is None:
+        _intent_client = IngestIntentClient()
+    return _intent_client
+
+
+class IngestIntentClient:
+    """
+    웹 워커 측 구독 클라이언트 (kis_pool 과 같은 subscribe/unsubscribe 인터페이스)
+    - 워커 내 토픽(exec:005930 / book:005930)별 시청자 수는 로컬에서 세고, 0 <-> 1 전환 시에만 intent 전송
+    - heartbeat 주기마다 현재 시청 토픽 전체를 보내 유실된 intent / ingest 재시작을 보정
+    """
+    def __init__(self, heartbeat_sec=None):
+        self.worker = worker_id()
+        self.heartbeat_sec = heartbeat_sec or getattr(settings, 'KIS_INGEST_HEARTBEAT_SEC', 10)
+        self.counts = Counter()  # 토픽 -> 워커 내 시청자 수
+        self._heartbeat_task = None
+
+    async def _send(self, message):
+        message["worker"] = self.worker
+        await metrics.group_send(get_channel_layer(), INGEST_GROUP, message)
+
+    async def subscribe_many(self, items):
+        """여러 종목 일괄 구독 [(종목코드, 스트림), ...] -> 새로 시청하는 토픽만 intent 1건으로 전송"""
+        added = []
+        for stock_code, streams in items:
+            for name in (topic(stream, stock_code) for stream in streams):
+                self.counts[name] += 1
+                if self.counts[name] == 1:
+                    added.append(name)
+        self._ensure_heartbeat()
+        if added:
+            await self._send({"type": "ingest.subscribe", "topics": added})
+
+    async def subscribe(self, stock_code, streams=ALL_STREAMS):
+        await self.subscribe_many([(stock_code, streams)])
+
+    async def unsubscribe(self, stock_code, streams=ALL_STREAMS):
+        removed = []
+        for name in (topic(stream, stock_code) for stream in streams):
+            if self.counts[name] <= 0:
+                continue
+            self.counts[name] -= 1
+            if self.counts[name] == 0:
+                del self.counts[name]
+                removed.append(name)
+        if removed:
+            await self._send({"type": "ingest.unsubscribe", "topics": removed})
+
+    def _ensure_heartbeat(self):
+        if not self._heartbeat_task or self._heartbeat_task.done():
+            self._heartbeat_task = asyncio.create_task(self._heartbeat_loop())
+
+    async def _heartbeat_loop(self):
+        while True:
+            try:
+                await self._send({"type": "ingest.heartbeat", "topics": sorted(self.counts)})
+            except Exception as e:
+                print(f"[KIS Ingest] Heartbeat error: {e}")
+            await asyncio.sleep(self.heartbeat_sec)
+
+    def slot_usage(self):
+        """ingest 프로세스가 캐시에 남긴 최신 슬롯 현황"""
+        return cache.get(SLOT_USAGE_CACHE_KEY) or {"ingest": "unavailable"}
+
+
+class ClusterRefCounter:
+    """
+    ingest 측 클러스터 전체 토픽별 참조 관리 (워커별 시청 토픽 집합의 합집합)
+    워커가 heartbeat 없이 timeout 을 넘기면 (프로세스 종료 등) 그 워커의 참조를 모두 제거
+    apply 계열 메서드는 (새로 구독할 토픽, 해제할 토픽) 을 반환
+    """
+    def __init__(self, timeout_sec=30):
+        self.timeout_sec = timeout_sec
+        self._workers = {}      # worker -> 시청 토픽 set
+        self._last_seen = {}    # worker -> 마지막 수신 시각
+        self.refs = Counter()   # 토픽 -> 시청 중인 워커 수
+
+    def _set_topics(self, worker, topics, now):
+        self._last_seen[worker] = now
+        before = self._workers.get(worker, set())
+        topics = set(topics)
+        self._workers[worker] = topics
+
+        added, removed = [], []
+        for name in topics - before:
+            self.refs[name] += 1
+            if self.refs[name] == 1:
+                added.append(name)
+        for name in before - topics:
+            self.refs[name] -= 1
+            if self.refs[name] == 0:
+                del self.refs[name]
+                removed.append(name)
+        return sorted(added), sorted(removed)
+
+    def subscribe(self, worker, topics, now):
+        return self._set_topics(worker, self._workers.get(worker, set()) | set(topics), now)
+
+    def unsubscribe(self, worker, topics, now):
+        return self._set_topics(worker, self._workers.get(worker, set()) - set(topics), now)
+
+    def heartbeat(self, worker, topics, now):
+        return self._set_topics(worker, topics, now)
+
+    def expire(self, now):
+        """timeout 된 워커 정리 -> (빈 리스트, 해제할 토픽)"""
+        removed = []
+        for worker in [w for w, seen in self._last_seen.items() if now - seen > self.timeout_sec]:
+            removed += self._set_topics(worker, (), now)[1]
+            del self._workers[worker]
+            del self._last_seen[worker]
+        return [], sorted(removed)
+
+    def workers(self):
+        return len(self._workers)
+
+
+class IngestServer:
+    """
+    run_kis_ingest 관리 명령에서 실행되는 단일 ingest 프로세스
+    KIS 세션 풀을 단독으로 소유하고, 채널 레이어로 들어오는 워커 intent 를 클러스터 refcount 로 반영
+    """
+    def __init__(self, pool):
+        self.pool = pool
+        heartbeat_sec = getattr(settings, 'KIS_INGEST_HEARTBEAT_SEC', 10)
+        self.refs = ClusterRefCounter(timeout_sec=heartbeat_sec * 3)
+        self.heartbeat_sec = heartbeat_sec
+        self.channel_layer = get_channel_layer()
+
+    async def apply(self, message):
+        """
+        워커 intent 1건 반영
+        토픽 목록("topics") 대신 종목코드("code" / "codes")만 보내는 이전 버전 워커는 체결 + 호가 구독으로 취급
+        """
+        now = asyncio.get_running_loop().time()
+        worker = message.get("worker")
+        kind = message.get("type")
+        if "topics" in message:
+            topics = expand_topics(message["topics"])
+        else:
+            topics = expand_topics(message.get("codes") or [message.get("code") or ""])
+        if kind == "ingest.subscribe":
+            added, removed = self.refs.subscribe(worker, topics, now)
+        elif kind == "ingest.unsubscribe":
+            added, removed = self.refs.unsubscribe(worker, topics, now)
+        elif kind == "ingest.heartbeat":
+            added, removed = self.refs.heartbeat(worker, topics, now)
+        else:
+            return
+        await self._apply_changes(added, removed)
+
+    async def _apply_changes(self, added, removed):
+        # 클러스터 전체에서 처음 시청 / 마지막 시청 종료된 토픽만 종목 단위로 묶어 KIS 세션에 반영
+        # 등록 패킷은 예약만 하고 전송(토큰 버킷 속도)은 기다리지 않음 -> 다른 워커의 intent / heartbeat 처리가 밀리지 않음
+        if added:
+            self.pool.reserve_many(group_by_code(added).items())
+        for code, streams in group_by_code(removed).items():
+            await self.pool.unsubscribe(code, streams)
+
+    async def _housekeeping_loop(self, channel):
+        """죽은 워커 참조 정리 + 슬롯 현황을 캐시에 기록 (웹 워커의 /stock/realtime/slots/ 용)"""
+        loop = asyncio.get_running_loop()
+        while True:
+            await asyncio.sleep(self.heartbeat_sec)
+            try:
+                # channels_redis 그룹 멤버십은 group_expiry 후 만료되므로 주기적으로 갱신
+                await self.channel_layer.group_add(INGEST_GROUP, channel)
+                await self._apply_changes(*self.refs.expire(loop.time()))
+                usage = {**self.pool.slot_usage(), "workers": self.refs.workers(), "topics": len(self.refs.refs)}
+                await asyncio.to_thread(cache.set, SLOT_USAGE_CACHE_KEY, usage, self.heartbeat_sec * 3)
+            except Exception as e:
+                print(f"[KIS Ingest] Housekeeping error: {e}")
+
+    async def run(self):
+        channel = await self.channel_layer.new_channel()
+        await self.channel_layer.group_add(INGEST_GROUP, channel)
+        print(f"[KIS Ingest] Listening for intents on '{INGEST_GROUP}' ({len(self.pool.sessions)} KIS sessions)")
+        # 웹 워커는 틱을 받지 않으므로 테마 집계는 KIS 피드를 가진 이 프로세스에서만 실행
+        theme_aggregates.start(self.channel_layer)
+        housekeeping = asyncio.create_task(self._housekeeping_loop(channel))
+        try:
+            while True:
+                message = await self.channel_layer.receive(channel)
+                try:
+                    await self.apply(message)
+                except Exception as e:
+                    print(f"[KIS Ingest] Intent error {message}: {e}")
+        finally:
+            housekeeping.cancel()
+            await self.channel_layer.group_discard(INGEST_GROUP, channel)
@@ -0,0 +1,225 @@
+import json
+import random
+import asyncio
+from datetime import datetime
+import websockets
+from .kis_decoder import DECODERS, TR_ID_EXEC
+from .tick_journal import read_journal
+
+
+def parse_speed(value):
+    """'1x' / '10' / 'max' -> 배속 (max 는 None: 대기 없이 최대 속도)"""
+    value = str(value).strip().lower()
+    if value == "max":
+        return None
+    speed = float(value.rstrip("x"))
+    if speed <= 0:
+        raise ValueError(f"speed must be positive or 'max': {value}")
+    return speed
+
+
+def frame_key(frame):
+    """'0|TR_ID|NNN|종목코드^...' -> (tr_id, 종목코드), 시스템(JSON) 메시지는 None"""
+    if not frame or frame[0] not in "01":
+        return None
+    parts = frame.split("|", 3)
+    if len(parts) < 4:
+        return None
+    return parts[1], parts[3].split("^", 1)[0]
+
+
+def _tick_size(price):
+    return 10 if price < 10000 else 50 if price < 50000 else 100
+
+
+class SyntheticFeed:
+    """등록된 종목별 랜덤워크 가격으로 KIS 형식의 체결/호가 프레임 생성 (필드 수/순서는 디코더 테이블 기준)"""
+    def __init__(self, seed=None):
+        self.rng = random.Random(seed)
+        self._prices = {}
+        self._bases = {}    # 전일 종가 역할 (첫 가격)
+        self._volumes = {}
+
+    def _step(self, code):
+        price = self._prices.get(code)
+        if price is None:
+            price = self.rng.randrange(50, 1000) * 100
+        price = max(_tick_size(price), price + self.rng.choice((-1, 0, 0, 1)) * _tick_size(price))
+        self._prices[code] = price
+        return price
+
+    def frame(self, tr_id, code, now=None):
+        decoder = DECODERS[tr_id]
+        hour = (now or datetime.now()).strftime("%H%M%S")
+        fields = dict.fromkeys(decoder.names, "0")
+        fields["MKSC_SHRN_ISCD"] = code
+        price = self._step(code)
+        tick = _tick_size(price)
+
+        if tr_id == TR_ID_EXEC:
+            volume = self.rng.randint(1, 500)
+            self._volumes[code] = self._volumes.get(code, 0) + volume
+            base = self._bases.setdefault(code, price)
+            fields.update(
+                STCK_CNTG_HOUR=hour, STCK_PRPR=str(price), PRDY_VRSS=str(price - base),
+                PRDY_VRSS_SIGN="2" if price > base else "5" if price < base else "3",
+                PRDY_CTRT=f"{(price - base) / base * 100:.2f}", CNTG_VOL=str(volume),
+                ACML_VOL=str(self._volumes[code]), ASKP1=str(price + tick), BIDP1=str(price),
+            )
+        else:
+            fields["BSOP_HOUR"] = hour
+            for i in range(1, 11):
+                fields[f"ASKP{i}"] = str(price + i * tick)
+                fields[f"BIDP{i}"] = str(price - (i - 1) * tick)
+                fields[f"ASKP_RSQN{i}"] = str(self.rng.randint(1, 5000))
+                fields[f"BIDP_RSQN{i}"] = str(self.rng.randint(1, 5000))
+            fields["TOTAL_ASKP_RSQN"] = str(sum(int(fields[f"ASKP_RSQN{i}"]) for i in range(1, 11)))
+            fields["TOTAL_BIDP_RSQN"] = str(sum(int(fields[f"BIDP_RSQN{i}"]) for i in range(1, 11)))
+        return f"0|{tr_id}|001|" + "^".join(fields.values())
+
+
+class _Connection:
+    def __init__(self, ws):
+        self.ws = ws
+        self.registrations = set()   # (tr_id, 종목코드)
+
+
+class KISReplayServer:
+    """
+    부하 테스트용 로컬 KIS 실시간 웹소켓 서버
+    - KIS 와 같은 등록(tr_type=1)/해제(tr_type=2) JSON 응답, PINGPONG, 등록 한도(MAX SUBSCRIBE OVER) 흉내
+    - 연결별로 등록된 (tr_id, 종목) 프레임만 전송
+      journal: 저널 세그먼트 재생 (수신 시각 간격 / 배속, 끝나면 처음부터 반복)
+      journal 없음: SyntheticFeed 로 종목당 초당 rate 건(배속 적용)씩 체결/호가 생성
+    """
+    def __init__(self, journal_paths=None, speed=1.0, rate=5.0, max_registrations=41, ping_sec=30, seed=None):
+        self.journal_paths = list(journal_paths or [])
+        self.speed = speed
+        self.rate = rate
+        self.max_registrations = max_registrations
+        self.ping_sec = ping_sec
+        self.synthetic = SyntheticFeed(seed)
+        self.connections = set()
+        self.frames_sent = 0
+
+    def _ack(self, tr_id, tr_key, rt_cd, msg1):
+        return json.dumps({
+            "header": {"tr_id": tr_id, "tr_key": tr_key, "encrypt": "N"},
+            "body": {"rt_cd": rt_cd, "msg_cd": "OPSP0000" if rt_cd == "0" else "OPSP0008", "msg1": msg1},
+        })
+
+    def register(self, conn, message):
+        """등록/해제 요청 1건 처리 -> KIS 형식 응답 JSON"""
+        header = message.get("header", {})
+        body_input = message.get("body", {}).get("input", {})
+        key = (body_input.get("tr_id"), body_input.get("tr_key"))
+        if not header.get("approval_key") or not all(key):
+            return self._ack(key[0], key[1], "1", "invalid approval : NOT FOUND")
+        if header.get("tr_type") == "2":
+            conn.registrations.discard(key)
+            return self._ack(*key, "0", "UNSUBSCRIBE SUCCESS")
+        if key in conn.registrations:
+            return self._ack(*key, "0", "ALREADY IN SUBSCRIBE")
+        if len(conn.registrations) >= self.max_registrations:
+            return self._ack(*key, "1", "MAX SUBSCRIBE OVER")
+        conn.registrations.add(key)
+        return self._ack(*key, "0", "SUBSCRIBE SUCCESS")
+
+    async def handler(self, ws):
+        conn = _Connection(ws)
+        self.connections.add(conn)
+        tasks = [asyncio.create_task(self._play(conn)), asyncio.create_task(self._ping_loop(conn))]
+        try:
+            async for data in ws:
+                try:
+                    message = json.loads(data)
+                except (TypeError, ValueError):
+                    continue
+                await ws.send(self.register(conn, message))
+        except websockets.ConnectionClosed:
+            pass
+        finally:
+            for task in tasks:
+                task.cancel()
+            self.connections.discard(conn)
+
+    async def _ping_loop(self, conn):
+        while True:
+            await asyncio.sleep(self.ping_sec)
+            await conn.ws.send(json.dumps({"header": {"tr_id": "PINGPONG", "datetime": datetime.now().strftime("%Y%m%d%H%M%S")}}))
+
+    async def _send(self, conn, frame):
+        await conn.ws.send(frame)
+        self.frames_sent += 1
+
+    async def _play(self, conn):
+        if self.journal_paths:
+            await self._play_journal(conn)
+        else:
+            await self._play_synthetic(conn)
+
+    async def _play_synthetic(self, conn):
+        """등록된 (tr_id, 종목) 마다 1건씩 보내는 라운드를 초당 rate x 배속 회"""
+        loop = asyncio.get_running_loop()
+        interval = 1 / (self.rate * self.speed) if self.speed else 0
+        next_round = loop.time()
+        while True:
+            keys = sorted(conn.registrations)
+            if not keys:
+                await asyncio.sleep(0.05)
+                next_round = loop.time()
+                continue
+            now = datetime.now()
+            for tr_id, code in keys:
+                await self._send(conn, self.synthetic.frame(tr_id, code, now))
+            if interval:
+                next_round += interval
+                await asyncio.sleep(max(0, next_round - loop.time()))
+            else:
+                await asyncio.sleep(0)
+
+    async def _play_journal(self, conn):
+        """저널을 기록된 수신 간격 / 배속으로 재생 (등록되지 않은 종목, 시스템 메시지는 건너뜀)"""
+        loop = asyncio.get_running_loop()
+        while True:
+            started = first_ts = None
+            sent = scanned = 0
+            for ts, frame in read_journal(self.journal_paths):
+                scanned += 1
+                if not self.speed and scanned % 256 == 0:
+                    await asyncio.sleep(0)  # max 배속 / 등록되지 않은 종목만 이어져도 다른 연결/등록 요청 처리
+                key = frame_key(frame)
+                if key is None or key not in conn.registrations:
+                    continue
+                if first_ts is None:
+                    started, first_ts = loop.time(), ts
+                if self.speed:
+                    delay = (ts - first_ts) / 1e6 / self.speed - (loop.time() - started)
+                    if delay > 0:
+                        await asyncio.sleep(delay)
+                await self._send(conn, frame)
+                sent += 1
+            if not sent:
+                await asyncio.sleep(0.1)  # 아직 등록 전이거나 저널에 해당 종목이 없음
+            else:
+                await asyncio.sleep(0)
+
+    async def _stats_loop(self, interval=5):
+        last = self.frames_sent
+        while True:
+            await asyncio.sleep(interval)
+            sent, last = self.frames_sent - last, self.frames_sent
+            registrations = sum(len(conn.registrations) for conn in self.connections)
+            print(f"[KIS Replay] connections={len(self.connections)} registrations={registrations} "
+                  f"sent={self.frames_sent} ({sent / interval:,.0f} frames/s)")
+
+    async def run(self, host="127.0.0.1", port=21000):
+        async with websockets.serve(self.handler, host, port) as server:
+            source = f"{len(self.journal_paths)} journal segment(s)" if self.journal_paths else "synthetic feed"
+            speed = f"{self.speed:g}x" if self.speed else "max"
+            print(f"[KIS Replay] Serving {source} at ws://{host}:{port} ({speed})")
+            stats = asyncio.create_task(self._stats_loop())
+            try:
+                await server.serve_forever()
+            finally:
+                stats.cancel()
@@ -1,7 +1,7 @@
-import httpx
 import os
 import asyncio
 from auth.kis_auth import get_access_token
+from .metrics import RestClient, AsyncRestClient
 from dotenv import load_dotenv
 
 # .env 로드
@@ -59,7 +59,7 @@ class KISRestClient:
             "fid_rsfl_rate1": "",
         }
 
-        async with httpx.AsyncClient() as client:
+        async with AsyncRestClient() as client:
             try:
                 response = await client.get(url, headers=headers, params=params, timeout=10)
                 data = response.json()
@@ -96,7 +96,7 @@ class KISRestClient:
            "FID_INPUT_DATE_1": ""
         }
 
-        async with httpx.AsyncClient() as client:
+        async with AsyncRestClient() as client:
             try:
                 response = await client.get(url, headers=headers, params=params, timeout=10)
                 data = response.json()
@@ -128,7 +128,7 @@ class KISRestClient:
             "fid_input_iscd": iscd
         }
 
-        with httpx.Client() as client:
+        with RestClient() as client:
             try:
                 response = client.get(url, headers=headers, params=params, timeout=10)
                 data = response.json()
@@ -153,7 +153,7 @@ class KISRestClient:
             "fid_input_iscd": iscd
         }
 
-        async with httpx.AsyncClient() as client:
+        async with AsyncRestClient() as client:
             try:
                 response = await client.get(url, headers=headers, params=params, timeout=10)
                 data = response.json()
@@ -179,7 +179,7 @@ class KISRestClient:
         results = {}
         
         # 하나의 클라이언트 세션을 재사용하여 연결 오버헤드 감소
-        async with httpx.AsyncClient() as client:
+        async with AsyncRestClient() as client:
             tasks = []
             for code in code_list:
                 params = {
@@ -236,7 +236,7 @@ class KISRestClient:
             "CTX_AREA_FK": ""
         }
 
-        with httpx.Client() as client:
+        with RestClient() as client:
             try:
                 response = client.get(url, headers=headers, params=params, timeout=5)
                 data = response.json()
@@ -276,7 +276,7 @@ class KISRestClient:
             "CTX_AREA_FK": ""
         }
 
-        async with httpx.AsyncClient() as client:
+        async with AsyncRestClient() as client:
             try:
                 response = await client.get(url, headers=headers, params=params, timeout=5)
                 data = response.json()
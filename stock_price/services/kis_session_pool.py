@@ -0,0 +1,140 @@
+import asyncio
+import os
+import bisect
+import zlib
+from django.conf import settings
+from .kis_ws_client import KISWebSocketClient, APP_KEY, APP_SECRET
+from .topics import ALL_STREAMS
+from .metrics import register_pool_metrics
+from .theme_aggregates import theme_aggregates
+
+STRATEGY_HASH = "hash"          # 일관 해싱: 세션 수가 바뀌어도 대부분의 종목은 같은 세션 유지
+STRATEGY_LEAST_LOAD = "least_load"  # 시청 중 슬롯이 가장 적은 세션에 배정
+
+VIRTUAL_NODES = 64
+
+
+def load_credentials():
+    """
+    .env 의 KIS 앱키 목록 (g_appkey/g_appsecret, g_appkey_2/g_appsecret_2, ...)
+    앱키 1개당 KIS 웹소켓 세션 1개 (approval key 별 등록 한도가 따로 적용됨)
+    """
+    credentials = [(APP_KEY, APP_SECRET)]
+    n = 2
+    while os.getenv(f'g_appkey_{n}') and os.getenv(f'g_appsecret_{n}'):
+        credentials.append((os.getenv(f'g_appkey_{n}'), os.getenv(f'g_appsecret_{n}')))
+        n += 1
+    return credentials
+
+
+class KISSessionPool:
+    """
+    여러 KIS 웹소켓 세션(샤드)에 종목을 나눠 배정하는 풀
+    - 종목 하나의 호가/체결은 항상 같은 세션에 등록 (배정은 종목의 슬롯이 하나라도 살아있는 동안 유지)
+    - 각 세션은 독립된 연결/재연결 루프를 가지므로 한 샤드의 재연결이 다른 샤드에 영향 없음
+    Consumer 에서는 단일 클라이언트와 같은 subscribe/unsubscribe 인터페이스로 사용
+    """
+    def __init__(self, sessions, strategy=STRATEGY_HASH):
+        self.sessions = list(sessions)
+        self.strategy = strategy
+        self._assignments = {}  # 종목코드 -> 세션
+        self._ring = sorted(
+            (zlib.crc32(f"{session.name}#{v}".encode()), i)
+            for i, session in enumerate(self.sessions)
+            for v in range(VIRTUAL_NODES)
+        )
+        self._ring_hashes = [h for h, _ in self._ring]
+
+    @classmethod
+    def from_settings(cls):
+        credentials = load_credentials()
+        max_sessions = getattr(settings, 'KIS_WS_MAX_SESSIONS', 0)
+        if max_sessions:
+            credentials = credentials[:max_sessions]
+        sessions = [
+            KISWebSocketClient(appkey=appkey, appsecret=appsecret, name=f"kis-{i}")
+            for i, (appkey, appsecret) in enumerate(credentials)
+        ]
+        return cls(sessions, getattr(settings, 'KIS_WS_SESSION_STRATEGY', STRATEGY_HASH))
+
+    def _ring_order(self, stock_code):
+        """일관 해싱 링에서 종목코드 위치부터 시계방향 세션 순서 (중복 제거)"""
+        start = bisect.bisect(self._ring_hashes, zlib.crc32(stock_code.encode()))
+        seen = []
+        for j in range(len(self._ring)):
+            i = self._ring[(start + j) % len(self._ring)][1]
+            if i not in seen:
+                seen.append(i)
+                if len(seen) == len(self.sessions):
+                    break
+        return [self.sessions[i] for i in seen]
+
+    def session_for(self, stock_code, needed=2):
+        """종목이 배정된 세션 (없거나 해당 세션에서 해제되었으면 needed 개 슬롯 여유가 있는 세션에 새로 배정)"""
+        session = self._assignments.get(stock_code)
+        if session is not None and session.slots.holds(stock_code):
+            return session
+
+        if self.strategy == STRATEGY_LEAST_LOAD:
+            session = min(self.sessions, key=lambda s: s.slots.usage()["active"])
+        else:
+            # 해시 순서대로 여유 슬롯이 있는 첫 세션, 모두 가득 차면 해시 위치 세션(LRU 해제)
+            candidates = self._ring_order(stock_code)
+            session = next((s for s in candidates if s.slots.has_room(needed)), candidates[0])
+
+        self._assignments[stock_code] = session
+        return session
+
+    def reserve_many(self, items):
+        """
+        여러 종목 일괄 구독 예약 [(종목코드, 스트림), ...] (동기, await 없음)
+        종목마다 세션 배정 + 슬롯 예약을 순서대로 끝냄 (배정이 앞 종목의 예약을 반영)
+        Returns: 세션별 등록 패킷 전송 완료 future 리스트 (토큰 버킷 속도로 전송됨)
+        """
+        # 테마 집계는 KIS 피드를 가진 프로세스(이 풀을 쓰는 프로세스)에서 세션 수와 무관하게 1개만 실행
+        theme_aggregates.start(self.sessions[0].channel_layer)
+        pending = []
+        for stock_code, streams in items:
+            pending += self.session_for(stock_code, len(streams)).reserve(stock_code, streams)
+        return pending
+
+    async def subscribe_many(self, items):
+        """여러 종목 일괄 구독: reserve_many 후 세션별 패킷 전송을 함께 기다림"""
+        pending = self.reserve_many(items)
+        if pending:
+            await asyncio.gather(*pending)
+
+    async def subscribe(self, stock_code, streams=ALL_STREAMS):
+        await self.subscribe_many([(stock_code, streams)])
+
+    async def unsubscribe(self, stock_code, streams=ALL_STREAMS):
+        # 배정 기록(_assignments)은 재배정 시 덮어써지므로 실제로 시청자를 들고 있는 세션에서만 해제
+        session = self._holder(stock_code, streams)
+        if session is not None:
+            await session.unsubscribe(stock_code, streams)
+
+    def _holder(self, stock_code, streams=ALL_STREAMS):
+        """종목 스트림의 시청자(대기 중 포함)가 있는 세션 (배정된 세션 우선, 없으면 None -> 해제할 것이 없음)"""
+        assigned = self._assignments.get(stock_code)
+        for session in ([assigned] if assigned is not None else []) + self.sessions:
+            keys = session._slot_keys(stock_code, streams)
+            if any(session.slots.watchers(key) or session.slots.waiting(key) for key in keys):
+                return session
+        return None
+
+    def slot_usage(self):
+        """전체 세션 합계 + 세션별 슬롯 사용 현황"""
+        per_session = {session.name: session.slot_usage() for session in self.sessions}
+        return {
+            "sessions": len(self.sessions),
+            "strategy": self.strategy,
+            "used": sum(u["used"] for u in per_session.values()),
+            "capacity": sum(u["capacity"] for u in per_session.values()),
+            "by_session": per_session,
+        }
+
+
+# 모듈 레벨에서 인스턴스 생성 (이 파일이 import 될 때 딱 한 번 생성됨)
+kis_pool = KISSessionPool.from_settings()
+
+register_pool_metrics(kis_pool)
@@ -0,0 +1,175 @@
+import time
+from collections import OrderedDict, Counter
+
+
+class _Slot:
+    __slots__ = ('watchers', 'idle_since')
+
+    def __init__(self):
+        self.watchers = 0
+        self.idle_since = None
+
+
+class KISSlotManager:
+    """
+    KIS 실시간 등록(tr_id, 종목코드) 슬롯 관리자
+    - 슬롯별 시청자 수(refcount) 관리, 0 이 되면 linger 초 동안 유지 후 해제 대상으로 반환
+    - 세션당 등록 한도(capacity) 도달 시 시청자 없는 lingering 종목만 밀어냄 (오래 전에 시청 종료된 순)
+    - 시청 중인 슬롯으로 가득 차 있으면 밀어내지 않고 대기열에 넣었다가 슬롯이 비면 순서대로 등록 (promote)
+      대기 중인 키도 시청자 수를 세므로 대기 중 구독 취소(release)도 그대로 반영됨
+    네트워크 전송은 하지 않음: 반환된 (tr_id, code) 목록으로 호출자가 tr_type=1/2 패킷 전송
+    """
+    def __init__(self, capacity=40, linger_sec=30.0, clock=time.monotonic):
+        self.capacity = max(1, capacity)
+        self.linger_sec = linger_sec
+        self.clock = clock
+        self._slots = OrderedDict()  # (tr_id, code) -> _Slot, 앞쪽일수록 오래 전에 시청
+        self._waiting = OrderedDict()  # (tr_id, code) -> 대기 중 시청자 수 (먼저 요청한 순)
+        self.evicted = 0
+        self.released = 0
+        self.queued = 0
+
+    def __len__(self):
+        return len(self._slots)
+
+    def __contains__(self, key):
+        return key in self._slots
+
+    def has_room(self, needed=2):
+        """시청 중인 슬롯을 밀어내지 않고 needed 개를 더 등록할 수 있는지 (lingering 슬롯은 여유로 취급)"""
+        active = sum(1 for slot in self._slots.values() if slot.watchers > 0)
+        return active + needed <= self.capacity
+
+    def holds(self, code):
+        """종목의 슬롯(호가 / 체결 중 하나라도)이 이 세션에 있거나 대기 중인지"""
+        return any(key[1] == code for key in self._slots) or any(key[1] == code for key in self._waiting)
+
+    def watchers(self, key):
+        slot = self._slots.get(key)
+        return slot.watchers if slot else 0
+
+    def waiting(self, key):
+        """슬롯이 없어 대기 중인 시청자 수"""
+        return self._waiting.get(key, 0)
+
+    def acquire(self, keys):
+        """
+        시청자 1명 추가
+        Returns: (새로 등록해야 할 키 리스트, 한도 초과로 해제해야 할 lingering 키 리스트, 대기열에 들어간 키 리스트)
+        """
+        register, evict, queued = [], [], []
+        for key in keys:
+            if key in self._waiting:
+                self._waiting[key] += 1
+                continue
+            slot = self._slots.get(key)
+            if slot is None:
+                if len(self._slots) >= self.capacity:
+                    victims = self._evict_symbol(exclude=keys)
+                    if not victims:
+                        # 시청 중인 종목은 밀어내지 않음 -> 슬롯이 빌 때까지 대기
+                        self._waiting[key] = 1
+                        self.queued += 1
+                        queued.append(key)
+                        continue
+                    evict.extend(victims)
+                slot = self._slots[key] = _Slot()
+                register.append(key)
+            slot.watchers += 1
+            slot.idle_since = None
+            self._slots.move_to_end(key)
+        return register, evict, queued
+
+    def release(self, keys):
+        """시청자 1명 제거 (0명이 되어도 바로 해제하지 않고 linger 시작, 대기 중인 키면 대기 시청자만 감소)"""
+        now = self.clock()
+        for key in keys:
+            if key in self._waiting:
+                self._waiting[key] -= 1
+                if self._waiting[key] <= 0:
+                    del self._waiting[key]
+                continue
+            slot = self._slots.get(key)
+            if slot is None or slot.watchers == 0:
+                continue
+            slot.watchers -= 1
+            if slot.watchers == 0:
+                slot.idle_since = now
+
+    def expired(self):
+        """linger 시간이 지난 시청자 0명 슬롯을 제거하고 해제할 키 리스트로 반환"""
+        now = self.clock()
+        keys = [
+            key for key, slot in self._slots.items()
+            if slot.idle_since is not None and now - slot.idle_since >= self.linger_sec
+        ]
+        for key in keys:
+            del self._slots[key]
+        self.released += len(keys)
+        return keys
+
+    def promote(self):
+        """
+        빈 슬롯(한도 여유 또는 lingering 슬롯)만큼 대기열의 키를 먼저 요청한 순서대로 등록
+        Returns: (새로 등록해야 할 키 리스트, 밀어낸 lingering 키 리스트)
+        """
+        register, evict = [], []
+        while self._waiting:
+            key = next(iter(self._waiting))
+            if len(self._slots) >= self.capacity:
+                victims = self._evict_symbol(exclude=(key,))
+                if not victims:
+                    break
+                evict.extend(victims)
+            slot = self._slots[key] = _Slot()
+            slot.watchers = self._waiting.pop(key)
+            register.append(key)
+        return register, evict
+
+    def active_keys(self):
+        """시청자가 있는 슬롯 (재연결 시 재등록 대상)"""
+        return [key for key, slot in self._slots.items() if slot.watchers > 0]
+
+    def reset_idle(self):
+        """새 세션에서는 lingering 슬롯을 다시 등록할 필요가 없으므로 정리"""
+        for key in [key for key, slot in self._slots.items() if slot.watchers == 0]:
+            del self._slots[key]
+
+    def _evict_symbol(self, exclude=()):
+        """가장 오래 전에 시청 종료된 종목의 lingering 슬롯(호가/체결)을 모두 제거하고 반환"""
+        victim = self._pick_victim(exclude)
+        if victim is None:
+            return []
+        code = victim[1]
+        keys = [key for key, slot in self._slots.items()
+                if key[1] == code and key not in exclude and slot.watchers == 0]
+        for key in keys:
+            del self._slots[key]
+        self.evicted += 1
+        return keys
+
+    def _pick_victim(self, exclude=()):
+        """시청 종료된 지 가장 오래된 lingering 슬롯 (시청 중인 슬롯은 대상이 아님)"""
+        idle = None
+        for key, slot in self._slots.items():
+            if key in exclude or slot.watchers > 0:
+                continue
+            if idle is None or slot.idle_since < self._slots[idle].idle_since:
+                idle = key
+        return idle
+
+    def usage(self):
+        """현재 슬롯 사용 현황"""
+        by_tr_id = Counter(tr_id for tr_id, _ in self._slots)
+        idle = sum(1 for slot in self._slots.values() if slot.watchers == 0)
+        return {
+            "used": len(self._slots),
+            "capacity": self.capacity,
+            "active": len(self._slots) - idle,
+            "lingering": idle,
+            "by_tr_id": dict(by_tr_id),
+            "waiting": len(self._waiting),
+            "evicted": self.evicted,
+            "released": self.released,
+            "queued": self.queued,
+        }
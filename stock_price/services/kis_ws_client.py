@@ -1,10 +1,28 @@
 import os
 import json
+import time
 import asyncio
+import functools
 import websockets
 from collections import defaultdict
 from channels.layers import get_channel_layer
+from django.conf import settings
 from ..serializers import StockRequestSerializer, StockResponseSerializer, StockAskingPriceResponseSerializer
+from .kis_decoder import decode_frame, KISTick, DECODERS, TR_ID_HOGA, TR_ID_HOGA_ELW, TR_ID_EXEC
+from .tick_conflator import TickConflator, stream_of, STREAM_EXEC, STREAM_HOGA
+from .topics import ALL_STREAMS, topic, group_name
+from .delta_encoder import DeltaEncoder
+from .kis_slot_manager import KISSlotManager
+from .local_hub import local_hub
+from .last_value_cache import lvc
+from .order_book import order_books
+from .candle_aggregator import candles
+from .theme_aggregates import theme_aggregates
+from .rate_pacer import TokenBucket
+from .tick_journal import TickJournal
+from .latency import latency, STAGE_DECODE, STAGE_PUBLISH
+from . import metrics
+from . import wire_format
 from dotenv import load_dotenv
 from auth.kis_auth import get_approval_key
 
@@ -16,32 +34,106 @@ APP_KEY = os.getenv('g_appkey')
 APP_SECRET = os.getenv('g_appsecret')
 
 WS_BASE_URL = "ws://ops.koreainvestment.com:21000"
-TR_ID_HOGA = "H0UNASP0"
-TR_ID_HOGA_ELW = "H0STASP0"
-TR_ID_EXEC = "H0STCNT0"
+
+RESPONSE_SERIALIZERS = {
+    TR_ID_HOGA: StockAskingPriceResponseSerializer,
+    TR_ID_HOGA_ELW: StockAskingPriceResponseSerializer,
+    TR_ID_EXEC: StockResponseSerializer,
+}
+
+# stream_status 이벤트의 등록 상태 (슬롯이 가득 차 대기 중 / 대기 후 등록됨)
+STATUS_QUEUED = "queued"
+STATUS_LIVE = "live"
 
 class KISWebSocketClient:
-    def __init__(self):
+    """KIS 실시간 웹소켓 세션 1개 (앱키 1개). 여러 세션은 KISSessionPool 이 관리"""
+    def __init__(self, appkey=None, appsecret=None, name="kis-0"):
+        self.appkey = appkey or APP_KEY
+        self.appsecret = appsecret or APP_SECRET
+        self.name = name
+        # 접속 주소 (부하 테스트 시 run_kis_replay 로컬 서버로 변경 가능)
+        self.ws_url = getattr(settings, 'KIS_WS_BASE_URL', None) or WS_BASE_URL
+        # 고정 approval key 가 설정되어 있으면 발급 API 호출 생략 (로컬 리플레이 서버용)
+        self.static_approval_key = getattr(settings, 'KIS_WS_APPROVAL_KEY', None)
         self.approval_key = None
         self.ws = None
         self.connected = False
-        self.lock = asyncio.Lock()
-        self._subscriber_counts = defaultdict(int) 
         self.logged_stocks = set()
         self.channel_layer = get_channel_layer()
         self.running = False
         self.task = None
 
+        # 틱 DRF 검증 모드: off(기본, 검증 없이 바로 전송) / sample(N건 중 1건 검증 후 로그) / all(전수 검증, 디버그)
+        self.validation_mode = getattr(settings, 'KIS_REALTIME_VALIDATION', 'off')
+        self.validation_sample_rate = max(1, getattr(settings, 'KIS_REALTIME_VALIDATION_SAMPLE_RATE', 100))
+        self._validation_counter = 0
+
+        # 종목/스트림별 conflation 주기(ms). 0 이면 틱마다 즉시 전송
+        conflation_ms = getattr(settings, 'KIS_REALTIME_CONFLATION_MS', 100)
+        self.conflator = TickConflator(conflation_ms) if conflation_ms > 0 else None
+        self._flush_task = None
+        self._conflated_since = {}  # 종목 -> conflation 버퍼에 들어간 가장 오래된 프레임의 수신 시각
+
+        # 스트림별 마지막 전송 스냅샷 기준 delta + seq 부여 (N건마다 전체 keyframe)
+        self.delta_encoder = DeltaEncoder(getattr(settings, 'KIS_REALTIME_KEYFRAME_INTERVAL', 50))
+
+        # 같은 프로세스 Consumer 는 LocalHub 로 직접 전달, Redis 그룹 전송은 ingest 프로세스일 때만
+        self.publish_remote = getattr(settings, 'KIS_REALTIME_INGEST', False)
+
+        # publisher 에서 한 번만 인코딩해서 붙여 보낼 포맷 (시청자 수와 무관하게 틱당 1회)
+        self.preencode_formats = [
+            wire_format.negotiate(fmt) for fmt in getattr(settings, 'KIS_REALTIME_PREENCODE_FORMATS', ['json', 'array'])
+        ]
+
+        # (tr_id, 종목) 등록 슬롯: 시청자 0명이 되면 linger 후 tr_type=2 해제, 한도 도달 시 LRU 종목 해제
+        self.slots = KISSlotManager(
+            capacity=getattr(settings, 'KIS_WS_MAX_REGISTRATIONS', 41),
+            linger_sec=getattr(settings, 'KIS_WS_UNSUBSCRIBE_LINGER_SEC', 30),
+        )
+        self._linger_task = None
+
+        # 등록/해제 패킷은 큐에 넣고 전송 태스크 1개가 토큰 버킷 속도로 보냄 (종목 수십 개 일괄 구독 시 KIS 거부 방지)
+        # 슬롯 refcount 계산은 await 없이 끝나므로 전송(I/O) 동안 다른 Consumer 의 구독을 막지 않음
+        self.pacer = TokenBucket(
+            getattr(settings, 'KIS_WS_REGISTRATION_RATE', 20), getattr(settings, 'KIS_WS_REGISTRATION_BURST', 20),
+        )
+        self._registrations = None  # (패킷 JSON, 전송 완료 future, 큐에 넣을 때의 ws) 큐, 전송 태스크와 함께 생성
+        self._registration_task = None
+
+        # 수신 루프는 프레임을 큐에 넣기만 하고, 처리(디코딩/전송)는 별도 태스크 N개가 담당
+        # 종목코드 해시로 큐를 고르므로 같은 종목의 프레임 순서는 유지됨. 큐가 가득 차면 버리고 카운트
+        self.recv_workers = max(1, getattr(settings, 'KIS_RECV_WORKERS', 2))
+        self.recv_queue_size = getattr(settings, 'KIS_RECV_QUEUE_SIZE', 5000)
+        self._recv_queues = [asyncio.Queue(self.recv_queue_size) for _ in range(self.recv_workers)]
+        self._recv_tasks = []
+        self.frames_received = 0
+        self.frames_dropped = 0
+
+        # 수신 원문 프레임 기록 (사후 분석 / 부하 테스트 재생용). 디렉터리 미설정 시 비활성
+        journal_dir = getattr(settings, 'KIS_JOURNAL_DIR', None)
+        self.journal = TickJournal(
+            journal_dir, name=self.name, flush_sec=getattr(settings, 'KIS_JOURNAL_FLUSH_SEC', 1.0),
+        ) if journal_dir else None
+
     async def _get_approval_key(self):
+        if self.static_approval_key:
+            return self.static_approval_key
         loop = asyncio.get_running_loop()
-        return await loop.run_in_executor(None, get_approval_key)
+        return await loop.run_in_executor(None, functools.partial(get_approval_key, self.appkey, self.appsecret))
 
     async def _connect_and_run(self):
         if self.running: return
 
         self.running = True
-        print("[KIS Client] Starting connection...")
-        
+        print(f"[KIS Client] Starting connection ({self.name})...")
+
+        if self.conflator is not None and (not self._flush_task or self._flush_task.done()):
+            self._flush_task = asyncio.create_task(self._flush_loop())
+        if not self._linger_task or self._linger_task.done():
+            self._linger_task = asyncio.create_task(self._linger_loop())
+        if not self._recv_tasks or any(task.done() for task in self._recv_tasks):
+            self._recv_tasks = [asyncio.create_task(self._process_loop(queue)) for queue in self._recv_queues]
+
         while self.running:
             try:
                 if not self.approval_key:
@@ -50,10 +142,10 @@ class KISWebSocketClient:
                         await asyncio.sleep(5)
                         continue
 
-                async with websockets.connect(WS_BASE_URL, ping_interval=None) as ws:
+                async with websockets.connect(self.ws_url, ping_interval=None) as ws:
                     self.ws = ws
                     self.connected = True
-                    print("[KIS Client] Connected to KIS WebSocket!")
+                    print(f"[KIS Client] Connected to KIS WebSocket! ({self.name})")
 
                     # 재연결 시 기존에 시청자가 있는 종목들 다시 구독
                     await self._resubscribe_all()
@@ -61,15 +153,22 @@ class KISWebSocketClient:
                     while self.running:
                         try:
                             data = await ws.recv()
-                            await self._handle_message(data)
+                            received_at = time.time()
+                            if self.journal is not None:
+                                self.journal.append(data)
+                            if isinstance(data, str) and data.startswith("{"):
+                                # PINGPONG 등 시스템 메시지는 지연 없이 바로 처리
+                                await self._handle_message(data)
+                            else:
+                                self._enqueue(data, received_at)
                         except websockets.ConnectionClosed:
-                            print("[KIS Client] Connection closed.")
+                            print(f"[KIS Client] Connection closed. ({self.name})")
                             break
                         except Exception as e:
                             print(f"[KIS Client] Error in loop: {e}")
                             break
             except Exception as e:
-                print(f"[KIS Client] Connection failed: {e}. Retry in 5s...")
+                print(f"[KIS Client] Connection failed ({self.name}): {e}. Retry in 5s...")
                 await asyncio.sleep(5)
             finally:
                 self.connected = False
@@ -83,7 +182,42 @@ class KISWebSocketClient:
     def _get_hoga_tr_id(self, stock_code):
         return TR_ID_HOGA_ELW if self._is_elw(stock_code) else TR_ID_HOGA
 
-    async def _handle_message(self, data):
+    def _enqueue(self, data, received_at=None):
+        """실시간 프레임을 종목별 처리 큐에 넣음 (수신 루프는 await 없이 바로 다음 recv)"""
+        self.frames_received += 1
+        queue = self._recv_queues[0]
+        if self.recv_workers > 1 and isinstance(data, str):
+            # 0|TR_ID|NNN|종목코드^... 에서 종목코드만 잘라 큐 선택 (헤더는 짧으므로 앞부분만 탐색)
+            start = data.rfind('|', 0, 32) + 1
+            queue = self._recv_queues[hash(data[start:data.find('^', start)]) % self.recv_workers]
+        try:
+            queue.put_nowait((data, received_at or time.time()))
+        except asyncio.QueueFull:
+            self.frames_dropped += 1
+            if self.frames_dropped % 1000 == 1:
+                print(f"[KIS Client] Receive queue full ({self.name}), dropped {self.frames_dropped} frames")
+
+    async def _process_loop(self, queue):
+        """처리 태스크: 큐에서 프레임을 꺼내 디코딩/전송 (group_send 가 느려도 수신 루프는 막히지 않음)"""
+        while True:
+            data, received_at = await queue.get()
+            try:
+                await self._handle_message(data, received_at)
+            except Exception as e:
+                print(f"[KIS Client] Error handling frame: {e}")
+
+    def receive_stats(self):
+        """수신 큐 깊이 / 드롭 카운터"""
+        return {
+            "received": self.frames_received,
+            "dropped": self.frames_dropped,
+            "queue_depth": sum(queue.qsize() for queue in self._recv_queues),
+            "queue_capacity": self.recv_queue_size * self.recv_workers,
+            "workers": self.recv_workers,
+            "journaled": self.journal.frames if self.journal is not None else None,
+        }
+
+    async def _handle_message(self, data, received_at=None):
         # 핑퐁 등 시스템 메시지 처리
         if isinstance(data, str) and data.startswith("{"):
             try:
@@ -92,96 +226,310 @@ class KISWebSocketClient:
                 if tr_id == "PINGPONG":
                     if self.ws: await self.ws.pong(data) # 퐁 응답
                     return
+                # 등록/해제 응답 실패 (예: MAX SUBSCRIBE OVER) 는 조용히 묻히지 않도록 로그
+                body = js.get("body", {})
+                if body.get("rt_cd") not in (None, "0"):
+                    tr_key = js.get("header", {}).get("tr_key")
+                    print(f"[KIS Client] Registration failed {tr_id} {tr_key}: {body.get('msg1')}")
             except:
                 pass
             return
 
         # 실시간 데이터 처리 (파이프라인 포맷)
         if isinstance(data, str) and '|' in data:
-            parts = data.split('|')
-            if len(parts) > 3:
-                tr_id = parts[1]
-                stock_code = parts[3]
-                
-                SerializerClass = None
-                if tr_id in [TR_ID_HOGA, TR_ID_HOGA_ELW]:
-                    SerializerClass = StockAskingPriceResponseSerializer
-                elif tr_id == TR_ID_EXEC:
-                    SerializerClass = StockResponseSerializer
-
-                if SerializerClass and stock_code:
-                    # ^ 문자열로 정보가 구분되어 옴
-                    clean_code = stock_code.split("^")[0]
-                    
-                    parsed_dict = SerializerClass.parse_from_raw(data)
-                    if parsed_dict:
-                        serializer = SerializerClass(data=parsed_dict)
-                        if serializer.is_valid():
-                            # [DEBUG] 최초 1회 로그
-                            if clean_code not in self.logged_stocks:
-                                print(f"[KIS Client] First Data for {clean_code}")
-                                self.logged_stocks.add(clean_code)
-                                
-                            group_name = f"stock_{clean_code}"
-                            await self.channel_layer.group_send(
-                                group_name,
-                                {"type": "stock_update", "data": serializer.data}
-                            )
-
-    async def subscribe(self, stock_code):
-        """Consumer가 호출: 구독 요청 (카운팅 적용)"""
-        async with self.lock:
-            self._subscriber_counts[stock_code] += 1
-            count = self._subscriber_counts[stock_code]
-            
-            print(f"[KIS Client] Subscribe {stock_code} (Total watchers: {count})")
-
-            # 이 종목의 '첫 번째' 시청자일 때만 실제 API 구독 요청
-            if count == 1:
-                await self._send_subscription_packet(stock_code)
-            
-            # 백그라운드 태스크 시작 확인
-            if not self.running or (self.task and self.task.done()):
-                self.task = asyncio.create_task(self._connect_and_run())
-
-    async def unsubscribe(self, stock_code):
-        """Consumer가 호출: 구독 취소 (카운팅 적용)"""
-        async with self.lock:
-            if self._subscriber_counts[stock_code] > 0:
-                self._subscriber_counts[stock_code] -= 1
-            
-            count = self._subscriber_counts[stock_code]
-            print(f"[KIS Client] Unsubscribe {stock_code} (Remaining watchers: {count})")
-
-            # 시청자가 0명이 되면? 
-            # (선택사항) 여기서 API에 구독 해제 패킷을 보낼 수도 있고,
-            # 빈번한 해제를 막기 위해 그냥 둬도 됩니다. 
-            # 일단은 카운트만 줄이는 것으로 충분합니다.
+            # TR_ID 별 필드 테이블로 미리 컴파일된 디코더 사용 (프레임당 split 1회)
+            frame = decode_frame(data)
+            if not frame:
+                metrics.kis_decode_failures.inc()
+                return
+
+            decoder, records = frame
+            metrics.kis_frames.inc(decoder.tr_id)
+            metrics.kis_records.inc(decoder.tr_id, amount=len(records))
+            validate = self.validation_mode != 'off'
+            if received_at is not None:
+                latency.since(STAGE_DECODE, received_at)
+                # 체결/호가 모두 두 번째 필드가 거래소 시각 (STCK_CNTG_HOUR / BSOP_HOUR)
+                latency.record_exchange_lag(records[-1][1] if len(records[-1]) > 1 else None, received_at)
+
+            # 한 프레임에 담긴 N개 레코드를 종목별 배치로 모음 (첫 레코드만 읽으면 체결 누락)
+            batches = defaultdict(list)
+            closed_bars = []
+            for fields in records:
+                # ^ 문자열로 정보가 구분되어 옴 (첫 필드가 종목코드)
+                clean_code = fields[0]
+                if not clean_code:
+                    continue
+                tick = KISTick(decoder.tr_id, clean_code, fields)
+                if validate and not self._validate(tick):
+                    continue
+                if decoder.tr_id == TR_ID_EXEC:
+                    # 봉 집계는 conflation 전 모든 체결로 (건너뛰면 고가/저가/거래량 누락)
+                    closed = candles.add(tick)
+                    if closed:
+                        closed_bars.append((clean_code, closed))
+                    # 테마 집계도 conflation 전 체결로 (종목이 속한 테마만 증분 갱신)
+                    theme_aggregates.add(tick)
+                else:
+                    # 호가창 상태는 conflation 과 무관하게 매 프레임 제자리 갱신
+                    order_books.apply(tick)
+                batches[clean_code].append(tick)
+
+            for clean_code, closed in closed_bars:
+                await self._publish_candles(clean_code, closed)
+
+            for clean_code, batch in batches.items():
+                # [DEBUG] 최초 1회 로그
+                if clean_code not in self.logged_stocks:
+                    print(f"[KIS Client] First Data for {clean_code}")
+                    self.logged_stocks.add(clean_code)
+
+                if self.conflator is not None:
+                    # 최신 상태만 모아두고 _flush_loop 주기에 맞춰 전송
+                    for tick in batch:
+                        self.conflator.add(tick)
+                    if received_at is not None:
+                        self._conflated_since.setdefault(clean_code, received_at)
+                else:
+                    await self._publish(clean_code, [(stream_of(tick.tr_id), tick.to_dict()) for tick in batch], received_at)
+
+    def _validate(self, tick):
+        """
+        DRF Serializer 로 틱 검증 (디버그/샘플링 전용, 기본 경로에서는 호출되지 않음)
+        all 모드에서 검증 실패한 틱은 버리고, sample 모드에서는 로그만 남김
+        """
+        if self.validation_mode == 'sample':
+            self._validation_counter += 1
+            if self._validation_counter % self.validation_sample_rate:
+                return True
+
+        serializer = RESPONSE_SERIALIZERS[tick.tr_id](data=tick.to_dict())
+        if serializer.is_valid():
+            return True
+
+        metrics.kis_invalid_ticks.inc(tick.tr_id)
+        print(f"[KIS Client] Invalid tick {tick.tr_id} {tick.code}: {serializer.errors}")
+        return self.validation_mode == 'sample'
+
+    async def _flush_loop(self):
+        """conflation 버퍼를 일정 주기(예: 100ms)로 비우며 종목별 1회씩 전송"""
+        loop = asyncio.get_running_loop()
+        interval = self.conflator.interval
+        next_flush = loop.time() + interval
+        while self.running:
+            await asyncio.sleep(max(0, next_flush - loop.time()))
+            next_flush += interval
+            for stock_code, data in self.conflator.drain():
+                try:
+                    await self._publish(stock_code, data, self._conflated_since.pop(stock_code, None))
+                except Exception as e:
+                    print(f"[KIS Client] Publish error for {stock_code}: {e}")
+
+    async def _publish(self, stock_code, items, received_at=None):
+        """
+        종목 시청자에게 스트림 토픽별로 전송 (로컬 Consumer 는 LocalHub, 다른 프로세스는 Redis 그룹)
+        items: [(stream, data), ...] (순서 = 체결/수신 순서)
+        각 항목에는 스트림별 seq, 전체 data, 직전 전송 대비 변경분(delta) 이 담김
+        체결(exec:{code}) / 호가(book:{code}) 를 따로 보내므로 체결만 구독한 Consumer 에게 호가는 가지 않음
+        received_at: 가장 오래된 원본 프레임의 수신 시각 (이벤트 'ts' 로 실어 Consumer 전송 지연까지 측정)
+        """
+        by_stream = {}
+        for stream, data in items:
+            update = self.delta_encoder.encode(stock_code, stream, data)
+            lvc.update(stock_code, stream, update["seq"], update["data"])
+            by_stream.setdefault(stream, []).append(update)
+
+        for stream, updates in by_stream.items():
+            name = topic(stream, stock_code)
+            event = {
+                "type": "stock_update", "topic": name, "code": stock_code, "updates": updates,
+                "encoded": wire_format.pre_encode(stock_code, updates, self.preencode_formats),
+            }
+            if received_at is not None:
+                event["ts"] = received_at
+            await local_hub.publish(name, event)
+            if self.publish_remote:
+                await metrics.group_send(self.channel_layer, group_name(name), event)
+        latency.since(STAGE_PUBLISH, received_at)
+
+    async def _publish_candles(self, stock_code, closed):
+        """
+        마감된 봉 전송 (새 봉의 첫 체결이 들어올 때 직전 봉이 마감됨)
+        closed: [(봉 단위, bar), ...] -> Consumer 는 요청한 봉 단위만 내려보냄 (체결 토픽 구독자 대상)
+        """
+        name = topic(STREAM_EXEC, stock_code)
+        for interval, bar in closed:
+            event = {"type": "candle_close", "topic": name, "code": stock_code, "interval": interval, "bar": bar}
+            await local_hub.publish(name, event)
+            if self.publish_remote:
+                await metrics.group_send(self.channel_layer, group_name(name), event)
+
+    def _slot_keys(self, stock_code, streams=ALL_STREAMS):
+        """종목의 스트림별 KIS 등록 슬롯 (호가, 체결). 슬롯 refcount 는 TR_ID 별로 따로 관리됨"""
+        keys = []
+        if STREAM_HOGA in streams:
+            keys.append((self._get_hoga_tr_id(stock_code), stock_code))
+        if STREAM_EXEC in streams:
+            keys.append((TR_ID_EXEC, stock_code))
+        return keys
+
+    def _watchers(self, stock_code):
+        return {tr_id: self.slots.watchers((tr_id, stock_code)) for tr_id, _ in self._slot_keys(stock_code)}
+
+    def reserve(self, stock_code, streams=ALL_STREAMS):
+        """
+        스트림(체결/호가) 시청자 1명 추가 (TR_ID 별 카운팅) 후 필요한 등록/해제 패킷을 전송 큐에 넣음
+        await 없이 끝나므로 여러 종목을 연달아 예약해도 중간에 다른 구독이 끼어들지 않음
+        Returns: 큐에 넣은 패킷들의 전송 완료 future 리스트 (연결 전이면 빈 리스트, 재연결 시 _resubscribe_all 이 처리)
+        """
+        register, evict, queued = self.slots.acquire(self._slot_keys(stock_code, streams))
+        print(f"[KIS Client] Subscribe {stock_code} {'/'.join(streams)} (Total watchers: {self._watchers(stock_code)})")
+
+        # 등록 한도 초과: 시청자 없는 lingering 종목을 먼저 해제 (큐 순서대로 나가므로 해제가 등록보다 먼저)
+        pending = self._release_slots(evict, reason="evicted") if evict else []
+        # 이 종목의 '첫 번째' 시청자(또는 해제된 뒤 재시청)일 때만 실제 API 구독 요청
+        if register:
+            pending += self._queue_registrations(register, tr_type="1")
+        # 시청 중인 슬롯으로 가득 차서 대기열에 들어간 스트림은 구독자에게 알림 (슬롯이 비면 _linger_loop 가 등록)
+        if queued:
+            print(f"[KIS Client] Slots full ({self.name}), queued: {', '.join(f'{tr_id}:{code}' for tr_id, code in queued)}")
+            self._notify_status(queued, STATUS_QUEUED)
+
+        # 백그라운드 태스크 시작 확인
+        if not self.running or (self.task and self.task.done()):
+            self.task = asyncio.create_task(self._connect_and_run())
+        return pending
+
+    async def subscribe_many(self, items):
+        """
+        Consumer가 호출: 여러 종목 일괄 구독 [(종목코드, 스트림), ...]
+        refcount 는 한 번에 반영하고, 패킷이 토큰 버킷 속도로 모두 전송된 뒤 한 번에 반환
+        """
+        pending = [future for stock_code, streams in items for future in self.reserve(stock_code, streams)]
+        if pending:
+            sent = sum(await asyncio.gather(*pending))
+            print(f"[KIS Client] Sent {sent}/{len(pending)} registration packets for {len(items)} codes ({self.name})")
+
+    async def subscribe(self, stock_code, streams=ALL_STREAMS):
+        """Consumer가 호출: 스트림(체결/호가) 구독 요청 (TR_ID 별 카운팅 적용)"""
+        await self.subscribe_many([(stock_code, streams)])
+
+    async def unsubscribe(self, stock_code, streams=ALL_STREAMS):
+        """Consumer가 호출: 스트림 구독 취소 (TR_ID 별 카운팅 적용)"""
+        # 시청자 0명이 되어도 바로 해제하지 않음 (페이지 새로고침/이동 시 재등록 방지)
+        # linger 시간이 지나면 _linger_loop 에서 tr_type=2 로 해제
+        self.slots.release(self._slot_keys(stock_code, streams))
+        print(f"[KIS Client] Unsubscribe {stock_code} {'/'.join(streams)} (Remaining watchers: {self._watchers(stock_code)})")
+
+    async def _linger_loop(self):
+        """linger 시간이 지난 시청자 0명 슬롯을 주기적으로 해제"""
+        interval = min(1.0, max(0.1, self.slots.linger_sec / 2))
+        while self.running:
+            await asyncio.sleep(interval)
+            expired = self.slots.expired()
+            pending = self._release_slots(expired, reason="idle") if expired else []
+            pending += self._promote_waiting()
+            if pending:
+                await asyncio.gather(*pending)
+
+    def _promote_waiting(self):
+        """빈 슬롯만큼 대기 중인 스트림을 등록하고 구독자에게 알림 -> 패킷 전송 완료 future 리스트"""
+        register, evict = self.slots.promote()
+        pending = self._release_slots(evict, reason="evicted") if evict else []
+        if register:
+            pending += self._queue_registrations(register, tr_type="1")
+            self._notify_status(register, STATUS_LIVE)
+        return pending
+
+    def _notify_status(self, keys, status):
+        """스트림 토픽 구독자에게 등록 상태(queued / live) 이벤트 전송 (reserve 는 동기 함수이므로 태스크로 전송)"""
+        events = [
+            {"type": "stream_status", "topic": topic(stream_of(tr_id), stock_code), "code": stock_code, "status": status}
+            for tr_id, stock_code in keys
+        ]
+        asyncio.get_running_loop().create_task(self._publish_status(events))
+
+    async def _publish_status(self, events):
+        for event in events:
+            await local_hub.publish(event["topic"], event)
+            if self.publish_remote:
+                await metrics.group_send(self.channel_layer, group_name(event["topic"]), event)
+
+    def _release_slots(self, keys, reason):
+        """
+        슬롯 해제 패킷(tr_type=2) 전송 예약 + 해제된 스트림의 delta 스냅샷 / 호가창 상태 정리
+        Returns: 해제 패킷 전송 완료 future 리스트
+        """
+        pending = self._queue_registrations(keys, tr_type="2")
+        for tr_id, stock_code in keys:
+            stream = stream_of(tr_id)
+            self.delta_encoder.forget(stock_code, stream)
+            lvc.forget(stock_code, stream)
+            for decoder in DECODERS.values():
+                if stream_of(decoder.tr_id) == stream:
+                    decoder.forget(stock_code)
+            # 봉은 당일 시계열이므로 해제와 무관하게 유지 (재구독 시 이어서 집계)
+            if stream != STREAM_EXEC:
+                order_books.forget(stock_code)
+        print(f"[KIS Client] Released {len(keys)} slots ({reason}): "
+              f"{', '.join(f'{tr_id}:{code}' for tr_id, code in keys)}")
+        return pending
+
+    def slot_usage(self):
+        """현재 KIS 등록 슬롯 사용 현황"""
+        return {"connected": self.connected, **self.slots.usage(), "receive": self.receive_stats()}
 
     async def _resubscribe_all(self):
-        """재연결 시 시청자가 있는 종목만 다시 구독"""
-        for code, count in self._subscriber_counts.items():
-            if count > 0:
-                await self._send_subscription_packet(code)
+        """재연결 시 시청자가 있는 종목만 다시 구독 (lingering 슬롯은 새 세션에 등록하지 않음)"""
+        self.slots.reset_idle()
+        # 끊긴 세션용으로 쌓여 있던 패킷은 버리고 현재 시청 중인 슬롯만 새로 등록 (전송은 pacer 태스크가 이어서 처리)
+        while self._registrations is not None and not self._registrations.empty():
+            _, future, _ = self._registrations.get_nowait()
+            if not future.done():
+                future.set_result(False)
+        self._queue_registrations(self.slots.active_keys(), tr_type="1")
+        # lingering 슬롯을 정리했으므로 대기 중인 스트림이 있으면 이어서 등록
+        self._promote_waiting()
 
-    async def _send_subscription_packet(self, stock_code):
-        if not self.ws or not self.connected or not self.approval_key:
-            return
+    def _queue_registrations(self, keys, tr_type="1"):
+        """
+        (tr_id, 종목) 목록 등록(1)/해제(2) 패킷을 전송 큐에 넣음
+        연결 전이면 넣지 않음 (재연결 시 _resubscribe_all 이 시청 중인 슬롯을 등록)
+        Returns: 패킷별 전송 완료 future 리스트 (결과: 실제 전송 여부)
+        """
+        if not keys or not self.ws or not self.connected or not self.approval_key:
+            return []
 
-        # 1. 호가 등록
-        hoga_tr_id = self._get_hoga_tr_id(stock_code)
-        payload_hoga = StockRequestSerializer.build_payload(
-            self.approval_key, hoga_tr_id, stock_code
-        )
-        await self.ws.send(json.dumps(payload_hoga))
+        if not self._registration_task or self._registration_task.done():
+            self._registrations = asyncio.Queue()
+            self._registration_task = asyncio.create_task(self._registration_loop())
 
-        # 2. 체결 등록
-        payload_exec = StockRequestSerializer.build_payload(
-            self.approval_key, TR_ID_EXEC, stock_code
-        )
-        await self.ws.send(json.dumps(payload_exec))
-        
-        print(f"[KIS Client] Sent API Request for {stock_code}")
+        loop = asyncio.get_running_loop()
+        pending = []
+        for tr_id, stock_code in keys:
+            payload = StockRequestSerializer.build_payload(
+                self.approval_key, tr_id, stock_code, tr_type=tr_type
+            )
+            future = loop.create_future()
+            self._registrations.put_nowait((json.dumps(payload), future, self.ws))
+            pending.append(future)
+        return pending
 
-# 모듈 레벨에서 인스턴스 생성 (이 파일이 import 될 때 딱 한 번 생성됨)
-kis_client = KISWebSocketClient()
\ No newline at end of file
+    async def _registration_loop(self):
+        """등록/해제 패킷을 토큰 버킷 속도(KIS_WS_REGISTRATION_RATE)로 전송"""
+        queue = self._registrations
+        while True:
+            packet, future, ws = await queue.get()
+            if future.done():
+                continue  # 재연결로 폐기된 패킷
+            await self.pacer.acquire()
+            sent = False
+            # pacer 대기 중에 끊겼거나 재연결됐으면 보내지 않음 (새 세션은 _resubscribe_all 이 다시 등록)
+            if ws is self.ws and self.connected:
+                try:
+                    await ws.send(packet)
+                    sent = True
+                except Exception as e:
+                    print(f"[KIS Client] Registration send error ({self.name}): {e}")
+            if not future.done():
+                future.set_result(sent)
@@ -0,0 +1,120 @@
+import asyncio
+from django.conf import settings
+from django.core.cache import cache
+
+CACHE_KEY = "lvc:{code}"
+
+
+class LastValueCache:
+    """
+    종목별 마지막 체결/호가 상태 저장소 (Last Value Cache)
+    - publisher(KIS 클라이언트)가 전송할 때마다 프로세스 메모리에 {스트림: {"seq", "data"}} 로 갱신
+    - 변경된 종목만 주기적으로 Django 캐시(Redis)에 모아서 기록 -> 다른 프로세스(웹 워커, 뷰)에서 조회
+    신규 구독자는 다음 틱을 기다리지 않고 이 스냅샷을 keyframe 으로 즉시 받음
+    """
+    def __init__(self, flush_sec=None, ttl_sec=None):
+        self.flush_sec = flush_sec or getattr(settings, 'KIS_LVC_FLUSH_SEC', 1.0)
+        self.ttl_sec = ttl_sec or getattr(settings, 'KIS_LVC_TTL_SEC', 60 * 60 * 12)
+        self._values = {}   # 종목코드 -> {스트림: {"seq": int, "data": dict}}
+        self._dirty = set()
+        self._released = {}  # 해제됐지만 아직 캐시에 기록하지 못한 종목의 마지막 상태
+        self._flush_task = None
+
+    def update(self, stock_code, stream, seq, data):
+        self._values.setdefault(stock_code, {})[stream] = {"seq": seq, "data": data}
+        self._dirty.add(stock_code)
+        try:
+            loop = asyncio.get_running_loop()
+        except RuntimeError:
+            return  # 이벤트 루프 밖에서는 flush() 를 직접 호출
+        task = self._flush_task
+        if task is None or task.done() or task.get_loop() is not loop:
+            self._flush_task = loop.create_task(self._flush_loop())
+
+    def local(self, stock_code):
+        """이 프로세스에서 publish 된 최신 상태 (없으면 None)"""
+        return self._values.get(stock_code)
+
+    def forget(self, stock_code, stream=None):
+        """
+        해제된 종목(stream 지정 시 해당 스트림만)의 로컬 상태 정리 (장시간 실행되는 ingest 프로세스에서 쌓이지 않도록)
+        해제 후 publisher 의 seq 는 1 부터 다시 시작하므로 로컬 값은 남기지 않고, 이후 조회는 캐시에 남은 값을 사용
+        """
+        values = self._values.get(stock_code)
+        if values is None:
+            return
+        if stock_code in self._dirty:
+            self._released[stock_code] = dict(values)  # 아직 기록 전이면 다음 flush 때 캐시에 남김
+        if stream is not None:
+            values.pop(stream, None)
+            if values:
+                return
+        del self._values[stock_code]
+
+    def collect(self):
+        """
+        기록할 {캐시 키: 값} 을 꺼냄 (이벤트 루프 스레드에서 호출)
+        update() 가 같은 dict 를 갱신하므로 종목별 얕은 복사본을 만들어 스레드에 넘김
+        Returns: (값 dict, 꺼낸 종목코드 set)
+        """
+        dirty, self._dirty = self._dirty, set()
+        released, self._released = self._released, {}
+        values = {}
+        for code in dirty:
+            value = self._values.get(code) or released.get(code)
+            if value is not None:
+                values[CACHE_KEY.format(code=code)] = dict(value)
+        return values, dirty
+
+    def write(self, values):
+        if values:
+            cache.set_many(values, self.ttl_sec)
+        return len(values)
+
+    def flush(self):
+        """변경된 종목을 캐시에 일괄 기록 (동기)"""
+        return self.write(self.collect()[0])
+
+    async def _flush_loop(self):
+        while self._dirty:
+            await asyncio.sleep(self.flush_sec)
+            values, codes = self.collect()
+            try:
+                await asyncio.to_thread(self.write, values)
+            except Exception as e:
+                # 기록 실패한 종목은 다음 주기에 다시 기록 (그 사이 새 틱이 없어도 유실되지 않도록)
+                for code in codes:
+                    key = CACHE_KEY.format(code=code)
+                    if code not in self._values and key in values:
+                        self._released.setdefault(code, values[key])
+                    if code in self._values or code in self._released:
+                        self._dirty.add(code)
+                print(f"[LVC] Flush error ({len(codes)} codes, retrying): {e}")
+
+    def snapshots(self, stock_codes):
+        """
+        여러 종목 스냅샷 조회 (로컬 메모리 우선, 없으면 캐시)
+        Returns: {종목코드: {스트림: {"seq", "data"}}}
+        """
+        result = {code: self._values[code] for code in stock_codes if code in self._values}
+        missing = [code for code in stock_codes if code not in result]
+        if missing:
+            cached = cache.get_many([CACHE_KEY.format(code=code) for code in missing])
+            for code in missing:
+                value = cached.get(CACHE_KEY.format(code=code))
+                if value:
+                    result[code] = value
+        return result
+
+    async def snapshot(self, stock_code):
+        return (await self.snapshots_async([stock_code])).get(stock_code)
+
+    async def snapshots_async(self, stock_codes):
+        """snapshots() 의 비동기 버전 (로컬에 모두 있으면 스레드 전환 없이, 없는 종목만 캐시 get_many 1회)"""
+        if all(code in self._values for code in stock_codes):
+            return {code: self._values[code] for code in stock_codes}
+        return await asyncio.to_thread(self.snapshots, stock_codes)
+
+
+# 모듈 레벨에서 인스턴스 생성 (프로세스당 1개)
+lvc = LastValueCache()
@@ -0,0 +1,100 @@
+import math
+import time
+from array import array
+
+# 히스토그램 버킷: 2^(i/SUB) us (1 옥타브를 SUB 개로 분할, 상대 오차 약 9%), 최대 2^30us (약 18분)
+SUB = 8
+BUCKETS = 30 * SUB + 1
+
+# 구간 이름 (수신 시각 기준 누적)
+STAGE_DECODE = "decode"            # ws.recv() -> 디코딩 완료
+STAGE_PUBLISH = "publish"          # ws.recv() -> LocalHub / group_send 완료 (conflation 대기 포함)
+STAGE_SEND = "send"                # ws.recv() -> StockConsumer 가 브라우저로 send 완료
+STAGE_EXCHANGE = "exchange_lag"    # 체결/호가 시각(STCK_CNTG_HOUR / BSOP_HOUR, 초 단위) -> ws.recv()
+
+_KST_OFFSET = 9 * 3600
+
+
+class LatencyHistogram:
+    """로그 버킷 지연 히스토그램 (고정 크기 카운터 배열, 기록은 버킷 계산 + 증가 1회)"""
+    __slots__ = ('counts', 'count', 'total', 'max')
+
+    def __init__(self):
+        self.counts = array('Q', bytes(8 * BUCKETS))
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+
+    def record(self, seconds):
+        us = seconds * 1e6
+        index = int(math.log2(us) * SUB) if us > 1 else 0
+        self.counts[index if index < BUCKETS else BUCKETS - 1] += 1
+        self.count += 1
+        self.total += seconds
+        if seconds > self.max:
+            self.max = seconds
+
+    def percentile(self, p):
+        """p(0~100) 분위 지연(초). 버킷 상한값 기준"""
+        if not self.count:
+            return None
+        rank = math.ceil(self.count * p / 100) or 1
+        seen = 0
+        for index, n in enumerate(self.counts):
+            seen += n
+            if seen >= rank:
+                return min(2 ** ((index + 1) / SUB) / 1e6, self.max)
+        return self.max
+
+    def summary(self):
+        """{count, mean, p50, p90, p99, max} (ms)"""
+        def ms(value):
+            return None if value is None else round(value * 1000, 3)
+        return {
+            "count": self.count,
+            "mean": ms(self.total / self.count) if self.count else None,
+            "p50": ms(self.percentile(50)),
+            "p90": ms(self.percentile(90)),
+            "p99": ms(self.percentile(99)),
+            "max": ms(self.max) if self.count else None,
+        }
+
+
+class LatencyTracker:
+    """
+    실시간 경로 구간별 지연 히스토그램 모음 (프로세스별)
+    수신 시각은 time.time() 으로 찍어 이벤트에 실어 보내므로 ingest -> 웹 워커 경로도 같은 기준으로 측정
+    """
+    def __init__(self):
+        self.stages = {}
+
+    def record(self, stage, seconds):
+        histogram = self.stages.get(stage)
+        if histogram is None:
+            histogram = self.stages[stage] = LatencyHistogram()
+        histogram.record(seconds if seconds > 0 else 0.0)
+
+    def since(self, stage, started_at, now=None):
+        """started_at(time.time()) 부터 지금까지의 지연 기록"""
+        if started_at is not None:
+            self.record(stage, (now or time.time()) - started_at)
+
+    def record_exchange_lag(self, hhmmss, received_at):
+        """거래소 시각(HHMMSS, KST) 대비 수신 지연 (초 단위 필드라 해상도는 1초)"""
+        try:
+            stamped = int(hhmmss[0:2]) * 3600 + int(hhmmss[2:4]) * 60 + int(hhmmss[4:6])
+        except (TypeError, ValueError):
+            return
+        lag = (received_at + _KST_OFFSET) % 86400 - stamped
+        if 0 <= lag < 3600:  # 장 시작 전 / 자정 경계 / 시계 오차로 음수인 값은 제외
+            self.record(STAGE_EXCHANGE, lag)
+
+    def snapshot(self):
+        return {stage: histogram.summary() for stage, histogram in self.stages.items()}
+
+    def reset(self):
+        self.stages = {}
+
+
+# 모듈 레벨에서 인스턴스 생성 (프로세스당 1개)
+latency = LatencyTracker()
@@ -0,0 +1,95 @@
+import asyncio
+from collections import defaultdict
+from channels.layers import get_channel_layer
+from django.conf import settings
+from .metrics import fanout_deliveries, group_family
+from .topics import group_name
+
+# 토픽 그룹(stock_exec_{code} / stock_book_{code})에서 LocalHub 로 전달하는 이벤트 타입
+RELAYED_TYPES = ("stock_update", "candle_close", "stream_status")
+
+
+class LocalHub:
+    """
+    같은 프로세스의 StockConsumer 들에게 틱을 직접 전달하는 pub/sub 허브
+    - 구독 단위는 토픽 (체결 exec:005930 / 호가 book:005930), 체결만 보는 Consumer 에게 호가는 가지 않음
+    - KIS 클라이언트가 같은 프로세스에 있으면 Redis 왕복 없이 바로 전달
+    - ingest 모드(KIS 연결이 다른 프로세스)면 RedisRelay 가 토픽 그룹에 워커당 1번만 가입해서 받아옴
+    하나의 이벤트 dict 를 모든 Consumer 가 공유하므로 인코딩 결과도 이벤트에 캐시해서 재사용
+    """
+    def __init__(self):
+        self._subscribers = defaultdict(set)  # 토픽 -> Consumer set
+        self.relay = None
+        self.published = 0
+        self.delivered = 0
+
+    def subscribers(self, topic):
+        return len(self._subscribers.get(topic, ()))
+
+    async def subscribe(self, topic, consumer):
+        subscribers = self._subscribers[topic]
+        first = not subscribers
+        subscribers.add(consumer)
+        if first and getattr(settings, 'KIS_REALTIME_INGEST', False):
+            if self.relay is None:
+                self.relay = RedisRelay(self)
+            await self.relay.join(topic)
+
+    async def unsubscribe(self, topic, consumer):
+        subscribers = self._subscribers.get(topic)
+        if not subscribers or consumer not in subscribers:
+            return
+        subscribers.discard(consumer)
+        if not subscribers:
+            del self._subscribers[topic]
+            if self.relay is not None:
+                await self.relay.leave(topic)
+
+    async def publish(self, topic, event):
+        """
+        토픽을 구독 중인 로컬 Consumer 전체에 같은 이벤트 전달 (전달한 Consumer 수 반환)
+        채널 레이어와 같은 규칙으로 event['type'] 이름의 핸들러 호출 (stock_update, candle_close, stream_status)
+        """
+        subscribers = self._subscribers.get(topic)
+        self.published += 1
+        if not subscribers:
+            return 0
+        handler = event["type"]
+        for consumer in tuple(subscribers):
+            try:
+                await getattr(consumer, handler)(event)
+            except Exception as e:
+                print(f"[LocalHub] Delivery error for {topic}: {e}")
+        self.delivered += len(subscribers)
+        fanout_deliveries.inc(group_family(group_name(topic)), amount=len(subscribers))
+        return len(subscribers)
+
+
+class RedisRelay:
+    """ingest 프로세스가 보낸 토픽 그룹 메시지를 워커당 채널 1개로 받아 LocalHub 로 전달"""
+    def __init__(self, hub):
+        self.hub = hub
+        self.channel_layer = get_channel_layer()
+        self.channel = None
+        self._task = None
+
+    async def join(self, topic):
+        if self.channel is None:
+            self.channel = await self.channel_layer.new_channel()
+        if self._task is None or self._task.done():
+            self._task = asyncio.create_task(self._run())
+        await self.channel_layer.group_add(group_name(topic), self.channel)
+
+    async def leave(self, topic):
+        if self.channel is not None:
+            await self.channel_layer.group_discard(group_name(topic), self.channel)
+
+    async def _run(self):
+        while True:
+            message = await self.channel_layer.receive(self.channel)
+            if message.get("type") in RELAYED_TYPES:
+                await self.hub.publish(message["topic"], message)
+
+
+# 모듈 레벨에서 인스턴스 생성 (프로세스당 1개)
+local_hub = LocalHub()
@@ -0,0 +1,283 @@
+import time
+import asyncio
+import ipaddress
+import httpx
+from urllib.parse import urlsplit
+from django.conf import settings
+from .latency import LatencyHistogram, latency
+
+# Prometheus text exposition format 0.0.4
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+QUANTILES = (0.5, 0.9, 0.99)
+
+
+def _escape(value):
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _labels(names, values, extra=""):
+    pairs = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+class Counter:
+    """
+    단조 증가 카운터 (라벨 값 튜플 -> 값 dict)
+    락 없이 dict 갱신만 하므로 이벤트 루프 핫패스에 상시 두어도 부담 없음
+    (스레드에서 동시에 증가시키면 드물게 1건 누락될 수 있음)
+    """
+    kind = "counter"
+
+    def __init__(self, name, help, labelnames=()):
+        self.name = name
+        self.help = help
+        self.labelnames = labelnames
+        self.values = {}
+
+    def inc(self, *labelvalues, amount=1):
+        values = self.values
+        values[labelvalues] = values.get(labelvalues, 0) + amount
+
+    def samples(self):
+        return [(self.name, labels, value) for labels, value in self.values.items()]
+
+
+class Gauge(Counter):
+    """현재 값 (증감 가능)"""
+    kind = "gauge"
+
+    def set(self, value, *labelvalues):
+        self.values[labelvalues] = value
+
+    def dec(self, *labelvalues, amount=1):
+        self.inc(*labelvalues, amount=-amount)
+
+
+class Summary:
+    """지연 분포 (LatencyHistogram 기반 분위수 + _sum / _count)"""
+    kind = "summary"
+
+    def __init__(self, name, help, labelnames=()):
+        self.name = name
+        self.help = help
+        self.labelnames = labelnames
+        self.histograms = {}
+
+    def observe(self, seconds, *labelvalues):
+        histogram = self.histograms.get(labelvalues)
+        if histogram is None:
+            histogram = self.histograms[labelvalues] = LatencyHistogram()
+        histogram.record(seconds if seconds > 0 else 0.0)
+
+    def samples(self):
+        return _summary_samples(self.name, self.histograms)
+
+
+def _summary_samples(name, histograms):
+    samples = []
+    for labels, histogram in histograms.items():
+        for q in QUANTILES:
+            samples.append((name, labels, histogram.percentile(q * 100) or 0.0, f'quantile="{q}"'))
+        samples.append((f"{name}_sum", labels, histogram.total))
+        samples.append((f"{name}_count", labels, histogram.count))
+    return samples
+
+
+class CallbackMetric:
+    """스크레이프 시점에 값을 계산하는 지표 (fn: () -> {라벨 값 튜플: 값 또는 LatencyHistogram})"""
+    def __init__(self, name, help, kind, labelnames, fn):
+        self.name = name
+        self.help = help
+        self.kind = kind
+        self.labelnames = labelnames
+        self.fn = fn
+
+    def samples(self):
+        values = self.fn()
+        if self.kind == "summary":
+            return _summary_samples(self.name, values)
+        return [(self.name, labels, value) for labels, value in values.items()]
+
+
+class MetricsRegistry:
+    def __init__(self):
+        self.metrics = []
+
+    def register(self, metric):
+        self.metrics.append(metric)
+        return metric
+
+    def counter(self, name, help, labelnames=()):
+        return self.register(Counter(name, help, labelnames))
+
+    def gauge(self, name, help, labelnames=()):
+        return self.register(Gauge(name, help, labelnames))
+
+    def summary(self, name, help, labelnames=()):
+        return self.register(Summary(name, help, labelnames))
+
+    def callback(self, name, help, kind, labelnames, fn):
+        return self.register(CallbackMetric(name, help, kind, labelnames, fn))
+
+    def render(self):
+        lines = []
+        for metric in self.metrics:
+            try:
+                samples = metric.samples()
+            except Exception as e:
+                print(f"[Metrics] Collect error for {metric.name}: {e}")
+                continue
+            lines.append(f"# HELP {metric.name} {metric.help}")
+            lines.append(f"# TYPE {metric.name} {metric.kind}")
+            for sample in samples:
+                name, labels, value = sample[:3]
+                extra = sample[3] if len(sample) > 3 else ""
+                lines.append(f"{name}{_labels(metric.labelnames, labels, extra)} {value:g}" if isinstance(value, float)
+                             else f"{name}{_labels(metric.labelnames, labels, extra)} {value}")
+        return "\n".join(lines) + "\n"
+
+
+# 모듈 레벨에서 인스턴스 생성 (프로세스당 1개)
+registry = MetricsRegistry()
+
+# KIS 실시간 수신
+kis_frames = registry.counter("kis_frames_total", "KIS realtime frames received", ("tr_id",))
+kis_records = registry.counter("kis_records_total", "KIS realtime records decoded (a frame may carry several)", ("tr_id",))
+kis_decode_failures = registry.counter("kis_decode_failures_total", "KIS realtime frames that could not be decoded")
+kis_invalid_ticks = registry.counter("kis_invalid_ticks_total", "Ticks rejected by serializer validation", ("tr_id",))
+
+# 전달 / 팬아웃
+consumers_connected = registry.gauge("realtime_consumers_connected", "Connected StockConsumer websockets")
+fanout_deliveries = registry.counter("realtime_fanout_total", "Events delivered to local consumers per group family", ("group",))
+group_sends = registry.counter("channel_layer_group_send_total", "Channel layer group_send calls", ("group",))
+group_send_seconds = registry.summary("channel_layer_group_send_seconds", "Channel layer group_send latency", ("group",))
+# 브라우저 송신 버퍼 조치 (coalesced / dropped / downgraded / restored / disconnected)
+slow_consumer_actions = registry.counter(
+    "realtime_slow_consumer_actions_total", "Outbound buffer actions taken for slow browser connections", ("action",)
+)
+
+# KIS REST
+rest_requests = registry.counter("kis_rest_requests_total", "KIS REST calls", ("endpoint", "status"))
+rest_seconds = registry.summary("kis_rest_request_seconds", "KIS REST call latency", ("endpoint", "status"))
+
+# 실시간 경로 구간별 지연 (stock_price.services.latency)
+registry.callback(
+    "realtime_latency_seconds", "Realtime path latency per stage since ws.recv()", "summary", ("stage",),
+    lambda: {(stage,): histogram for stage, histogram in latency.stages.items()},
+)
+
+
+def register_pool_metrics(pool):
+    """KIS 세션 풀 지표 등록 (스크레이프 시점에 계산, 풀을 만든 프로세스에서 1회 호출)"""
+    def session_values(fn):
+        return lambda: {(session.name,): fn(session) for session in pool.sessions}
+
+    def slot_values():
+        values = {}
+        for session in pool.sessions:
+            usage = session.slots.usage()
+            for state in ("used", "capacity", "active", "lingering"):
+                values[(session.name, state)] = usage[state]
+        return values
+
+    registry.callback("kis_ws_connected", "KIS websocket session connected (1/0)", "gauge", ("session",),
+                      session_values(lambda session: int(session.connected)))
+    registry.callback("kis_registrations", "KIS realtime registration slots by state", "gauge", ("session", "state"),
+                      slot_values)
+    registry.callback("kis_subscribed_symbols", "Symbols with at least one watcher", "gauge", ("session",),
+                      session_values(lambda session: len({code for _, code in session.slots.active_keys()})))
+    registry.callback("kis_receive_dropped_total", "Frames dropped because the receive queue was full", "counter",
+                      ("session",), session_values(lambda session: session.frames_dropped))
+    registry.callback("kis_receive_queue_depth", "Frames waiting in the receive queues", "gauge", ("session",),
+                      session_values(lambda session: sum(queue.qsize() for queue in session._recv_queues)))
+
+
+def is_allowed(address):
+    """스크레이프 허용 주소인지 (METRICS_ALLOWED_IPS: IP 또는 CIDR 목록, None 이면 제한 없음)"""
+    allowed = getattr(settings, 'METRICS_ALLOWED_IPS', ["127.0.0.1", "::1"])
+    if allowed is None:
+        return True
+    try:
+        ip = ipaddress.ip_address(address)
+    except (TypeError, ValueError):
+        return False
+    return any(ip in ipaddress.ip_network(network, strict=False) for network in allowed)
+
+
+def group_family(group):
+    """종목별 그룹(stock_005930)은 라벨 수가 늘지 않도록 stock 으로 묶음"""
+    return "stock" if group.startswith("stock_") else group
+
+
+async def group_send(channel_layer, group, message):
+    """channel_layer.group_send + 호출 수 / 지연 기록"""
+    started = time.perf_counter()
+    await channel_layer.group_send(group, message)
+    family = group_family(group)
+    group_send_seconds.observe(time.perf_counter() - started, family)
+    group_sends.inc(family)
+
+
+# KIS REST 클라이언트: send() 를 감싸서 endpoint(경로)별 호출 수 / 지연 기록
+# (event hook 은 응답을 받은 경우에만 호출되므로 타임아웃 / 연결 오류도 status="timeout" / "error" 로 기록)
+def _record_rest(request, status, started):
+    endpoint = urlsplit(str(request.url)).path
+    rest_requests.inc(endpoint, status)
+    rest_seconds.observe(time.perf_counter() - started, endpoint, status)
+
+
+class RestClient(httpx.Client):
+    def send(self, request, **kwargs):
+        started, status = time.perf_counter(), "error"
+        try:
+            response = super().send(request, **kwargs)
+            status = str(response.status_code)
+            return response
+        except httpx.TimeoutException:
+            status = "timeout"
+            raise
+        finally:
+            _record_rest(request, status, started)
+
+
+class AsyncRestClient(httpx.AsyncClient):
+    async def send(self, request, **kwargs):
+        started, status = time.perf_counter(), "error"
+        try:
+            response = await super().send(request, **kwargs)
+            status = str(response.status_code)
+            return response
+        except httpx.TimeoutException:
+            status = "timeout"
+            raise
+        finally:
+            _record_rest(request, status, started)
+
+
+async def serve_metrics(host="0.0.0.0", port=9100):
+    """
+    웹 서버가 없는 프로세스(run_kis_ingest)용 최소 HTTP 엔드포인트
+    어떤 경로로 요청해도 registry.render() 를 반환 (METRICS_ALLOWED_IPS 밖의 주소는 연결 종료)
+    """
+    async def handle(reader, writer):
+        try:
+            peer = writer.get_extra_info("peername")
+            if not is_allowed(peer[0] if peer else None):
+                return
+            await reader.readuntil(b"\r\n\r\n")
+            body = registry.render().encode()
+            writer.write(
+                b"HTTP/1.1 200 OK\r\nContent-Type: " + CONTENT_TYPE.encode()
+                + b"\r\nContent-Length: " + str(len(body)).encode() + b"\r\nConnection: close\r\n\r\n" + body
+            )
+            await writer.drain()
+        except (asyncio.IncompleteReadError, ConnectionError):
+            pass
+        finally:
+            writer.close()
+
+    server = await asyncio.start_server(handle, host, port)
+    print(f"[Metrics] Serving Prometheus metrics on http://{host}:{port}/metrics")
+    return server
@@ -0,0 +1,145 @@
+from array import array
+from django.conf import settings
+from .cache_mirror import CacheMirror
+from .kis_decoder import DECODERS, TR_ID_HOGA, TR_ID_HOGA_ELW
+
+LEVELS = 10
+
+# 호가 레코드 내 위치: ASKP1~10, BIDP1~10, ASKP_RSQN1~10, BIDP_RSQN1~10 가 연속, 이어서 총 잔량 2개
+_BOOK_START = DECODERS[TR_ID_HOGA].index['ASKP1']
+_BOOK_END = DECODERS[TR_ID_HOGA].index['BIDP_RSQN10'] + 1
+_TOTAL_ASK = DECODERS[TR_ID_HOGA].index['TOTAL_ASKP_RSQN']
+_TOTAL_BID = DECODERS[TR_ID_HOGA].index['TOTAL_BIDP_RSQN']
+_HOUR = DECODERS[TR_ID_HOGA].index['BSOP_HOUR']
+assert DECODERS[TR_ID_HOGA_ELW].index['ASKP1'] == _BOOK_START  # H0STASP0 도 같은 배치
+
+# levels 배열 내 구간 (KIS 필드 순서 그대로)
+ASK_PX, BID_PX, ASK_QTY, BID_QTY = (slice(i * LEVELS, (i + 1) * LEVELS) for i in range(4))
+
+
+def _to_float(value):
+    try:
+        return float(value)
+    except ValueError:
+        return 0.0
+
+
+class OrderBook:
+    """
+    종목 1개의 10단계 호가창 (고정 크기 float 배열 1개를 매 프레임 제자리 갱신)
+    levels: [매도호가 10, 매수호가 10, 매도잔량 10, 매수잔량 10]
+    """
+    __slots__ = ('code', 'levels', 'total_ask', 'total_bid', 'hour', 'updates')
+
+    def __init__(self, code):
+        self.code = code
+        self.levels = array('d', bytes(8 * 4 * LEVELS))
+        self.total_ask = 0.0
+        self.total_bid = 0.0
+        self.hour = ""
+        self.updates = 0
+
+    def apply(self, fields):
+        """디코딩된 호가 레코드(원문 필드 튜플)로 갱신"""
+        if len(fields) <= _TOTAL_BID:
+            return False
+        levels = self.levels
+        i = 0
+        try:
+            # 새 배열을 만들지 않고 기존 배열에 값만 덮어씀
+            for i in range(_BOOK_END - _BOOK_START):
+                levels[i] = float(fields[_BOOK_START + i])
+        except ValueError:
+            # 빈 값이 섞인 프레임: 실패한 위치부터 0 으로 대체하며 이어서 갱신
+            for i in range(i, _BOOK_END - _BOOK_START):
+                levels[i] = _to_float(fields[_BOOK_START + i])
+        self.total_ask = _to_float(fields[_TOTAL_ASK])
+        self.total_bid = _to_float(fields[_TOTAL_BID])
+        self.hour = fields[_HOUR]
+        self.updates += 1
+        return True
+
+    @property
+    def best_ask(self):
+        return self.levels[0]
+
+    @property
+    def best_bid(self):
+        return self.levels[LEVELS]
+
+    def spread(self):
+        if not self.best_ask or not self.best_bid:
+            return None
+        return self.best_ask - self.best_bid
+
+    def mid(self):
+        if not self.best_ask or not self.best_bid:
+            return None
+        return (self.best_ask + self.best_bid) / 2
+
+    def imbalance(self, depth=LEVELS):
+        """상위 depth 단계 (매수잔량 - 매도잔량) / 합계, -1(매도 우위) ~ 1(매수 우위)"""
+        ask = sum(self.levels[ASK_QTY][:depth])
+        bid = sum(self.levels[BID_QTY][:depth])
+        total = ask + bid
+        return (bid - ask) / total if total else None
+
+    def snapshot(self):
+        levels = self.levels
+        return {
+            "code": self.code,
+            "hour": self.hour,
+            "asks": [[p, q] for p, q in zip(levels[ASK_PX], levels[ASK_QTY])],
+            "bids": [[p, q] for p, q in zip(levels[BID_PX], levels[BID_QTY])],
+            "total_ask": self.total_ask,
+            "total_bid": self.total_bid,
+            "spread": self.spread(),
+            "mid": self.mid(),
+            "imbalance": self.imbalance(),
+        }
+
+
+class OrderBookStore:
+    """
+    종목별 OrderBook 보관소 (수신 루프에서 호가 틱마다 갱신, 동기 조회)
+    바뀐 종목의 스냅샷은 주기적으로 캐시에 기록 -> ingest 모드의 웹 워커 등 다른 프로세스의 뷰에서 조회
+    """
+    def __init__(self, flush_sec=None):
+        self._books = {}
+        self.mirror = CacheMirror(
+            "orderbook:{code}", self._export,
+            getattr(settings, 'KIS_ORDER_BOOK_FLUSH_SEC', 1.0) if flush_sec is None else flush_sec,
+        )
+
+    def __len__(self):
+        return len(self._books)
+
+    def apply(self, tick):
+        book = self._books.get(tick.code)
+        if book is None:
+            book = self._books[tick.code] = OrderBook(tick.code)
+        if book.apply(tick.fields):
+            self.mirror.mark(tick.code)
+        return book
+
+    def get(self, stock_code):
+        return self._books.get(stock_code)
+
+    def _export(self, stock_code):
+        book = self._books.get(stock_code)
+        return book.snapshot() if book is not None else None
+
+    def snapshot(self, stock_code):
+        """호가창 스냅샷 (이 프로세스에 없으면 캐시, 둘 다 없으면 None). 캐시 조회가 있으므로 동기 뷰에서 호출"""
+        book = self._books.get(stock_code)
+        if book is not None:
+            return book.snapshot()
+        return self.mirror.get(stock_code)
+
+    def forget(self, stock_code):
+        if self._books.pop(stock_code, None) is not None:
+            self.mirror.drop(stock_code)
+
+
+# 모듈 레벨에서 인스턴스 생성 (프로세스당 1개)
+order_books = OrderBookStore()
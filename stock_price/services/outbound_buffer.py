@@ -0,0 +1,161 @@
+import asyncio
+from collections import OrderedDict
+from django.conf import settings
+from .metrics import slow_consumer_actions
+
+ACTION_DOWNGRADE = "downgraded"
+ACTION_RESTORE = "restored"
+ACTION_DISCONNECT = "disconnected"
+
+
+def merge_updates(old, new):
+    """
+    같은 스트림의 연속된 업데이트 2개를 1개로 합침 (건너뛴 delta 를 버리지 않고 누적)
+    - 새 업데이트가 keyframe 이면 그대로
+    - 이전이 keyframe 이면 새 값 전체를 keyframe 으로
+    - 둘 다 delta 이면 변경 필드를 순서대로 합치고 first_seq 에 합친 구간의 첫 seq 를 남김
+      (Consumer 는 first_seq 로 연속 여부를 판단하고, 클라이언트는 base 로 받은 seq 부터 이어서 적용)
+    seq 가 이어지지 않으면 합칠 수 없으므로 keyframe 으로
+    """
+    if new.get("key"):
+        return new
+    first_seq = old.get("first_seq", old["seq"])
+    if old.get("key") or new.get("first_seq", new["seq"]) != old["seq"] + 1:
+        return {"stream": new["stream"], "seq": new["seq"], "data": new["data"], "key": True}
+    return {
+        "stream": new["stream"], "seq": new["seq"], "first_seq": first_seq, "data": new["data"],
+        "delta": {**old["delta"], **new["delta"]},
+    }
+
+
+def merge_stock_events(old, new):
+    """
+    같은 종목의 밀린 이벤트 2개를 스트림별 업데이트 1개로 합침 (같은 스트림은 merge_updates 로 delta 누적)
+    새 이벤트가 모두 keyframe 이면 그대로 사용 (publisher 가 미리 인코딩한 페이로드 재사용)
+    """
+    if all(update.get("key") for update in new["updates"]):
+        streams = {update["stream"] for update in new["updates"]}
+        if streams.issuperset(update["stream"] for update in old["updates"]):
+            return new
+    pending = {update["stream"]: update for update in new["updates"]}
+    updates = []
+    for update in old["updates"]:
+        latest = pending.pop(update["stream"], None)
+        updates.append(merge_updates(update, latest) if latest is not None else update)
+    updates.extend(pending.values())
+    # 합친 조합은 이 연결에만 있으므로 인코딩 캐시 없이 새 이벤트로
+    merged = {"code": new["code"], "updates": updates}
+    ts = old.get("ts", new.get("ts"))
+    if ts is not None:
+        merged["ts"] = ts
+    return merged
+
+
+def merge_theme_updates(old, new):
+    """밀린 테마 집계 이벤트 2개를 테마별 최신 행으로 합침 (각 이벤트는 바뀐 테마만 담고 있으므로 행을 버리지 않음)"""
+    rows = {row[0]: row for row in old["aggregates"]}
+    rows.update((row[0], row) for row in new["aggregates"])
+    merged = {"type": "theme_update", "aggregates": list(rows.values())}
+    names = {**old.get("names", {}), **new.get("names", {})}
+    if names:
+        merged["names"] = names
+    return merged
+
+
+class OutboundBuffer:
+    """
+    브라우저 연결 1개의 송신 버퍼 (키별 최신 값만 유지 + 크기 제한)
+    - 클라이언트가 밀리면 같은 종목 업데이트는 합쳐서(coalescing) 최신 상태만 전송
+    - 기본은 들어오는 즉시 전송, base_interval 을 주면 그 간격으로 모아서 전송 (watchlist 모드)
+    - 배치 전송 시간이 slow_send_sec 를 slow_strikes 번 연속 넘으면 전송 주기를 downgrade_interval_sec 로 낮춤
+    - 낮춘 뒤에도 한 배치 전송이 disconnect_send_sec 를 넘으면 연결 종료
+    - restore_after 번 연속 정상이면 원래 주기로 복구
+    """
+    def __init__(self, max_entries=None, slow_send_sec=None, slow_strikes=3, downgrade_interval_sec=None,
+                 disconnect_send_sec=None, restore_after=20):
+        self.max_entries = max_entries or getattr(settings, 'WS_OUTBOUND_MAX_ENTRIES', 256)
+        self.slow_send_sec = slow_send_sec or getattr(settings, 'WS_SLOW_SEND_SEC', 0.5)
+        self.slow_strikes = slow_strikes
+        self.downgrade_interval_sec = downgrade_interval_sec or getattr(settings, 'WS_SLOW_DOWNGRADE_INTERVAL_SEC', 1.0)
+        self.disconnect_send_sec = disconnect_send_sec or getattr(settings, 'WS_SLOW_DISCONNECT_SEC', 10.0)
+        self.restore_after = restore_after
+
+        self._pending = OrderedDict()   # 키 -> 이벤트 (삽입 순서 = 전송 순서)
+        self._ready = asyncio.Event()
+        self.base_interval = 0.0        # 정상 상태의 전송 간격 (0: 들어오는 즉시)
+        self.interval = 0.0             # 현재 전송 간격 (downgrade 시 늘어남)
+        self._downgraded = False
+        self._strikes = 0
+        self._healthy = 0
+        self.stats = {"coalesced": 0, "dropped": 0, ACTION_DOWNGRADE: 0, ACTION_RESTORE: 0}
+
+    def __len__(self):
+        return len(self._pending)
+
+    def __contains__(self, key):
+        return key in self._pending
+
+    def get(self, key):
+        return self._pending.get(key)
+
+    @property
+    def downgraded(self):
+        return self._downgraded
+
+    def set_base_interval(self, seconds):
+        """정상 상태 전송 간격 변경 (downgrade 중이면 복구 시 적용)"""
+        self.base_interval = seconds
+        if not self._downgraded:
+            self.interval = seconds
+
+    def _count(self, action):
+        self.stats[action] = self.stats.get(action, 0) + 1
+        slow_consumer_actions.inc(action)
+
+    def put(self, key, item, merge=None):
+        """전송 대기열에 추가 (같은 키가 대기 중이면 merge(old, new) 또는 새 값으로 교체)"""
+        old = self._pending.get(key)
+        if old is not None:
+            self._pending[key] = merge(old, item) if merge else item
+            self._count("coalesced")
+            return
+        if len(self._pending) >= self.max_entries:
+            self._pending.popitem(last=False)
+            self._count("dropped")
+        self._pending[key] = item
+        self._ready.set()
+
+    async def take(self):
+        """대기 중인 항목 전체를 꺼냄 (없으면 대기, downgrade 상태면 간격을 두고 모아서)"""
+        await self._ready.wait()
+        if self.interval:
+            await asyncio.sleep(self.interval)
+        batch, self._pending = list(self._pending.items()), OrderedDict()
+        self._ready.clear()
+        return batch
+
+    def assess(self, send_seconds):
+        """배치 전송 소요 시간으로 느린 클라이언트 판정 -> 취할 조치 (없으면 None)"""
+        if send_seconds >= self.slow_send_sec:
+            self._healthy = 0
+            self._strikes += 1
+            if self.downgraded and send_seconds >= self.disconnect_send_sec:
+                self._count(ACTION_DISCONNECT)
+                return ACTION_DISCONNECT
+            if not self.downgraded and self._strikes >= self.slow_strikes:
+                self.interval = max(self.downgrade_interval_sec, self.base_interval * 2)
+                self._downgraded = True
+                self._count(ACTION_DOWNGRADE)
+                return ACTION_DOWNGRADE
+            return None
+
+        self._strikes = 0
+        if self.downgraded:
+            self._healthy += 1
+            if self._healthy >= self.restore_after:
+                self.interval = self.base_interval
+                self._downgraded = False
+                self._healthy = 0
+                self._count(ACTION_RESTORE)
+                return ACTION_RESTORE
+        return None
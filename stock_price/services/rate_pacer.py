@@ -0,0 +1,35 @@
+import time
+import asyncio
+
+
+class TokenBucket:
+    """
+    토큰 버킷 전송 속도 제한 (초당 rate 개, 최대 burst 개까지 몰아서 허용)
+    KIS 실시간 등록/해제 패킷처럼 짧은 시간에 몰리면 거부되는 요청을 일정 속도로 흘려보낼 때 사용
+    """
+    def __init__(self, rate, burst=1, clock=time.monotonic):
+        self.rate = float(rate)
+        self.burst = max(1, burst)
+        self.clock = clock
+        self.tokens = float(self.burst)
+        self.updated = clock()
+        self.waited = 0.0  # 누적 대기 시간(초)
+
+    def take(self):
+        """토큰 1개 사용 -> 사용 가능해질 때까지 기다려야 할 시간(초, 0 이면 바로 전송)"""
+        if self.rate <= 0:
+            return 0.0
+        now = self.clock()
+        self.tokens = min(self.burst, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+        self.tokens -= 1
+        if self.tokens >= 0:
+            return 0.0
+        wait = -self.tokens / self.rate
+        self.waited += wait
+        return wait
+
+    async def acquire(self):
+        wait = self.take()
+        if wait:
+            await asyncio.sleep(wait)
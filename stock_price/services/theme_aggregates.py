@@ -0,0 +1,261 @@
+import json
+import asyncio
+from django.conf import settings
+from .kis_decoder import DECODERS, TR_ID_EXEC
+from . import metrics
+
+# ThemeSyncService -> 틱 처리 프로세스로 테마 편입 변경을 알리는 채널 레이어 그룹
+THEME_MEMBERS_GROUP = "theme_members"
+
+# theme_update 프레임의 테마 1개 = 위치 배열 (이름은 최초/멤버 변경 시에만 따로 보냄)
+AGGREGATE_FIELDS = ("id", "count", "avg", "wavg", "up", "down", "leader", "leader_rate")
+
+_EXEC = DECODERS[TR_ID_EXEC]
+_RATE = _EXEC.index['PRDY_CTRT']
+_VALUE = _EXEC.index['ACML_TR_PBMN']
+
+
+class ThemeAggregate:
+    """
+    테마 1개의 집계 (편입 종목 중 체결이 들어온 종목 기준)
+    합계만 들고 있다가 종목 등락률이 바뀌면 이전 값을 빼고 새 값을 더함 (테마당 O(1))
+    가중 등락률 = sum(등락률 x 누적 거래대금) / sum(누적 거래대금)
+    """
+    __slots__ = ('theme_id', 'name', 'members', 'count', 'sum_rate', 'sum_weighted', 'sum_weight',
+                 'up', 'down', 'leader', 'leader_rate')
+
+    def __init__(self, theme_id, name):
+        self.theme_id = theme_id
+        self.name = name
+        self.members = set()
+        self.count = 0
+        self.sum_rate = self.sum_weighted = self.sum_weight = 0.0
+        self.up = self.down = 0
+        self.leader = None
+        self.leader_rate = None
+
+    def _add(self, state, sign):
+        rate, weight = state
+        self.count += sign
+        self.sum_rate += sign * rate
+        self.sum_weighted += sign * rate * weight
+        self.sum_weight += sign * weight
+        if rate > 0:
+            self.up += sign
+        elif rate < 0:
+            self.down += sign
+
+    def update(self, code, old, new, stocks):
+        """종목 1개의 (등락률, 거래대금) 이 old -> new 로 바뀜 (old/new 가 None 이면 미반영 상태)"""
+        if old is not None:
+            self._add(old, -1)
+        if new is not None:
+            self._add(new, 1)
+            if self.leader is None or new[0] > self.leader_rate:
+                self.leader, self.leader_rate = code, new[0]
+                return
+        if code == self.leader:
+            if new is not None and new[0] >= self.leader_rate:
+                self.leader_rate = new[0]
+            else:
+                self._rescan_leader(stocks)  # 주도주가 내려가거나 빠질 때만 멤버 전체 확인
+
+    def _rescan_leader(self, stocks):
+        self.leader, self.leader_rate = None, None
+        for code in self.members:
+            state = stocks.get(code)
+            if state is not None and (self.leader is None or state[0] > self.leader_rate):
+                self.leader, self.leader_rate = code, state[0]
+
+    def row(self):
+        if not self.count:
+            return [self.theme_id, 0, None, None, 0, 0, None, None]
+        avg = self.sum_rate / self.count
+        wavg = self.sum_weighted / self.sum_weight if self.sum_weight > 0 else avg
+        return [self.theme_id, self.count, round(avg, 2), round(wavg, 2), self.up, self.down,
+                self.leader, round(self.leader_rate, 2)]
+
+
+class ThemeAggregator:
+    """
+    활성 거래일 테마(Theme / ThemeStock) 별 등락률 집계를 체결 틱으로 증분 갱신 (틱 처리 프로세스 1곳에서)
+    - add(tick): 체결 1건 -> 그 종목이 속한 테마만 갱신하고 dirty 표시
+    - 멤버 변경(add_member / remove_member)도 해당 종목 기여분만 더하거나 뺌 (전체 재계산 없음)
+    - 주기적으로 바뀐 테마만 theme_update 프레임으로 theme_global 그룹에 전송
+    """
+    def __init__(self):
+        self.reset()
+        self._task = None
+        # 채널 레이어 그룹 멤버십은 group_expiry 후 만료되므로 이 주기마다 다시 가입 (IngestServer 와 같은 주기)
+        self.members_refresh_sec = getattr(settings, 'KIS_INGEST_HEARTBEAT_SEC', 10)
+
+    def reset(self, date=None):
+        self.date = date
+        self.themes = {}     # 테마 id -> ThemeAggregate
+        self.by_code = {}    # 종목코드 -> {테마 id}
+        self.stocks = {}     # 종목코드 -> (등락률, 누적 거래대금)
+        self._dirty = set()
+        self._renamed = set()
+
+    def add(self, tick):
+        """체결 틱 1건 반영 (등락률이 없거나 그대로면 무시)"""
+        fields = tick.fields
+        try:
+            rate = float(fields[_RATE])
+        except (IndexError, ValueError):
+            return
+        try:
+            weight = float(fields[_VALUE])
+        except (IndexError, ValueError):
+            weight = 0.0  # 거래대금 필드가 없거나 잘린 레코드는 가중치 없이 등락률만 반영
+        code = tick.code
+        new = (rate, weight)
+        old = self.stocks.get(code)
+        if old == new:
+            return
+        self.stocks[code] = new
+        for theme_id in self.by_code.get(code, ()):
+            self.themes[theme_id].update(code, old, new, self.stocks)
+            self._dirty.add(theme_id)
+
+    def add_member(self, theme_id, code, name=None):
+        aggregate = self.themes.get(theme_id)
+        if aggregate is None:
+            aggregate = self.themes[theme_id] = ThemeAggregate(theme_id, name or "")
+            self._renamed.add(theme_id)
+        elif name and name != aggregate.name:
+            aggregate.name = name
+            self._renamed.add(theme_id)
+        if code in aggregate.members:
+            return
+        aggregate.members.add(code)
+        self.by_code.setdefault(code, set()).add(theme_id)
+        state = self.stocks.get(code)
+        if state is not None:
+            aggregate.update(code, None, state, self.stocks)
+        self._dirty.add(theme_id)
+
+    def remove_member(self, theme_id, code):
+        aggregate = self.themes.get(theme_id)
+        if aggregate is None or code not in aggregate.members:
+            return
+        aggregate.members.discard(code)
+        themes = self.by_code.get(code)
+        themes.discard(theme_id)
+        if not themes:
+            del self.by_code[code]
+        state = self.stocks.get(code)
+        if state is not None:
+            aggregate.update(code, state, None, self.stocks)
+        self._dirty.add(theme_id)
+
+    def load(self, date, members):
+        """거래일 전체 멤버십 적재 (members: [(테마 id, 테마명, 종목코드), ...]). 틱으로 받은 등락률은 유지"""
+        stocks = self.stocks
+        self.reset(date)
+        self.stocks = stocks
+        for theme_id, name, code in members:
+            self.add_member(theme_id, code, name)
+
+    def needs_reload(self, message):
+        """전체 재분석(reload) 이나 거래일 변경이면 멤버십을 DB 에서 다시 적재"""
+        return bool(message.get("reload")) or message.get("date") != self.date
+
+    def apply_members(self, message):
+        """ThemeSyncService 의 멤버 변경 메시지 반영 (added: [(테마 id, 테마명, 종목코드)], removed: [(테마 id, 종목코드)])"""
+        for theme_id, name, code in message.get("added", ()):
+            self.add_member(theme_id, code, name)
+        for theme_id, code in message.get("removed", ()):
+            self.remove_member(theme_id, code)
+
+    def drain(self):
+        """바뀐 테마의 theme_update 메시지 (없으면 None)"""
+        if not self._dirty:
+            return None
+        rows = [self.themes[theme_id].row() for theme_id in self._dirty if theme_id in self.themes]
+        message = {"type": "theme_update", "aggregates": rows}
+        if self._renamed:
+            message["names"] = {
+                theme_id: self.themes[theme_id].name for theme_id in self._renamed if theme_id in self.themes
+            }
+        self._dirty, self._renamed = set(), set()
+        return message if rows else None
+
+    def snapshot(self):
+        """전체 테마 집계 (디버그 / 테스트용)"""
+        return {theme_id: dict(zip(AGGREGATE_FIELDS, aggregate.row())) for theme_id, aggregate in self.themes.items()}
+
+    def start(self, channel_layer):
+        """
+        집계 전송 / 멤버 변경 수신 태스크 시작 (주기 0 이면 비활성)
+        KIS 피드를 가진 프로세스에서만 호출 (ingest 모드면 run_kis_ingest, 아니면 세션 풀을 쓰는 프로세스).
+        이미 실행 중이면 아무것도 하지 않으므로 세션이 여러 개여도 프로세스당 1개
+        """
+        interval = getattr(settings, 'THEME_AGGREGATE_INTERVAL_MS', 500) / 1000
+        if interval > 0 and (self._task is None or self._task.done()):
+            self._task = asyncio.create_task(self._run(channel_layer, interval))
+
+    async def _run(self, channel_layer, interval):
+        try:
+            self.load(*await asyncio.to_thread(load_members))
+            print(f"[ThemeAggregates] Loaded {len(self.themes)} themes for {self.date}")
+        except Exception as e:
+            print(f"[ThemeAggregates] Membership load error: {e}")
+        listener = asyncio.create_task(self._members_loop(channel_layer))
+        try:
+            while True:
+                await asyncio.sleep(interval)
+                message = self.drain()
+                if message is None:
+                    continue
+                try:
+                    # Consumer 가 그대로 전달할 JSON 텍스트를 미리 인코딩 (ThemeSyncService._theme_event 와 같은 형태)
+                    text = json.dumps(message, separators=(',', ':'))
+                    await metrics.group_send(channel_layer, "theme_global", {**message, "text": text})
+                except Exception as e:
+                    print(f"[ThemeAggregates] Broadcast error: {e}")
+        finally:
+            listener.cancel()
+
+    async def _members_loop(self, channel_layer):
+        channel = await channel_layer.new_channel()
+        await channel_layer.group_add(THEME_MEMBERS_GROUP, channel)
+        refresher = asyncio.create_task(self._refresh_membership(channel_layer, channel))
+        try:
+            while True:
+                message = await channel_layer.receive(channel)
+                try:
+                    if self.needs_reload(message):
+                        self.load(*await asyncio.to_thread(load_members))
+                    else:
+                        self.apply_members(message)
+                except Exception as e:
+                    print(f"[ThemeAggregates] Membership update error {message}: {e}")
+        finally:
+            refresher.cancel()
+
+    async def _refresh_membership(self, channel_layer, channel):
+        """channels_redis 그룹 멤버십 만료 전에 주기적으로 다시 가입 (만료되면 멤버 변경 이벤트를 못 받음)"""
+        while True:
+            await asyncio.sleep(self.members_refresh_sec)
+            try:
+                await channel_layer.group_add(THEME_MEMBERS_GROUP, channel)
+            except Exception as e:
+                print(f"[ThemeAggregates] Group refresh error: {e}")
+
+
+def load_members():
+    """
+    활성 거래일(가장 최근 테마 날짜, 히트맵과 동일) 의 멤버십 -> (날짜 문자열, [(테마 id, 테마명, 종목코드), ...])
+    stock_theme 앱 모델은 호출 시점에 import (stock_price 서비스 모듈이 stock_theme 에 import 의존하지 않도록)
+    """
+    from stock_theme.models import Theme, ThemeStock
+    latest = Theme.objects.order_by('-date').first()
+    if latest is None:
+        return None, []
+    rows = ThemeStock.objects.filter(theme__date=latest.date).values_list('theme_id', 'theme__name', 'stock__short_code')
+    return str(latest.date), list(rows)
+
+
+# 모듈 레벨에서 인스턴스 생성 (프로세스당 1개)
+theme_aggregates = ThemeAggregator()
@@ -0,0 +1,176 @@
+import os
+import glob
+import heapq
+import mmap
+import time
+import asyncio
+from datetime import datetime, timedelta
+
+# 세그먼트 파일 포맷
+#   MAGIC 다음에 레코드가 연속: varint(직전 레코드 대비 수신 시각 증가분 us) + varint(길이) + 원문 프레임(UTF-8)
+#   길이 0 레코드는 시각 기준점 재설정 (varint 값 = 절대 시각 us). 프로세스 재시작 후 같은 파일에 이어 쓸 때 사용
+#   (빈 프레임은 기록하지 않으므로 길이 0 은 항상 기준점 재설정)
+MAGIC = b"KISJ\x01"
+SUFFIX = ".kisj"
+
+
+def put_varint(buf, value):
+    """부호 없는 LEB128 varint 를 bytearray 에 추가"""
+    while value > 0x7F:
+        buf.append((value & 0x7F) | 0x80)
+        value >>= 7
+    buf.append(value)
+
+
+def get_varint(data, pos):
+    """data[pos:] 의 varint 디코딩 -> (값, 다음 위치)"""
+    value = shift = 0
+    while True:
+        byte = data[pos]
+        pos += 1
+        value |= (byte & 0x7F) << shift
+        if byte < 0x80:
+            return value, pos
+        shift += 7
+
+
+def segment_path(directory, name, day):
+    """일자별 세그먼트 경로 (세션마다 파일 분리: 20250102-kis-0.kisj)"""
+    return os.path.join(directory, f"{day}-{name}{SUFFIX}")
+
+
+class TickJournal:
+    """
+    KIS 수신 원문 프레임 기록기 (append-only, 일자별 세그먼트)
+    수신 루프에서는 메모리 버퍼에 varint 인코딩해서 붙이기만 하고,
+    파일 쓰기는 flush 주기마다 스레드에서 일괄 처리 (수신 루프는 디스크 I/O 를 기다리지 않음)
+    """
+    def __init__(self, directory, name="kis-0", flush_sec=1.0, clock=time.time_ns):
+        self.directory = directory
+        self.name = name
+        self.flush_sec = flush_sec
+        self.clock = clock
+        self.frames = 0
+        self.bytes_written = 0
+        self._buffer = bytearray()
+        self._pending = []      # 일자가 바뀌어 아직 쓰지 못한 이전 세그먼트 (경로, bytes)
+        self._path = None
+        self._day_end = 0       # 현재 세그먼트가 끝나는 시각 (us)
+        self._last_us = 0
+        self._flush_task = None
+
+    def _roll(self, now_us):
+        if self._buffer:
+            self._pending.append((self._path, bytes(self._buffer)))
+            self._buffer = bytearray()
+        now = datetime.fromtimestamp(now_us / 1e6)
+        midnight = datetime(now.year, now.month, now.day) + timedelta(days=1)
+        self._day_end = int(midnight.timestamp() * 1e6)
+        self._path = segment_path(self.directory, self.name, now.strftime("%Y%m%d"))
+        # 세그먼트를 열 때마다 기준 시각 기록 -> 기존 파일에 이어 써도 시각이 어긋나지 않음
+        put_varint(self._buffer, now_us)
+        put_varint(self._buffer, 0)
+        self._last_us = now_us
+
+    def append(self, frame):
+        """수신 프레임 1건 기록 (동기, 버퍼에만 추가). 빈 프레임은 기준점 재설정 레코드와 구분되지 않으므로 건너뜀"""
+        payload = frame.encode() if isinstance(frame, str) else frame
+        if not payload:
+            return
+        now_us = self.clock() // 1000
+        idle = not self._buffer and not self._pending  # flush 태스크는 버퍼가 빌 때까지만 돌므로 비어 있을 때만 확인
+        if now_us >= self._day_end:
+            self._roll(now_us)
+        buf = self._buffer
+        if now_us > self._last_us:
+            put_varint(buf, now_us - self._last_us)
+            self._last_us = now_us
+        else:
+            buf.append(0)  # 시계가 뒤로 가면 직전 시각 유지
+        put_varint(buf, len(payload))
+        buf += payload
+        self.frames += 1
+        if idle:
+            self._ensure_flush()
+
+    def _ensure_flush(self):
+        try:
+            loop = asyncio.get_running_loop()
+        except RuntimeError:
+            return  # 이벤트 루프 밖에서는 flush() 를 직접 호출
+        task = self._flush_task
+        if task is None or task.done() or task.get_loop() is not loop:
+            self._flush_task = loop.create_task(self._flush_loop())
+
+    def _take(self):
+        chunks, self._pending = self._pending, []
+        if self._buffer:
+            chunks.append((self._path, bytes(self._buffer)))
+            self._buffer = bytearray()
+        return chunks
+
+    def _write(self, chunks):
+        os.makedirs(self.directory, exist_ok=True)
+        for path, data in chunks:
+            with open(path, "ab") as f:
+                if f.tell() == 0:
+                    f.write(MAGIC)
+                f.write(data)
+            self.bytes_written += len(data)
+
+    def flush(self):
+        """버퍼를 파일에 기록 (동기)"""
+        chunks = self._take()
+        if chunks:
+            self._write(chunks)
+        return len(chunks)
+
+    async def _flush_loop(self):
+        while self._buffer or self._pending:
+            await asyncio.sleep(self.flush_sec)
+            try:
+                await asyncio.to_thread(self._write, self._take())
+            except Exception as e:
+                print(f"[Tick Journal] Write error ({self.name}): {e}")
+
+
+class TickJournalReader:
+    """
+    세그먼트 파일을 mmap 으로 열어 (수신 시각 us, 프레임) 을 순서대로 반환 (파일 전체를 메모리에 읽지 않음)
+    기록 중인 파일의 마지막 레코드가 잘려 있으면 거기서 멈춤
+    """
+    def __init__(self, path):
+        self.path = path
+
+    def __iter__(self):
+        with open(self.path, "rb") as f:
+            if os.fstat(f.fileno()).st_size < len(MAGIC):
+                return
+            with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as data:
+                if data[:len(MAGIC)] != MAGIC:
+                    raise ValueError(f"Not a tick journal: {self.path}")
+                pos, end, ts = len(MAGIC), len(data), 0
+                while pos < end:
+                    try:
+                        delta, pos = get_varint(data, pos)
+                        length, pos = get_varint(data, pos)
+                    except IndexError:
+                        return
+                    if length == 0:
+                        ts = delta
+                        continue
+                    if pos + length > end:
+                        return
+                    ts += delta
+                    yield ts, data[pos:pos + length].decode()
+                    pos += length
+
+
+def journal_segments(directory, day=None):
+    """디렉터리의 세그먼트 목록 (day='YYYYMMDD' 지정 시 해당 일자만, 세션별 파일 모두)"""
+    return sorted(glob.glob(os.path.join(directory, f"{day or '*'}-*{SUFFIX}")))
+
+
+def read_journal(paths):
+    """여러 세그먼트(세션별 파일)를 수신 시각 순으로 병합해서 반환"""
+    return heapq.merge(*(TickJournalReader(path) for path in paths), key=lambda record: record[0])
@@ -0,0 +1,58 @@
+import re
+from .tick_conflator import STREAM_EXEC, STREAM_HOGA
+
+# 구독 토픽 = "<스트림>:<종목코드>" (체결 exec:005930 / 호가 book:005930)
+TOPIC_EXEC = "exec"
+TOPIC_BOOK = "book"
+
+STREAM_TOPICS = {STREAM_EXEC: TOPIC_EXEC, STREAM_HOGA: TOPIC_BOOK}
+TOPIC_STREAMS = {TOPIC_EXEC: STREAM_EXEC, TOPIC_BOOK: STREAM_HOGA, "hoga": STREAM_HOGA}
+ALL_STREAMS = (STREAM_EXEC, STREAM_HOGA)
+
+
+def topic(stream, stock_code):
+    return f"{STREAM_TOPICS[stream]}:{stock_code}"
+
+
+def split_topic(name):
+    """'exec:005930' -> ('exec', '005930') (스트림은 내부 이름: exec / hoga)"""
+    prefix, _, stock_code = name.partition(":")
+    return TOPIC_STREAMS[prefix], stock_code
+
+
+def parse_topics(value):
+    """
+    클라이언트 구독 항목 -> 정규화된 토픽 리스트
+    'exec:005930' / 'book:005930' 은 해당 스트림만, 접두어 없는 '005930' 은 체결 + 호가 모두 (기존 프로토콜)
+    알 수 없는 스트림이나 종목코드가 비면 빈 리스트
+    """
+    prefix, sep, code = str(value).rpartition(":")
+    stock_code = re.sub(r'[^0-9]', '', code)
+    if not stock_code:
+        return []
+    if not sep:
+        return [topic(stream, stock_code) for stream in ALL_STREAMS]
+    stream = TOPIC_STREAMS.get(prefix.strip().lower())
+    return [topic(stream, stock_code)] if stream else []
+
+
+def expand_topics(values):
+    """토픽 / 종목코드가 섞인 목록을 토픽 목록으로 (중복 제거, 순서 유지)"""
+    return list(dict.fromkeys(name for value in values for name in parse_topics(value)))
+
+
+def group_name(name):
+    """토픽의 채널 레이어 그룹 이름 (그룹 이름에는 ':' 를 쓸 수 없음): exec:005930 -> stock_exec_005930"""
+    return "stock_" + name.replace(":", "_")
+
+
+def group_by_code(names):
+    """토픽 목록 -> {종목코드: (스트림, ...)} (KIS 등록은 종목 단위로 한 번에, 스트림 순서는 ALL_STREAMS 기준)"""
+    by_code = {}
+    for name in names:
+        stream, stock_code = split_topic(name)
+        by_code.setdefault(stock_code, set()).add(stream)
+    return {
+        stock_code: tuple(stream for stream in ALL_STREAMS if stream in streams)
+        for stock_code, streams in by_code.items()
+    }
@@ -0,0 +1,236 @@
+import json
+from django.conf import settings
+from .kis_decoder import DECODERS, TR_ID_EXEC, TR_ID_HOGA
+from .tick_conflator import STREAM_EXEC, STREAM_HOGA
+
+try:
+    import msgpack
+except ImportError:  # channels_redis 의존성으로 보통 설치되어 있음
+    msgpack = None
+
+FORMAT_JSON = "json"        # 기본: {"type": "stock_update", "data": {필드명: 값}}
+FORMAT_ARRAY = "array"      # JSON 위치 배열: [code, stream, seq, key, values(, base)]
+FORMAT_MSGPACK = "msgpack"  # array 와 같은 구조를 MessagePack 바이너리 프레임으로
+
+# 스트림별 필드 사전 (구독 시 1회 전달, 이후 위치 인덱스로만 전송)
+STREAM_FIELDS = {
+    STREAM_EXEC: DECODERS[TR_ID_EXEC].names + ("CNTG_CNT",),
+    STREAM_HOGA: DECODERS[TR_ID_HOGA].names,
+}
+STREAM_INDEX = {
+    stream: {name: i for i, name in enumerate(names)}
+    for stream, names in STREAM_FIELDS.items()
+}
+
+# 필드 프로필: 화면별로 필요한 필드만 전송 (스트림 -> 필드 목록, 목록이 없는 스트림은 전체 필드)
+# KIS_REALTIME_FIELD_PROFILES 설정으로 추가 / 변경 가능
+PROFILE_FULL = "full"
+FIELD_PROFILES = {
+    # 테마 히트맵: 등락률 / 거래량으로 블록 색상과 크기만 갱신
+    "heatmap": {STREAM_EXEC: ("STCK_PRPR", "PRDY_VRSS", "PRDY_VRSS_SIGN", "PRDY_CTRT", "CNTG_VOL", "ACML_VOL")},
+    # 시세 요약: 현재가 + 최우선 호가
+    "ticker": {
+        STREAM_EXEC: ("STCK_PRPR", "PRDY_VRSS", "PRDY_VRSS_SIGN", "PRDY_CTRT", "CNTG_VOL", "ACML_VOL", "ASKP1", "BIDP1"),
+        STREAM_HOGA: ("ASKP1", "BIDP1", "ASKP_RSQN1", "BIDP_RSQN1", "TOTAL_ASKP_RSQN", "TOTAL_BIDP_RSQN"),
+    },
+}
+
+
+class FieldProfile:
+    """
+    스트림별 전송 필드 부분집합
+    필드 순서는 STREAM_FIELDS 기준으로 정규화하므로 같은 필드 집합을 요청한 Consumer 는 같은 key 를 가짐
+    (key 는 인코딩 캐시 키에 들어가서 같은 프로필끼리 이벤트당 1회 인코딩 결과를 공유)
+    """
+    __slots__ = ('name', 'key', 'fields', 'index')
+
+    def __init__(self, name, fields, key=None):
+        self.name = name
+        self.fields = fields  # 스트림 -> 필드 tuple (없는 스트림은 전체 필드)
+        self.key = key or name
+        self.index = {stream: {n: i for i, n in enumerate(names)} for stream, names in fields.items()}
+
+    def stream_fields(self, stream):
+        return self.fields.get(stream, STREAM_FIELDS[stream])
+
+    def stream_index(self, stream):
+        return self.index.get(stream) or STREAM_INDEX[stream]
+
+    def project(self, stream, data):
+        names = self.fields.get(stream)
+        if names is None:
+            return data
+        return {name: data[name] for name in names if name in data}
+
+
+def _normalize_fields(spec):
+    """
+    {스트림: 필드 목록} -> {스트림: STREAM_FIELDS 순서의 필드 tuple}
+    알 수 없는 스트림 / 필드는 무시하고, 남는 필드가 없는 스트림은 제외 (= 전체 필드)
+    """
+    fields = {}
+    for stream, names in spec.items():
+        requested = {name for name in names if isinstance(name, str)}
+        selected = tuple(name for name in STREAM_FIELDS.get(stream, ()) if name in requested)
+        if selected:
+            fields[stream] = selected
+    return fields
+
+
+def resolve_profile(requested):
+    """
+    클라이언트가 요청한 프로필 이름('heatmap') 또는 필드 목록(['STCK_PRPR', ...]) -> FieldProfile
+    전체 필드('full' / 빈 값), 알 수 없는 이름, 유효한 필드가 없는 목록이면 None
+    """
+    if not requested or requested == PROFILE_FULL:
+        return None
+    if isinstance(requested, str):
+        spec = {**FIELD_PROFILES, **getattr(settings, 'KIS_REALTIME_FIELD_PROFILES', {})}.get(requested)
+        fields = _normalize_fields(spec or {})
+        return FieldProfile(requested, fields) if fields else None
+    if not isinstance(requested, (list, tuple)):
+        return None
+    # 필드 목록은 스트림 구분 없이 받아서 스트림별로 나눔 (체결 필드만 보내면 호가는 전체 필드)
+    fields = _normalize_fields({stream: requested for stream in STREAM_FIELDS})
+    if not fields:
+        return None
+    key = "fields:" + "|".join(f"{stream}={','.join(names)}" for stream, names in fields.items())
+    return FieldProfile("custom", fields, key)
+
+
+def negotiate(requested):
+    """클라이언트가 요청한 포맷 중 서버가 지원하는 포맷 반환 (msgpack 미설치 시 array)"""
+    if requested == FORMAT_MSGPACK:
+        return FORMAT_MSGPACK if msgpack is not None else FORMAT_ARRAY
+    if requested == FORMAT_ARRAY:
+        return FORMAT_ARRAY
+    return FORMAT_JSON
+
+
+def schema_message(fmt, profile=None):
+    """compact 포맷 협상 결과 + 필드 사전 (JSON 텍스트로 1회 전송, 프로필이 있으면 프로필 필드만)"""
+    return {
+        "type": "schema", "format": fmt, "profile": profile.name if profile else PROFILE_FULL,
+        "fields": {s: list(profile.stream_fields(s) if profile else names) for s, names in STREAM_FIELDS.items()},
+    }
+
+
+def to_positional(stream, data, key, index=None):
+    """
+    keyframe: 필드 사전 순서의 전체 값 배열
+    delta: [인덱스, 값, 인덱스, 값, ...] 평탄화 배열
+    index: 프로필 필드 사전 (없으면 스트림 전체 필드)
+    """
+    index = index or STREAM_INDEX[stream]
+    if key:
+        values = [None] * len(index)
+        for name, value in data.items():
+            i = index.get(name)
+            if i is not None:
+                values[i] = value
+        return values
+
+    pairs = []
+    for name, value in data.items():
+        i = index.get(name)
+        if i is not None:
+            pairs.append(i)
+            pairs.append(value)
+    return pairs
+
+
+def variant_key(fmt, keys, profile=None):
+    """인코딩 캐시 키: 포맷(/프로필) + 업데이트별 keyframe(k)/delta(d) 조합 (예: "json:kd", "array/heatmap:d")"""
+    prefix = f"{fmt}/{profile.key}:" if profile else f"{fmt}:"
+    return prefix + "".join("k" if key else "d" for key in keys)
+
+
+def build_messages(stock_code, updates, keys, profile=None):
+    """
+    publisher 업데이트 리스트 -> 클라이언트 stock_update 메시지 리스트 (keys: 업데이트별 keyframe 여부)
+    profile 이 있으면 keyframe / delta 모두 프로필 필드만 남김 (seq 는 그대로 이어지도록 빈 delta 도 전송)
+    """
+    messages = []
+    for update, key in zip(updates, keys):
+        message = {"type": "stock_update", "code": stock_code, "stream": update["stream"], "seq": update["seq"]}
+        if key:
+            message["key"] = True
+            data = update["data"]
+        else:
+            data = update["delta"]
+            if update.get("first_seq", update["seq"]) != update["seq"]:
+                # 여러 delta 를 합친 업데이트: 클라이언트는 seq 대신 base(합치기 전 마지막 seq) 와 이어지는지 확인
+                message["base"] = update["first_seq"] - 1
+        message["data"] = profile.project(update["stream"], data) if profile else data
+        messages.append(message)
+    return messages
+
+
+def pre_encode(stock_code, updates, formats):
+    """
+    publisher 측에서 seq 가 이어지는(따라오고 있는) 시청자용 페이로드를 포맷별로 미리 인코딩
+    Returns: {variant_key: (text_data, bytes_data)} - Consumer 는 그대로 전달만 함
+    """
+    keys = [bool(update.get("key")) for update in updates]
+    messages = build_messages(stock_code, updates, keys)
+    return {variant_key(fmt, keys): encode_updates(fmt, messages) for fmt in formats}
+
+
+def encode_updates(fmt, messages, profile=None):
+    """
+    Consumer 가 만든 stock_update 메시지 리스트를 협상된 포맷으로 인코딩
+    compact 포맷의 위치 인덱스는 프로필 필드 사전 기준 (schema_message(fmt, profile) 와 같은 순서)
+    Returns: (text_data, bytes_data) 중 하나만 채워진 튜플
+    """
+    if fmt == FORMAT_JSON:
+        return json.dumps(messages[0] if len(messages) == 1 else messages), None
+
+    rows = [
+        [m["code"], m["stream"], m["seq"], 1 if m.get("key") else 0,
+         to_positional(m["stream"], m["data"], m.get("key"), profile.stream_index(m["stream"]) if profile else None)]
+        + ([m["base"]] if "base" in m else [])
+        for m in messages
+    ]
+    if fmt == FORMAT_MSGPACK:
+        return None, msgpack.packb(rows)
+    return json.dumps(rows, separators=(',', ':')), None
+
+
+def _msgpack_array_header(data):
+    """msgpack 배열의 (원소 수, 헤더 길이)"""
+    first = data[0]
+    if first & 0xF0 == 0x90:
+        return first & 0x0F, 1
+    if first == 0xDC:
+        return int.from_bytes(data[1:3], "big"), 3
+    if first == 0xDD:
+        return int.from_bytes(data[1:5], "big"), 5
+    raise ValueError("Not a msgpack array")
+
+
+def _msgpack_array_prefix(count):
+    if count < 16:
+        return bytes([0x90 | count])
+    if count < 0x10000:
+        return b"\xdc" + count.to_bytes(2, "big")
+    return b"\xdd" + count.to_bytes(4, "big")
+
+
+def join_payloads(fmt, payloads):
+    """
+    여러 이벤트(종목)의 인코딩 결과를 프레임 1개로 합침 (watchlist 모드)
+    이벤트별로 공유되는 인코딩 결과를 그대로 이어 붙이므로 다시 인코딩하지 않음
+    - JSON / array: 최상위 배열 하나로 (단일 메시지 객체는 원소로, 배열은 원소만 펼쳐서)
+    - msgpack: 배열 헤더만 합친 원소 수로 다시 씀
+    """
+    if len(payloads) == 1:
+        return tuple(payloads[0])
+    if fmt == FORMAT_MSGPACK:
+        count, bodies = 0, []
+        for _, data in payloads:
+            n, offset = _msgpack_array_header(data)
+            count += n
+            bodies.append(data[offset:])
+        return None, _msgpack_array_prefix(count) + b"".join(bodies)
+    parts = [text[1:-1] if text.startswith("[") else text for text, _ in payloads]
+    return "[" + ",".join(parts) + "]", None
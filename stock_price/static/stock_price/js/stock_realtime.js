@@ -3,6 +3,7 @@ const StockApp = {
     version: "1.2", // For cache verification
     socket: null,
     stockCode: null,
+    streamState: new RealtimeStreamState(),
 
 
     init: function () {
@@ -159,6 +160,7 @@ const StockApp = {
 
         this.stockCode = code;
         this.disconnectWS();
+        this.streamState.reset();
 
         this.updateStatus('연결 시도 중...');
         this.socket = new WebSocket('ws://' + window.location.host + '/ws/stock/' + code + '/');
@@ -224,23 +226,30 @@ const StockApp = {
 
     handleMessage: function (event) {
         try {
-            const data = JSON.parse(event.data);
-
-            // 1. 호가 데이터 (10호가가 모두 있어야 진짜 호가 데이터임)
-            // 체결 데이터에도 ASKP1, BIDP1은 포함되어 있어서 오동작함 -> ASKP10, BIDP10 체크로 구분
-            if (data.ASKP10 !== undefined && data.BIDP10 !== undefined) {
-                this.renderHoga(data);
-            }
-
-            // 2. 체결 데이터
-            if (data.STCK_PRPR !== undefined && data.STCK_CNTG_HOUR) {
-                this.renderExecution(data);
-            }
+            // 서버는 스트림별 delta(변경 필드)만 보내므로 병합된 전체 상태로 렌더링
+            // 여러 업데이트가 묶여 오면 배열로 전달됨 (수신 순서대로 처리)
+            this.streamState.decode(event.data).forEach(msg => {
+                if (msg.type !== 'stock_update') return;
+                const data = this.streamState.apply(msg);
+                if (data) this.renderTick(msg.stream, data);
+            });
         } catch (e) {
             console.error("Parse Error", e);
         }
     },
 
+    renderTick: function (stream, data) {
+        // 1. 호가 데이터
+        if (stream === 'hoga') {
+            this.renderHoga(data);
+        }
+
+        // 2. 체결 데이터
+        if (stream === 'exec') {
+            this.renderExecution(data);
+        }
+    },
+
     renderExecution: function (data) {
         const price = data.STCK_PRPR;
         const diff = data.PRDY_VRSS;
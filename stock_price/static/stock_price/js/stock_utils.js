@@ -33,6 +33,179 @@ const StockUtils = {
     }
 };
 
+/**
+ * MessagePack 디코더 (서버 wire_format 의 msgpack 포맷 수신용, 외부 라이브러리 없이 사용하는 타입만 지원)
+ * nil / bool / int / float / str / bin / array / map
+ */
+const Msgpack = {
+    /**
+     * @param {ArrayBuffer|Uint8Array} buffer
+     * @returns {*}
+     */
+    decode: function (buffer) {
+        const bytes = buffer instanceof Uint8Array ? buffer : new Uint8Array(buffer);
+        const view = new DataView(bytes.buffer, bytes.byteOffset, bytes.byteLength);
+        const decoder = new TextDecoder();
+        let pos = 0;
+
+        const str = (length) => {
+            const value = decoder.decode(bytes.subarray(pos, pos + length));
+            pos += length;
+            return value;
+        };
+        const bin = (length) => {
+            const value = bytes.slice(pos, pos + length);
+            pos += length;
+            return value;
+        };
+        const array = (length) => {
+            const value = new Array(length);
+            for (let i = 0; i < length; i++) value[i] = read();
+            return value;
+        };
+        const map = (length) => {
+            const value = {};
+            for (let i = 0; i < length; i++) {
+                const key = read();
+                value[key] = read();
+            }
+            return value;
+        };
+        const uint = (size) => {
+            let value;
+            if (size === 1) value = view.getUint8(pos);
+            else if (size === 2) value = view.getUint16(pos);
+            else if (size === 4) value = view.getUint32(pos);
+            else value = Number(view.getBigUint64(pos));
+            pos += size;
+            return value;
+        };
+        const int = (size) => {
+            let value;
+            if (size === 1) value = view.getInt8(pos);
+            else if (size === 2) value = view.getInt16(pos);
+            else if (size === 4) value = view.getInt32(pos);
+            else value = Number(view.getBigInt64(pos));
+            pos += size;
+            return value;
+        };
+
+        const read = () => {
+            const type = bytes[pos++];
+            if (type <= 0x7f) return type;                                  // positive fixint
+            if (type >= 0xe0) return type - 0x100;                          // negative fixint
+            if ((type & 0xf0) === 0x80) return map(type & 0x0f);            // fixmap
+            if ((type & 0xf0) === 0x90) return array(type & 0x0f);          // fixarray
+            if ((type & 0xe0) === 0xa0) return str(type & 0x1f);            // fixstr
+            switch (type) {
+                case 0xc0: return null;
+                case 0xc2: return false;
+                case 0xc3: return true;
+                case 0xc4: return bin(uint(1));
+                case 0xc5: return bin(uint(2));
+                case 0xc6: return bin(uint(4));
+                case 0xca: { const value = view.getFloat32(pos); pos += 4; return value; }
+                case 0xcb: { const value = view.getFloat64(pos); pos += 8; return value; }
+                case 0xcc: return uint(1);
+                case 0xcd: return uint(2);
+                case 0xce: return uint(4);
+                case 0xcf: return uint(8);
+                case 0xd0: return int(1);
+                case 0xd1: return int(2);
+                case 0xd2: return int(4);
+                case 0xd3: return int(8);
+                case 0xd9: return str(uint(1));
+                case 0xda: return str(uint(2));
+                case 0xdb: return str(uint(4));
+                case 0xdc: return array(uint(2));
+                case 0xdd: return array(uint(4));
+                case 0xde: return map(uint(2));
+                case 0xdf: return map(uint(4));
+                default: throw new Error(`Unsupported msgpack type 0x${type.toString(16)}`);
+            }
+        };
+        return read();
+    }
+};
+
+/**
+ * Realtime stream state (delta 적용)
+ * 서버는 스트림(종목+호가/체결)별로 key(전체 스냅샷) 이후 seq 가 이어지는 delta(변경 필드)만 보냄
+ * 밀려서 여러 delta 를 합친 메시지는 base(합치기 전 마지막 seq) 를 함께 보냄
+ * compact(array / msgpack) 포맷이면 구독 시 받은 필드 사전(schema)으로 위치 배열을 객체로 복원
+ * msgpack 포맷은 바이너리 프레임으로 오므로 소켓의 binaryType 을 'arraybuffer' 로 설정해야 함
+ */
+class RealtimeStreamState {
+    constructor() {
+        this.streams = {};
+        this.fields = null;
+    }
+
+    /**
+     * WebSocket 메시지를 메시지 객체 배열로 변환
+     * - schema 메시지: 필드 사전만 저장 (빈 배열 반환)
+     * - JSON 포맷: 객체 또는 객체 배열
+     * - array 포맷: [code, stream, seq, key, values(, base)] 행 배열
+     * - msgpack 포맷 (ArrayBuffer): array 포맷과 같은 행 배열
+     * @param {string|ArrayBuffer} raw
+     * @returns {Array}
+     */
+    decode(raw) {
+        const payload = typeof raw === 'string' ? JSON.parse(raw) : Msgpack.decode(raw);
+        if (payload.type === 'schema') {
+            this.fields = payload.fields;
+            return [];
+        }
+        const items = Array.isArray(payload) ? payload : [payload];
+        return items.map(item => Array.isArray(item) ? this.fromRow(item) : item);
+    }
+
+    fromRow(row) {
+        const [code, stream, seq, key, values, base] = row;
+        const names = this.fields[stream];
+        const data = {};
+        if (key) {
+            names.forEach((name, i) => { data[name] = values[i]; });
+        } else {
+            // delta: [인덱스, 값, 인덱스, 값, ...]
+            for (let i = 0; i < values.length; i += 2) {
+                data[names[values[i]]] = values[i + 1];
+            }
+        }
+        const msg = { type: 'stock_update', code, stream, seq, key: key === 1, data };
+        if (base !== undefined) {
+            msg.base = base;
+        }
+        return msg;
+    }
+
+    /**
+     * delta 를 적용하고 병합된 전체 데이터를 반환 (keyframe 전이거나 seq 가 끊기면 null)
+     * @param {object} msg { code, stream, seq, key?, base?, data }
+     * @returns {object|null}
+     */
+    apply(msg) {
+        const streamKey = `${msg.code}:${msg.stream}`;
+        if (msg.key) {
+            this.streams[streamKey] = { seq: msg.seq, data: Object.assign({}, msg.data) };
+            return this.streams[streamKey].data;
+        }
+
+        const state = this.streams[streamKey];
+        const base = msg.base !== undefined ? msg.base : msg.seq - 1;
+        if (!state || base !== state.seq) {
+            return null; // 다음 keyframe 까지 대기
+        }
+        Object.assign(state.data, msg.data);
+        state.seq = msg.seq;
+        return state.data;
+    }
+
+    reset() {
+        this.streams = {};
+    }
+}
+
 /**
  * Shared Stock Autocomplete Logic
  */
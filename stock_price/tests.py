@@ -1,7 +1,42 @@
 from rest_framework.test import APITestCase
+from django.test import SimpleTestCase, override_settings
 from unittest.mock import patch, MagicMock, AsyncMock
 from stock_price.services.kis_rest_client import kis_rest_client
+from stock_price.services.kis_decoder import DECODERS, KISTick, decode_frame, TR_ID_EXEC, TR_ID_HOGA, TR_ID_HOGA_ELW
+from stock_price.serializers import StockResponseSerializer, StockRequestSerializer
+from stock_price.services.kis_ws_client import KISWebSocketClient, RESPONSE_SERIALIZERS
+from stock_price.services.tick_conflator import TickConflator
+from stock_price.services.delta_encoder import DeltaEncoder
+from stock_price.services.kis_slot_manager import KISSlotManager
+from stock_price.services.kis_session_pool import KISSessionPool, STRATEGY_LEAST_LOAD
+from stock_price.services.kis_ingest import ClusterRefCounter, IngestIntentClient, IngestServer, INGEST_GROUP
+from stock_price.services.local_hub import LocalHub
+from stock_price.services.last_value_cache import LastValueCache
+from stock_price.services.order_book import OrderBookStore
+from stock_price.services.candle_aggregator import CandleAggregator
+from stock_price.services.theme_aggregates import ThemeAggregator
+from stock_price.services.rate_pacer import TokenBucket
+from stock_price.services.latency import LatencyHistogram, LatencyTracker, STAGE_DECODE, STAGE_PUBLISH, STAGE_SEND, STAGE_EXCHANGE
+from stock_price.services import metrics
+from stock_price.services.outbound_buffer import OutboundBuffer, merge_stock_events, ACTION_DOWNGRADE, ACTION_RESTORE, ACTION_DISCONNECT
+from stock_price.services.kis_replay import KISReplayServer, SyntheticFeed, frame_key, parse_speed
+from stock_price.services.topics import ALL_STREAMS, topic, parse_topics, expand_topics, group_by_code
+from stock_price.services.tick_journal import TickJournal, TickJournalReader, journal_segments, read_journal, get_varint, put_varint
+from stock_price.consumers import StockConsumer
+from stock_price.services import wire_format
 import asyncio
+import json
+import os
+import random
+import tempfile
+import websockets
+import time
+import timeit
+
+# 채널 레이어 / Django 캐시를 거치는 테스트는 Redis 없이도 돌도록 프로세스 메모리 백엔드로 대체
+IN_MEMORY_CHANNEL_LAYERS = {'default': {'BACKEND': 'channels.layers.InMemoryChannelLayer'}}
+LOCMEM_CACHES = {'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'}}
+
 
 class StockRankingServiceTest(APITestCase):
     @patch('stock_price.services.kis_rest_client.kis_rest_client.get_fluctuation_rank', new_callable=AsyncMock)
@@ -61,3 +96,2267 @@ class StockRankingServiceTest(APITestCase):
         result = asyncio.run(kis_rest_client.get_volume_rank())
         self.assertIsNone(result, "Should return None on failure")
         print("[TEST] 거래량 순위 조회 실패 처리 확인")
+
+
+def _legacy_parse_from_raw(raw_data, field_table):
+    """기존 parse_from_raw 구현 (get_val 클로저 + 필드별 try/except) - 벤치마크 기준선"""
+    try:
+        parts = raw_data.split('|')
+        if len(parts) < 4:
+            return None
+        fields = parts[3].split('^')
+
+        def get_val(idx, type_func=str):
+            try:
+                return type_func(fields[idx])
+            except (IndexError, ValueError):
+                return None
+
+        return {name: get_val(i, conv) for i, (name, conv) in enumerate(field_table)}
+    except Exception:
+        return None
+
+
+def _best_of(*funcs, number=1000, repeat=15, timer=time.perf_counter):
+    """함수들을 번갈아 가며 repeat 회 측정한 최소 소요 시간 (측정 순서에 따른 편차 제거)"""
+    best = [float('inf')] * len(funcs)
+    for _ in range(repeat):
+        for i, func in enumerate(funcs):
+            best[i] = min(best[i], timeit.timeit(func, number=number, timer=timer))
+    return best
+
+
+def _sample_frame(decoder, count=1):
+    values = [f"{1000 + i}" if conv is float else f"S{i}" for i, conv in enumerate(decoder.convs)]
+    values[0] = "005930"
+    return f"0|{decoder.tr_id}|{count:03d}|" + "^".join(values * count)
+
+
+def _legacy_handle_frame(raw_data, field_table, serializer_class):
+    """기존 _handle_message 의 틱 처리 (split -> parse_from_raw -> Serializer 검증 -> serializer.data) - 벤치마크 기준선"""
+    parts = raw_data.split('|')
+    if len(parts) > 3 and parts[3].split("^")[0]:
+        serializer = serializer_class(data=_legacy_parse_from_raw(raw_data, field_table))
+        if serializer.is_valid():
+            return serializer.data
+    return None
+
+
+def _tick_stream(decoder, codes=20, ticks=25, changes=12, seed=7):
+    """
+    종목 codes 개가 번갈아 들어오는 실시간 프레임 (틱마다 시각 + 숫자 필드 changes 개만 바뀜)
+    실제 체결/호가처럼 같은 종목의 연속 레코드는 일부 필드만 달라짐
+    """
+    rng = random.Random(seed)
+    numeric = [i for i, conv in enumerate(decoder.convs) if conv is float]
+    states = {}
+    frames = []
+    for _ in range(ticks):
+        for n in range(codes):
+            code = f"{n:06d}"
+            values = states.get(code)
+            if values is None:
+                values = states[code] = [str(rng.randint(1000, 999999)) if conv is float else f"S{i}"
+                                         for i, conv in enumerate(decoder.convs)]
+                values[0] = code
+            values[1] = f"09{rng.randint(0, 5959):04d}"
+            for i in rng.sample(numeric, changes):
+                values[i] = rng.choice((str(rng.randint(1000, 999999)), f"{rng.uniform(-30, 30):.2f}"))
+            frames.append(f"0|{decoder.tr_id}|001|" + "^".join(values))
+    return frames
+
+
+class KISTickDecoderTest(SimpleTestCase):
+    def test_decode_matches_legacy_parser(self):
+        """
+        [Decoder] TR_ID 별 필드 테이블 디코더가 기존 파서와 같은 결과를 내는지 테스트
+        """
+        for tr_id, decoder in DECODERS.items():
+            table = list(zip(decoder.names, decoder.convs))
+            raw = _sample_frame(decoder)
+            self.assertEqual(decoder.decode(raw), _legacy_parse_from_raw(raw, table))
+
+            # 빈 값/누락 필드는 None 처리
+            broken = raw.replace("^1002^", "^^", 1).rsplit("^", 3)[0]
+            self.assertEqual(decoder.decode(broken), _legacy_parse_from_raw(broken, table))
+
+        raw = _sample_frame(DECODERS[TR_ID_EXEC])
+        self.assertEqual(StockResponseSerializer.parse_from_raw(raw)['MKSC_SHRN_ISCD'], '005930')
+        self.assertIsNone(StockResponseSerializer.parse_from_raw("0|H0STCNT0"))
+        self.assertEqual(len(DECODERS[TR_ID_HOGA_ELW].names), 59)
+
+    def test_decoder_throughput_benchmark(self):
+        """
+        [Benchmark] 수신 루프가 실제로 쓰는 경로 (decode_frame -> KISTick -> 타입 변환된 dict) frames/sec 비교
+        기준선은 기존 _handle_message 가 틱마다 dict 를 만들던 경로 (parse_from_raw -> Serializer 검증 -> serializer.data)
+        기존 경로 대비 5배 이상, parse_from_raw 단독 대비로도 더 빨라야 함
+        """
+        print("\n=== KIS Tick Decoder Benchmark ===")
+        for tr_id in (TR_ID_EXEC, TR_ID_HOGA):
+            decoder = DECODERS[tr_id]
+            table = list(zip(decoder.names, decoder.convs))
+            frames = _tick_stream(decoder)
+
+            def legacy_parse():
+                for raw in frames:
+                    _legacy_parse_from_raw(raw, table)
+
+            def legacy_handle():
+                for raw in frames:
+                    _legacy_handle_frame(raw, table, RESPONSE_SERIALIZERS[tr_id])
+
+            def decode_to_dict():
+                for raw in frames:
+                    frame_decoder, records = decode_frame(raw)
+                    for fields in records:
+                        KISTick(frame_decoder.tr_id, fields[0], fields).to_dict()
+
+            # 같은 종목의 직전 레코드를 재사용하는 변환이 기존 파서와 같은 값을 내는지 먼저 확인
+            for raw in frames:
+                frame_decoder, records = decode_frame(raw)
+                self.assertEqual(KISTick(frame_decoder.tr_id, records[0][0], records[0]).to_dict(),
+                                 _legacy_parse_from_raw(raw, table))
+
+            handled, = _best_of(legacy_handle, number=1, repeat=3, timer=time.process_time)
+            parsed, decoded = _best_of(legacy_parse, decode_to_dict, number=1, repeat=15, timer=time.process_time)
+
+            count = len(frames)
+            print(f"[TEST] {tr_id}: legacy handle {count / handled:,.0f} fps | "
+                  f"legacy parse {count / parsed:,.0f} fps | "
+                  f"decode+dict {count / decoded:,.0f} fps "
+                  f"({handled / decoded:.1f}x / {parsed / decoded:.1f}x)")
+            self.assertGreaterEqual(handled / decoded, 5.0)
+            self.assertLess(decoded, parsed)
+
+
+class KISMultiRecordFrameTest(SimpleTestCase):
+    def test_decode_frame_returns_all_records(self):
+        """
+        [Decoder] 0|H0STCNT0|003|... 프레임에서 3개 레코드를 모두 꺼내는지 테스트
+        """
+        decoder = DECODERS[TR_ID_EXEC]
+        decoded = decode_frame(_sample_frame(decoder, count=3))
+        self.assertIsNotNone(decoded)
+        self.assertIs(decoded[0], decoder)
+        self.assertEqual(len(decoded[1]), 3)
+        self.assertTrue(all(len(fields) == decoder.field_count for fields in decoded[1]))
+
+    def test_handle_message_publishes_batch_once(self):
+        """
+        [Client] 멀티 레코드 프레임이 종목 그룹으로 한 번에(batch) 전송되는지 테스트
+        """
+        client = KISWebSocketClient()
+        client.conflator = None
+        client.channel_layer = MagicMock()
+        client.publish_remote = True  # ingest 프로세스처럼 Redis 그룹으로 전송
+        client.channel_layer.group_send = AsyncMock()
+
+        asyncio.run(client._handle_message(_sample_frame(DECODERS[TR_ID_EXEC], count=3)))
+
+        client.channel_layer.group_send.assert_called_once()
+        group_name, event = client.channel_layer.group_send.call_args.args
+        self.assertEqual(group_name, "stock_exec_005930")
+        self.assertEqual((event["type"], event["topic"]), ("stock_update", "exec:005930"))
+        self.assertEqual(len(event["updates"]), 3)
+
+
+class KISTickFastPathTest(SimpleTestCase):
+    def _client(self):
+        client = KISWebSocketClient()
+        client.conflator = None
+        client.channel_layer = MagicMock()
+        client.publish_remote = True  # ingest 프로세스처럼 Redis 그룹으로 전송
+        client.channel_layer.group_send = AsyncMock()
+        return client
+
+    def test_fast_path_publishes_without_validation(self):
+        """
+        [Client] 기본(off) 모드에서는 DRF 검증 없이 틱이 바로 전송되는지 테스트
+        """
+        client = self._client()
+        raw = _sample_frame(DECODERS[TR_ID_EXEC])
+        with patch.object(client, '_validate') as mock_validate:
+            asyncio.run(client._handle_message(raw))
+            mock_validate.assert_not_called()
+
+        event = client.channel_layer.group_send.call_args.args[1]
+        self.assertEqual(event["updates"][0]["data"], DECODERS[TR_ID_EXEC].decode(raw))
+
+    def test_validation_modes(self):
+        """
+        [Client] all 모드는 전수 검증, sample 모드는 N건 중 1건만 DRF 검증하는지 테스트
+        """
+        client = self._client()
+        client.validation_mode = 'all'
+        with patch.object(client, '_validate', return_value=True) as mock_validate:
+            asyncio.run(client._handle_message(_sample_frame(DECODERS[TR_ID_EXEC], count=3)))
+            self.assertEqual(mock_validate.call_count, 3)
+
+        client.validation_mode = 'sample'
+        client.validation_sample_rate = 2
+        tick = KISTick(TR_ID_EXEC, '005930', DECODERS[TR_ID_EXEC].records(_sample_frame(DECODERS[TR_ID_EXEC]).split('|')[3])[0])
+        with patch.dict(RESPONSE_SERIALIZERS, {TR_ID_EXEC: MagicMock()}) as serializers_map:
+            for _ in range(4):
+                self.assertTrue(client._validate(tick))
+            self.assertEqual(serializers_map[TR_ID_EXEC].call_count, 2)
+
+    def test_per_tick_cpu_cost(self):
+        """
+        [Benchmark] 틱 1건당 CPU 비용: DRF 검증 경로 vs 신뢰 fast-path
+        """
+        print("\n=== Per-tick CPU cost (DRF vs fast-path) ===")
+        for tr_id in (TR_ID_EXEC, TR_ID_HOGA):
+            decoder = DECODERS[tr_id]
+            fields = decoder.records(_sample_frame(decoder).split('|', 3)[3])[0]
+            SerializerClass = RESPONSE_SERIALIZERS[tr_id]
+
+            def drf_path():
+                serializer = SerializerClass(data=decoder.to_dict(fields))
+                serializer.is_valid()
+                return serializer.data
+
+            def fast_path():
+                return KISTick(tr_id, fields[0], fields).to_dict()
+
+            drf, fast = _best_of(drf_path, fast_path, number=100, repeat=3, timer=time.process_time)
+            drf, fast = drf / 100, fast / 100
+            print(f"[TEST] {tr_id}: DRF {drf * 1e6:,.1f}us/tick | fast-path {fast * 1e6:,.1f}us/tick ({drf / fast:.0f}x)")
+            self.assertLess(fast * 10, drf)
+
+
+def _sample_tick(tr_id, **overrides):
+    decoder = DECODERS[tr_id]
+    fields = list(decoder.records(_sample_frame(decoder).split('|', 3)[3])[0])
+    for name, value in overrides.items():
+        fields[decoder.index[name]] = value
+    return KISTick(tr_id, fields[0], tuple(fields))
+
+
+class TickConflatorTest(SimpleTestCase):
+    def test_hoga_latest_wins_and_exec_accumulates(self):
+        """
+        [Conflation] 호가는 마지막 값만, 체결은 체결량/건수를 누적해서 내보내는지 테스트
+        """
+        conflator = TickConflator(interval_ms=100)
+        conflator.add(_sample_tick(TR_ID_HOGA, ASKP1="70100"))
+        conflator.add(_sample_tick(TR_ID_HOGA, ASKP1="70200"))
+        conflator.add(_sample_tick(TR_ID_EXEC, STCK_PRPR="70000", CNTG_VOL="10"))
+        conflator.add(_sample_tick(TR_ID_EXEC, STCK_PRPR="70100", CNTG_VOL="5"))
+
+        drained = conflator.drain()
+        self.assertEqual(len(drained), 1)
+        code, items = drained[0]
+        self.assertEqual(code, "005930")
+        (_, hoga), (_, execution) = items
+        self.assertEqual(hoga["ASKP1"], 70200.0)
+        self.assertEqual(execution["STCK_PRPR"], 70100.0)
+        self.assertEqual(execution["CNTG_VOL"], 15.0)
+        self.assertEqual(execution["CNTG_CNT"], 2)
+        self.assertEqual(conflator.drain(), [])
+
+    def test_handle_message_defers_to_flush(self):
+        """
+        [Client] conflation 사용 시 수신 즉시 전송하지 않고 flush 때 종목/스트림 토픽당 1회 전송하는지 테스트
+        """
+        client = KISWebSocketClient()
+        client.conflator = TickConflator(interval_ms=100)
+        client.channel_layer = MagicMock()
+        client.publish_remote = True  # ingest 프로세스처럼 Redis 그룹으로 전송
+        client.channel_layer.group_send = AsyncMock()
+
+        async def run():
+            for _ in range(20):
+                await client._handle_message(_sample_frame(DECODERS[TR_ID_EXEC], count=3))
+                await client._handle_message(_sample_frame(DECODERS[TR_ID_HOGA]))
+            self.assertEqual(client.channel_layer.group_send.call_count, 0)
+            for code, data in client.conflator.drain():
+                await client._publish(code, data)
+
+        asyncio.run(run())
+        calls = client.channel_layer.group_send.call_args_list
+        self.assertEqual([call.args[0] for call in calls], ["stock_exec_005930", "stock_book_005930"])
+        self.assertEqual([[update["stream"] for update in call.args[1]["updates"]] for call in calls], [["exec"], ["hoga"]])
+        self.assertEqual(calls[0].args[1]["updates"][0]["data"]["CNTG_CNT"], 60)
+
+
+class DeltaEncodingTest(SimpleTestCase):
+    def test_encoder_sends_changed_fields_and_keyframes(self):
+        """
+        [Delta] 첫 전송/주기적으로 keyframe, 그 사이에는 변경 필드만 담기는지 테스트
+        """
+        encoder = DeltaEncoder(keyframe_interval=3)
+        first = encoder.encode("005930", "exec", {"STCK_PRPR": 70000.0, "ACML_VOL": 10.0})
+        second = encoder.encode("005930", "exec", {"STCK_PRPR": 70000.0, "ACML_VOL": 12.0})
+        encoder.encode("005930", "exec", {"STCK_PRPR": 70100.0, "ACML_VOL": 13.0})
+        fourth = encoder.encode("005930", "exec", {"STCK_PRPR": 70100.0, "ACML_VOL": 14.0})
+
+        self.assertTrue(first["key"])
+        self.assertEqual((second["seq"], second["delta"]), (2, {"ACML_VOL": 12.0}))
+        self.assertTrue(fourth["key"])
+
+        encoder.forget("005930")
+        self.assertTrue(encoder.encode("005930", "exec", {"STCK_PRPR": 1.0})["key"])
+
+    def test_consumer_sends_keyframe_then_deltas(self):
+        """
+        [Consumer] 구독 후 첫 메시지와 seq 누락 시에는 전체, 이어지면 delta 를 보내는지 테스트
+        """
+        consumer = StockConsumer()
+        consumer.stream_seqs = {}
+        consumer.wire_format = wire_format.FORMAT_JSON
+        consumer.send = AsyncMock()
+        encoder = DeltaEncoder()
+
+        def event(data):
+            return {"type": "stock_update", "code": "005930", "updates": [encoder.encode("005930", "exec", data)]}
+
+        async def run():
+            encoder.encode("005930", "exec", {"STCK_PRPR": 69900.0, "ACML_VOL": 1.0})  # 구독 전 전송분
+            await consumer.stock_update(event({"STCK_PRPR": 70000.0, "ACML_VOL": 2.0}))
+            await consumer.stock_update(event({"STCK_PRPR": 70000.0, "ACML_VOL": 3.0}))
+            encoder.encode("005930", "exec", {"STCK_PRPR": 70000.0, "ACML_VOL": 4.0})  # 누락분
+            await consumer.stock_update(event({"STCK_PRPR": 70000.0, "ACML_VOL": 5.0}))
+
+        asyncio.run(run())
+        sent = [json.loads(call.kwargs["text_data"]) for call in consumer.send.call_args_list]
+        self.assertEqual(sent[0]["data"], {"STCK_PRPR": 70000.0, "ACML_VOL": 2.0})
+        self.assertTrue(sent[0]["key"])
+        self.assertEqual(sent[1]["data"], {"ACML_VOL": 3.0})
+        self.assertNotIn("key", sent[1])
+        self.assertTrue(sent[2]["key"])
+
+
+class CompactWireFormatTest(SimpleTestCase):
+    def _messages(self):
+        encoder = DeltaEncoder()
+        tick = _sample_tick(TR_ID_EXEC, STCK_PRPR="70000", PRDY_CTRT="1.25", ACML_VOL="1000")
+        key = encoder.encode("005930", "exec", tick.to_dict())
+        delta = encoder.encode("005930", "exec", _sample_tick(TR_ID_EXEC, STCK_PRPR="70100", ACML_VOL="1010").to_dict())
+        return [
+            {"type": "stock_update", "code": "005930", "stream": "exec", "seq": key["seq"], "key": True, "data": key["data"]},
+            {"type": "stock_update", "code": "005930", "stream": "exec", "seq": delta["seq"], "data": delta["delta"]},
+        ]
+
+    def test_array_and_msgpack_round_trip(self):
+        """
+        [Wire] array/msgpack 포맷이 필드 사전으로 원래 값을 복원할 수 있는지 테스트
+        """
+        messages = self._messages()
+        text, _ = wire_format.encode_updates(wire_format.FORMAT_ARRAY, messages)
+        rows = json.loads(text)
+        names = wire_format.STREAM_FIELDS["exec"]
+
+        code, stream, seq, key, values = rows[0]
+        self.assertEqual((code, stream, seq, key), ("005930", "exec", 1, 1))
+        self.assertEqual(dict(zip(names, values))["STCK_PRPR"], 70000.0)
+        delta = rows[1][4]
+        self.assertEqual({names[delta[i]]: delta[i + 1] for i in range(0, len(delta), 2)}, messages[1]["data"])
+
+        _, binary = wire_format.encode_updates(wire_format.FORMAT_MSGPACK, messages)
+        self.assertEqual(wire_format.msgpack.unpackb(binary), rows)
+
+    def test_compact_payload_size(self):
+        """
+        [Wire] 히트맵(30종목) 시나리오에서 compact 포맷이 JSON 대비 절반 이하인지 측정
+        """
+        print("\n=== Wire format payload size (30 symbols x 20 updates) ===")
+        encoder = DeltaEncoder()
+        sizes = {fmt: 0 for fmt in (wire_format.FORMAT_JSON, wire_format.FORMAT_ARRAY, wire_format.FORMAT_MSGPACK)}
+        for n in range(20):
+            for i in range(30):
+                code = f"{i:06d}"
+                update = encoder.encode(code, "exec", _sample_tick(TR_ID_EXEC, STCK_PRPR=str(70000 + n), ACML_VOL=str(1000 + n)).to_dict())
+                message = {"type": "stock_update", "code": code, "stream": "exec", "seq": update["seq"]}
+                message.update({"key": True, "data": update["data"]} if update.get("key") else {"data": update["delta"]})
+                for fmt in sizes:
+                    text, binary = wire_format.encode_updates(fmt, [message])
+                    sizes[fmt] += len(binary) if binary is not None else len(text.encode())
+
+        print(f"[TEST] bytes: {sizes}")
+        self.assertLess(sizes[wire_format.FORMAT_ARRAY] * 2, sizes[wire_format.FORMAT_JSON])
+        self.assertLess(sizes[wire_format.FORMAT_MSGPACK] * 2, sizes[wire_format.FORMAT_JSON])
+
+    def test_consumer_negotiates_format_once(self):
+        """
+        [Consumer] compact 포맷 요청 시 필드 사전을 1회만 보내는지 테스트
+        """
+        consumer = StockConsumer()
+        consumer.wire_format = wire_format.FORMAT_JSON
+        consumer.send = AsyncMock()
+
+        async def run():
+            await consumer.set_wire_format("array")
+            await consumer.set_wire_format("array")
+
+        asyncio.run(run())
+        consumer.send.assert_called_once()
+        self.assertEqual(json.loads(consumer.send.call_args.kwargs["text_data"])["type"], "schema")
+        self.assertEqual(consumer.wire_format, wire_format.FORMAT_ARRAY)
+
+
+class FieldProfileTest(SimpleTestCase):
+    def test_resolve_profile(self):
+        """
+        [Profile] 이름 / 필드 목록으로 프로필을 만들고, 같은 필드 집합이면 순서와 무관하게 같은 key 인지 테스트
+        """
+        heatmap = wire_format.resolve_profile("heatmap")
+        self.assertEqual(set(heatmap.stream_fields("exec")),
+                         {"STCK_PRPR", "PRDY_VRSS", "PRDY_VRSS_SIGN", "PRDY_CTRT", "CNTG_VOL", "ACML_VOL"})
+        self.assertEqual(heatmap.stream_fields("hoga"), wire_format.STREAM_FIELDS["hoga"])
+        self.assertIsNone(wire_format.resolve_profile("full"))
+        self.assertIsNone(wire_format.resolve_profile("unknown"))
+        self.assertIsNone(wire_format.resolve_profile(["NOT_A_FIELD", 1]))
+
+        a = wire_format.resolve_profile(["ACML_VOL", "STCK_PRPR", "NOT_A_FIELD"])
+        b = wire_format.resolve_profile(["STCK_PRPR", "ACML_VOL"])
+        self.assertEqual(a.key, b.key)
+        self.assertEqual(a.stream_fields("exec"), ("STCK_PRPR", "ACML_VOL"))
+        # 호가에도 있는 필드(ACML_VOL)는 호가 스트림에도 적용
+        self.assertEqual(a.stream_fields("hoga"), ("ACML_VOL",))
+
+        with self.settings(KIS_REALTIME_FIELD_PROFILES={"chart": {"exec": ["CNTG_VOL", "STCK_PRPR"]}}):
+            self.assertEqual(wire_format.resolve_profile("chart").stream_fields("exec"), ("STCK_PRPR", "CNTG_VOL"))
+
+    def test_projection_shared_per_profile(self):
+        """
+        [Profile] 같은 프로필 Consumer 들은 이벤트당 1회만 투영/인코딩하고, compact 필드 사전도 프로필 기준인지 테스트
+        """
+        hub = LocalHub()
+        client = KISWebSocketClient()
+        client.channel_layer = MagicMock(group_send=AsyncMock())
+        consumers = []
+        for profile in ["heatmap"] * 20 + [None] * 5:
+            consumer = StockConsumer()
+            consumer.stream_seqs = {}
+            consumer.wire_format = wire_format.FORMAT_JSON
+            consumer.send = AsyncMock()
+            consumers.append(consumer)
+
+        async def run():
+            for consumer, profile in zip(consumers, ["heatmap"] * 20 + [None] * 5):
+                await consumer.set_wire_format("array")
+                if profile:
+                    await consumer.set_field_profile(profile)
+                await hub.subscribe("exec:005930", consumer)
+            with patch("stock_price.services.kis_ws_client.local_hub", hub), \
+                    patch("stock_price.consumers.wire_format.encode_updates", wraps=wire_format.encode_updates) as encode:
+                await client._publish("005930", [("exec", _sample_tick(TR_ID_EXEC).to_dict())])
+                await client._publish("005930", [("exec", _sample_tick(TR_ID_EXEC, STCK_PRPR="71000").to_dict())])
+            return encode.call_count
+
+        encode_count = asyncio.run(run())
+        # publisher 의 전체 필드 포맷별 인코딩 + heatmap 프로필은 이벤트당 1회 (Consumer 20개 공유)
+        self.assertEqual(encode_count, 2 * len(client.preencode_formats) + 2)
+
+        heatmap, full = consumers[0], consumers[-1]
+        schema = json.loads(heatmap.send.call_args_list[-3].kwargs["text_data"])
+        self.assertEqual((schema["type"], schema["profile"]), ("schema", "heatmap"))
+        names = schema["fields"]["exec"]
+        key_row, delta_row = (json.loads(call.kwargs["text_data"])[0] for call in heatmap.send.call_args_list[-2:])
+        self.assertEqual(len(key_row[4]), len(names))
+        self.assertEqual(dict(zip(names, key_row[4]))["STCK_PRPR"], _sample_tick(TR_ID_EXEC).value("STCK_PRPR"))
+        self.assertEqual({names[delta_row[4][i]]: delta_row[4][i + 1] for i in range(0, len(delta_row[4]), 2)},
+                         {"STCK_PRPR": 71000.0})
+        self.assertIs(heatmap.send.call_args.kwargs["text_data"], consumers[19].send.call_args.kwargs["text_data"])
+
+        sizes = [len(consumer.send.call_args_list[-2].kwargs["text_data"]) for consumer in (heatmap, full)]
+        print(f"[TEST] Keyframe bytes heatmap profile {sizes[0]} vs full {sizes[1]}")
+        self.assertLess(sizes[0] * 3, sizes[1])
+
+
+class KISSlotManagerTest(SimpleTestCase):
+    def setUp(self):
+        self.now = 0.0
+        self.slots = KISSlotManager(capacity=4, linger_sec=30, clock=lambda: self.now)
+
+    def _keys(self, code):
+        return [(TR_ID_HOGA, code), (TR_ID_EXEC, code)]
+
+    def test_release_after_linger(self):
+        """
+        [Slot] 시청자 0명 후 linger 시간이 지나야 해제 대상이 되는지 테스트
+        """
+        register, _, _ = self.slots.acquire(self._keys("005930"))
+        self.assertEqual(register, self._keys("005930"))
+        self.assertEqual(self.slots.acquire(self._keys("005930")), ([], [], []))
+
+        self.slots.release(self._keys("005930"))
+        self.slots.release(self._keys("005930"))
+        self.now = 29
+        self.assertEqual(self.slots.expired(), [])
+
+        # linger 중 재시청하면 재등록 없이 유지
+        self.assertEqual(self.slots.acquire(self._keys("005930")), ([], [], []))
+        self.slots.release(self._keys("005930"))
+        self.now = 60
+        self.assertEqual(self.slots.expired(), self._keys("005930"))
+        self.assertEqual(self.slots.usage()["used"], 0)
+
+    def test_evicts_only_lingering_symbols(self):
+        """
+        [Slot] 한도 도달 시 lingering 종목만 밀어내고, 시청 중인 종목으로 가득 차면 대기열에 넣는지 테스트
+        """
+        self.slots.acquire(self._keys("000001"))
+        self.slots.acquire(self._keys("000002"))
+        self.slots.release(self._keys("000002"))
+
+        register, evict, queued = self.slots.acquire(self._keys("000003"))
+        self.assertEqual(register, self._keys("000003"))
+        self.assertEqual(evict, self._keys("000002"))
+        self.assertEqual(queued, [])
+
+        # 000001 / 000003 은 시청 중이므로 밀어내지 않고 대기
+        register, evict, queued = self.slots.acquire(self._keys("000004"))
+        self.assertEqual((register, evict, queued), ([], [], self._keys("000004")))
+        self.assertEqual(self.slots.watchers((TR_ID_EXEC, "000001")), 1)
+        self.slots.acquire(self._keys("000004"))
+        self.assertEqual(self.slots.waiting((TR_ID_EXEC, "000004")), 2)
+
+        usage = self.slots.usage()
+        print(f"[TEST] slot usage: {usage}")
+        self.assertEqual((usage["used"], usage["active"], usage["evicted"], usage["waiting"]), (4, 4, 1, 2))
+        self.assertEqual(usage["by_tr_id"], {TR_ID_HOGA: 2, TR_ID_EXEC: 2})
+
+        # 슬롯이 비기 전에는 승격되지 않고, 000001 시청 종료 후 linger 중이면 그 슬롯을 밀어내고 대기 시청자 수 그대로 등록
+        self.assertEqual(self.slots.promote(), ([], []))
+        self.slots.release(self._keys("000001"))
+        register, evict = self.slots.promote()
+        self.assertEqual((register, evict), (self._keys("000004"), self._keys("000001")))
+        self.assertEqual(self.slots.watchers((TR_ID_EXEC, "000004")), 2)
+
+        # 대기 중 구독 취소는 대기 시청자 수만 줄임 (다른 종목 슬롯에 영향 없음)
+        self.slots.acquire(self._keys("000005"))
+        self.slots.release(self._keys("000005"))
+        self.assertEqual((self.slots.waiting((TR_ID_EXEC, "000005")), self.slots.usage()["waiting"]), (0, 0))
+        self.assertEqual(self.slots.watchers((TR_ID_EXEC, "000003")), 1)
+
+    def test_client_sends_deregistration(self):
+        """
+        [Slot] 클라이언트가 해제/밀어낸 슬롯에 tr_type=2 패킷을 보내는지 테스트
+        """
+        client = KISWebSocketClient()
+        client.slots = KISSlotManager(capacity=2, linger_sec=0)
+        client.ws = MagicMock(send=AsyncMock())
+        client.connected = True
+        client.running = True
+        client.approval_key = "key"
+
+        async def run():
+            await client.subscribe("005930")
+            await client.unsubscribe("005930")  # 시청 종료 -> linger 중인 슬롯은 밀어낼 수 있음
+            await client.subscribe("000660")
+
+        asyncio.run(run())
+        sent = [json.loads(call.args[0]) for call in client.ws.send.call_args_list]
+        self.assertEqual(
+            [(p["header"]["tr_type"], p["body"]["input"]["tr_key"]) for p in sent],
+            [("1", "005930"), ("1", "005930"), ("2", "005930"), ("2", "005930"), ("1", "000660"), ("1", "000660")],
+        )
+        self.assertEqual(client.slot_usage()["used"], 2)
+
+    def test_client_queues_when_active_slots_full(self):
+        """
+        [Slot] 시청 중인 종목으로 가득 차면 등록하지 않고 구독자에게 queued 를 알리고, 슬롯이 비면 등록 후 live 를 알리는지 테스트
+        """
+        client = KISWebSocketClient()
+        client.slots = KISSlotManager(capacity=1, linger_sec=0)
+        client.ws = MagicMock(send=AsyncMock())
+        client.connected = True
+        client.running = True
+        client.approval_key = "key"
+        consumer = MagicMock(stream_status=AsyncMock())
+        hub = LocalHub()
+
+        async def run():
+            await hub.subscribe("exec:000660", consumer)
+            with patch("stock_price.services.kis_ws_client.local_hub", hub):
+                await client.subscribe("005930", ("exec",))
+                await client.subscribe("000660", ("exec",))
+                await asyncio.sleep(0)
+                self.assertEqual(client.slots.watchers((TR_ID_EXEC, "005930")), 1)
+                await client.unsubscribe("005930", ("exec",))
+                await asyncio.gather(*client._promote_waiting())
+                await asyncio.sleep(0)
+
+        asyncio.run(run())
+        sent = [json.loads(call.args[0]) for call in client.ws.send.call_args_list]
+        self.assertEqual(
+            [(p["header"]["tr_type"], p["body"]["input"]["tr_key"]) for p in sent],
+            [("1", "005930"), ("2", "005930"), ("1", "000660")],
+        )
+        statuses = [call.args[0]["status"] for call in consumer.stream_status.call_args_list]
+        self.assertEqual(statuses, ["queued", "live"])
+        self.assertEqual(client.slots.watchers((TR_ID_EXEC, "000660")), 1)
+
+
+class KISSessionPoolTest(SimpleTestCase):
+    def _pool(self, n=3, capacity=41, strategy="hash"):
+        sessions = []
+        for i in range(n):
+            session = KISWebSocketClient(appkey=f"key{i}", appsecret="secret", name=f"kis-{i}")
+            session.slots = KISSlotManager(capacity=capacity)
+            session.running = True  # 실제 연결 태스크는 띄우지 않음
+            sessions.append(session)
+        return KISSessionPool(sessions, strategy)
+
+    def test_consistent_hash_assignment(self):
+        """
+        [Pool] 일관 해싱으로 종목이 세션에 고르게 나뉘고, 같은 종목은 같은 세션에 유지되는지 테스트
+        """
+        pool = self._pool()
+        codes = [f"{i:06d}" for i in range(60)]
+
+        async def run():
+            for code in codes:
+                await pool.subscribe(code)
+                await pool.subscribe(code)
+
+        asyncio.run(run())
+        usage = pool.slot_usage()
+        print(f"[TEST] per session used: {[u['used'] for u in usage['by_session'].values()]}")
+        self.assertEqual(usage["used"], 120)
+        self.assertTrue(all(0 < u["used"] <= 41 for u in usage["by_session"].values()))
+        for code in codes:
+            self.assertEqual(pool.session_for(code).slots.watchers((TR_ID_EXEC, code)), 2)
+
+        # 세션 하나를 제거해도 남은 세션에 배정되어 있던 종목은 이동하지 않음 (해시 위치 기준)
+        smaller = self._pool(2)
+        for code in codes:
+            primary = pool._ring_order(code)[0].name
+            if primary != "kis-2":
+                self.assertEqual(smaller._ring_order(code)[0].name, primary)
+
+    def test_spills_to_next_session_when_full(self):
+        """
+        [Pool] 해시 위치 세션이 가득 차면 다음 세션에 배정되는지 / least_load 배정 테스트
+        """
+        pool = self._pool(n=2, capacity=4)
+
+        async def run(pool):
+            for code in ("000001", "000002", "000003", "000004"):
+                await pool.subscribe(code)
+
+        asyncio.run(run(pool))
+        self.assertEqual([u["used"] for u in pool.slot_usage()["by_session"].values()], [4, 4])
+
+        pool = self._pool(n=2, strategy=STRATEGY_LEAST_LOAD)
+        asyncio.run(run(pool))
+        self.assertEqual([u["active"] for u in pool.slot_usage()["by_session"].values()], [4, 4])
+
+    def test_unsubscribe_releases_on_owning_session(self):
+        """
+        [Pool] 배정 기록이 다른 세션으로 바뀌어도 구독 취소는 실제로 시청자를 들고 있는 세션에서만 반영되는지 테스트
+        """
+        pool = self._pool(n=2)
+        owner, other = pool.sessions
+
+        async def run():
+            await owner.subscribe("005930", ("exec",))
+            await other.subscribe("005930", ("hoga",))  # 다른 세션의 같은 종목 다른 스트림
+            pool._assignments["005930"] = other         # 재배정으로 배정 기록이 덮어써진 상황
+            await pool.unsubscribe("005930", ("exec",))
+            await pool.unsubscribe("000660", ("exec",))  # 아무도 들고 있지 않으면 무시
+
+        asyncio.run(run())
+        self.assertEqual(owner.slots.watchers((TR_ID_EXEC, "005930")), 0)
+        self.assertEqual(other.slots.watchers((TR_ID_HOGA, "005930")), 1)
+        self.assertEqual(other.slot_usage()["active"], 1)
+
+
+class KISIngestTest(SimpleTestCase):
+    def test_cluster_refcount(self):
+        """
+        [Ingest] 여러 워커가 같은 토픽을 봐도 KIS 구독은 1회, 마지막 워커가 떠나거나 timeout 시 해제
+        """
+        refs = ClusterRefCounter(timeout_sec=30)
+        self.assertEqual(refs.subscribe("w1", ["exec:005930"], 0), (["exec:005930"], []))
+        self.assertEqual(refs.subscribe("w2", ["exec:005930", "book:005930"], 0), (["book:005930"], []))
+        self.assertEqual(refs.unsubscribe("w1", ["exec:005930"], 1), ([], []))
+
+        # heartbeat 로 유실된 intent 보정 (w2 가 000660 체결도 보고 있음)
+        self.assertEqual(refs.heartbeat("w2", ["exec:005930", "book:005930", "exec:000660"], 5), (["exec:000660"], []))
+
+        # w2 프로세스 종료 -> heartbeat 끊김 -> timeout 후 모든 참조 해제
+        self.assertEqual(refs.expire(20), ([], []))
+        self.assertEqual(refs.expire(40), ([], ["book:005930", "exec:000660", "exec:005930"]))
+        self.assertEqual(refs.workers(), 0)
+
+    @override_settings(CHANNEL_LAYERS=IN_MEMORY_CHANNEL_LAYERS)
+    def test_intents_reach_ingest_pool(self):
+        """
+        [Ingest] 웹 워커 intent 가 채널 레이어를 거쳐 ingest 풀의 스트림별 구독/해제로 반영되는지 테스트
+        """
+        pool = MagicMock(reserve_many=MagicMock(return_value=[]), unsubscribe=AsyncMock(), sessions=[])
+        server = IngestServer(pool)
+        workers = [IngestIntentClient(heartbeat_sec=60), IngestIntentClient(heartbeat_sec=60)]
+        workers[1].worker = "other-host:1"
+
+        async def run():
+            channel = await server.channel_layer.new_channel()
+            await server.channel_layer.group_add(INGEST_GROUP, channel)
+            # 워커 0 은 체결만(히트맵), 워커 1 은 체결 + 호가(상세 페이지)
+            streams = [("exec",), ("exec", "hoga")]
+            for worker, worker_streams in zip(workers, streams):
+                await worker.subscribe("005930", worker_streams)  # 첫 heartbeat + subscribe intent
+                await worker.subscribe("005930", worker_streams)  # 같은 워커 내 두 번째 시청자는 intent 없음
+            await asyncio.sleep(0)
+            for worker, worker_streams in zip(workers, streams):
+                await worker.unsubscribe("005930", worker_streams)
+                await worker.unsubscribe("005930", worker_streams)
+            # 토픽 없이 종목코드만 보내는 이전 버전 워커는 체결 + 호가
+            await server.apply({"type": "ingest.subscribe", "code": "000660", "worker": "legacy:1"})
+
+            while True:
+                try:
+                    message = await asyncio.wait_for(server.channel_layer.receive(channel), 0.1)
+                except asyncio.TimeoutError:
+                    break
+                await server.apply(message)
+            for worker in workers:
+                worker._heartbeat_task.cancel()
+
+        asyncio.run(run())
+        self.assertEqual(
+            [list(call.args[0]) for call in pool.reserve_many.call_args_list],
+            [[("000660", ("exec", "hoga"))], [("005930", ("exec",))], [("005930", ("hoga",))]],
+        )
+        self.assertEqual([call.args for call in pool.unsubscribe.await_args_list], [("005930", ("exec", "hoga"))])
+
+
+class KISReceiveQueueTest(SimpleTestCase):
+    def test_slow_publish_does_not_block_reads(self):
+        """
+        [Receive] group_send 가 느려도 수신은 멈추지 않고, 종목별 순서는 유지되는지 테스트
+        """
+        client = KISWebSocketClient()
+        client.conflator = None
+        client.recv_workers = 2
+        client._recv_queues = [asyncio.Queue(100) for _ in range(2)]
+        published = []
+
+        async def slow_group_send(group, message):
+            await asyncio.sleep(0.01)
+            published.append((message["code"], message["updates"][0]["data"]["STCK_PRPR"]))
+
+        client.channel_layer = MagicMock(group_send=slow_group_send)
+        client.publish_remote = True  # ingest 프로세스처럼 Redis 그룹으로 전송
+        decoder = DECODERS[TR_ID_EXEC]
+        frames = []
+        for n in range(20):
+            for code in ("005930", "000660", "035420"):
+                values = [f"{1000 + i}" if conv is float else f"S{i}" for i, conv in enumerate(decoder.convs)]
+                values[0], values[2] = code, str(n)
+                frames.append(f"0|{TR_ID_EXEC}|001|" + "^".join(values))
+
+        async def run():
+            tasks = [asyncio.create_task(client._process_loop(queue)) for queue in client._recv_queues]
+            start = time.perf_counter()
+            for frame in frames:
+                client._enqueue(frame)
+            enqueue_time = time.perf_counter() - start
+            while any(queue.qsize() for queue in client._recv_queues):
+                await asyncio.sleep(0.01)
+            await asyncio.sleep(0.05)
+            for task in tasks:
+                task.cancel()
+            return enqueue_time
+
+        enqueue_time = asyncio.run(run())
+        print(f"[TEST] enqueue 60 frames: {enqueue_time * 1e6:.0f}us (publish 10ms each)")
+        self.assertLess(enqueue_time, 0.01)
+        self.assertEqual(client.receive_stats()["received"], 60)
+        for code in ("005930", "000660", "035420"):
+            self.assertEqual([price for c, price in published if c == code], [float(n) for n in range(20)])
+
+    def test_full_queue_drops_and_counts(self):
+        """
+        [Receive] 큐가 가득 차면 프레임을 버리고 dropped 카운터를 올리는지 테스트
+        """
+        client = KISWebSocketClient()
+        client.recv_workers = 1
+        client._recv_queues = [asyncio.Queue(2)]
+        for _ in range(5):
+            client._enqueue(_sample_frame(DECODERS[TR_ID_EXEC]))
+        stats = client.receive_stats()
+        self.assertEqual((stats["received"], stats["dropped"], stats["queue_depth"]), (5, 3, 2))
+
+
+class LocalHubTest(SimpleTestCase):
+    def _consumer(self):
+        consumer = StockConsumer()
+        consumer.stream_seqs = {}
+        consumer.wire_format = wire_format.FORMAT_JSON
+        consumer.send = AsyncMock()
+        return consumer
+
+    def test_local_fanout_encodes_once(self):
+        """
+        [Hub] 같은 프로세스 Consumer 들은 Redis 없이 직접 받고, 인코딩은 틱당 1회만 하는지 테스트
+        """
+        hub = LocalHub()
+        consumers = [self._consumer() for _ in range(50)]
+        client = KISWebSocketClient()
+        client.channel_layer = MagicMock(group_send=AsyncMock())
+
+        async def run():
+            for consumer in consumers:
+                await hub.subscribe("exec:005930", consumer)
+            with patch("stock_price.services.kis_ws_client.local_hub", hub), \
+                    patch("stock_price.consumers.wire_format.encode_updates", wraps=wire_format.encode_updates) as encode:
+                await client._publish("005930", [("exec", _sample_tick(TR_ID_EXEC).to_dict())])
+                # 호가는 book:005930 토픽으로 가므로 체결만 구독한 Consumer 에게는 전달되지 않음
+                await client._publish("005930", [
+                    ("exec", _sample_tick(TR_ID_EXEC, STCK_PRPR="71000").to_dict()),
+                    ("hoga", _sample_tick(TR_ID_HOGA).to_dict()),
+                ])
+            return encode.call_count
+
+        encode_count = asyncio.run(run())
+        # publisher 가 토픽 이벤트당 포맷별 1회만 인코딩하고 Consumer 50개는 그대로 전달
+        self.assertEqual(encode_count, 3 * len(client.preencode_formats))
+        client.channel_layer.group_send.assert_not_called()
+        self.assertTrue(all(consumer.send.await_count == 2 for consumer in consumers))
+        self.assertIs(consumers[0].send.call_args.kwargs["text_data"], consumers[-1].send.call_args.kwargs["text_data"])
+
+    @override_settings(KIS_REALTIME_INGEST=True, CHANNEL_LAYERS=IN_MEMORY_CHANNEL_LAYERS)
+    def test_relay_joins_group_once_per_worker(self):
+        """
+        [Hub] ingest 모드에서는 워커당 릴레이 채널 1개만 토픽 그룹에 가입해서 로컬로 분배하는지 테스트
+        """
+        hub = LocalHub()
+        consumers = [self._consumer() for _ in range(3)]
+
+        async def run():
+            for consumer in consumers:
+                await hub.subscribe("exec:005930", consumer)
+            layer = hub.relay.channel_layer
+            update = DeltaEncoder().encode("005930", "exec", {"STCK_PRPR": 70000.0})
+            await layer.group_send("stock_exec_005930", {
+                "type": "stock_update", "topic": "exec:005930", "code": "005930", "updates": [update],
+            })
+            await asyncio.sleep(0.05)
+            members = len(layer.groups.get("stock_exec_005930", {}))
+            for consumer in consumers:
+                await hub.unsubscribe("exec:005930", consumer)
+            hub.relay._task.cancel()
+            return members, len(layer.groups.get("stock_exec_005930", {}))
+
+        members, after = asyncio.run(run())
+        self.assertEqual((members, after), (1, 0))
+        self.assertTrue(all(consumer.send.await_count == 1 for consumer in consumers))
+
+
+class SubscriptionTopicTest(SimpleTestCase):
+    def test_parse_topics(self):
+        """
+        [Topic] exec:/book: 토픽은 해당 스트림만, 접두어 없는 종목코드는 체결 + 호가로 해석되는지 테스트
+        """
+        self.assertEqual(parse_topics("exec:005930"), ["exec:005930"])
+        self.assertEqual(parse_topics("BOOK:005930"), ["book:005930"])
+        self.assertEqual(parse_topics("hoga:005930"), ["book:005930"])
+        self.assertEqual(parse_topics("005930"), ["exec:005930", "book:005930"])
+        self.assertEqual(parse_topics("trade:005930") + parse_topics("exec:"), [])
+        self.assertEqual(expand_topics(["005930", "exec:005930", "exec:000660"]),
+                         ["exec:005930", "book:005930", "exec:000660"])
+        self.assertEqual(group_by_code(["book:005930", "exec:005930", "exec:000660"]),
+                         {"005930": ("exec", "hoga"), "000660": ("exec",)})
+
+    def test_consumer_subscribes_per_stream(self):
+        """
+        [Topic] 체결 토픽만 구독한 Consumer 는 체결 스트림만 KIS 에 요청하고, 종목코드 구독은 두 스트림 모두 요청하는지 테스트
+        """
+        hub = LocalHub()
+        feed = MagicMock(subscribe_many=AsyncMock(), unsubscribe=AsyncMock())
+        consumer = StockConsumer()
+        consumer.subscribed_topics = set()
+        consumer.stream_seqs = {}
+        consumer.send_snapshots = AsyncMock()
+        consumer.send = AsyncMock()
+
+        async def run():
+            with patch("stock_price.consumers.local_hub", hub), \
+                    patch("stock_price.consumers.realtime_feed", return_value=feed):
+                await consumer.add_subscriptions(["exec:005930"])
+                await consumer.add_subscriptions(["exec:005930"])
+                await consumer.add_subscriptions(["000660"])
+                # 이미 체결을 구독 중이면 종목코드 구독은 호가만 추가
+                await consumer.add_subscriptions(["005930"], ack=True)
+
+        asyncio.run(run())
+        self.assertEqual([call.args[0] for call in feed.subscribe_many.await_args_list],
+                         [[("005930", ("exec",))], [("000660", ("exec", "hoga"))], [("005930", ("hoga",))]])
+        self.assertEqual(json.loads(consumer.send.call_args.kwargs["text_data"]),
+                         {"type": "subscribed", "topics": ["exec:005930", "book:005930"]})
+        self.assertEqual((hub.subscribers("exec:005930"), hub.subscribers("book:005930")), (1, 1))
+        consumer.send_snapshots.assert_any_await({"005930": ("exec",)})
+
+
+class SerializeOnceBroadcastTest(SimpleTestCase):
+    def test_encode_cost_vs_viewers(self):
+        """
+        [Benchmark] 시청자 수별 틱 1건 전달 비용: Consumer 마다 인코딩 vs publisher 1회 인코딩
+        """
+        print("\n=== Broadcast encode cost vs viewers (Redis delivery, event copy per consumer) ===")
+        client = KISWebSocketClient()
+        encoder = DeltaEncoder()
+        encoder.encode("005930", "hoga", _sample_tick(TR_ID_HOGA).to_dict())
+        updates = [encoder.encode("005930", "hoga", _sample_tick(TR_ID_HOGA, ASKP1="70100").to_dict())]
+
+        async def send(text_data=None, bytes_data=None):
+            pass
+
+        def consumers(n):
+            result = []
+            for _ in range(n):
+                consumer = StockConsumer()
+                consumer.stream_seqs = {("005930", "hoga"): 1}
+                consumer.wire_format = wire_format.FORMAT_JSON
+                consumer.send = send  # AsyncMock 은 호출당 비용이 커서 인코딩 비용을 가림
+                result.append(consumer)
+            return result
+
+        async def deliver(viewers, events):
+            start = time.perf_counter()
+            for consumer, event in zip(viewers, events):
+                await consumer.stock_update(event)
+            return time.perf_counter() - start
+
+        results = {}
+        for n in (1, 10, 100, 500):
+            base = {"type": "stock_update", "code": "005930", "updates": updates}
+            # Redis 를 거치면 Consumer 마다 역직렬화된 별도 사본을 받으므로 사본 기준으로 측정
+            per_consumer = asyncio.run(deliver(consumers(n), [dict(base) for _ in range(n)]))
+            start = time.perf_counter()
+            encoded = wire_format.pre_encode("005930", updates, client.preencode_formats)
+            publish_cost = time.perf_counter() - start
+            once = publish_cost + asyncio.run(deliver(consumers(n), [dict(base, encoded=dict(encoded)) for _ in range(n)]))
+            results[n] = (per_consumer, once)
+            print(f"[TEST] viewers {n:>3}: per-consumer encode {per_consumer * 1e3:7.2f}ms | "
+                  f"serialize-once {once * 1e3:7.2f}ms ({per_consumer / once:.1f}x)")
+
+        per_consumer, once = results[500]
+        self.assertLess(once, per_consumer)
+
+    def test_theme_event_is_pre_encoded(self):
+        """
+        [Broadcast] 테마 이벤트는 미리 인코딩된 text 를 그대로 전달하는지 테스트
+        """
+        from stock_theme.services.sync_service import ThemeSyncService
+        event = ThemeSyncService._theme_event({"message": "New theme data available", "new_stocks": ["005930"]})
+        consumer = StockConsumer()
+        consumer.send = AsyncMock()
+        asyncio.run(consumer.theme_update(event))
+        self.assertIs(consumer.send.call_args.kwargs["text_data"], event["text"])
+        self.assertEqual(json.loads(event["text"]), {"type": "theme_update", "data": event["data"]})
+
+
+class LastValueCacheTest(SimpleTestCase):
+    def _consumer(self):
+        consumer = StockConsumer()
+        consumer.stream_seqs = {}
+        consumer.wire_format = wire_format.FORMAT_JSON
+        consumer.send = AsyncMock()
+        return consumer
+
+    def test_new_subscriber_gets_snapshot(self):
+        """
+        [LVC] 구독 직후 마지막 체결/호가 스냅샷을 keyframe 으로 받고, 다음 틱은 delta 로 이어지는지 테스트
+        """
+        cache = LastValueCache(flush_sec=1)
+        encoder = DeltaEncoder()
+        first = encoder.encode("005930", "exec", _sample_tick(TR_ID_EXEC).to_dict())
+        cache.update("005930", "exec", first["seq"], first["data"])
+        consumer = self._consumer()
+
+        async def run():
+            with patch("stock_price.consumers.lvc", cache):
+                await consumer.send_snapshot("005930")
+                second = encoder.encode("005930", "exec", _sample_tick(TR_ID_EXEC, STCK_PRPR="71000").to_dict())
+                await consumer.stock_update({"code": "005930", "updates": [second]})
+
+        asyncio.run(run())
+        snapshot, delta = [json.loads(call.kwargs["text_data"]) for call in consumer.send.call_args_list]
+        self.assertTrue(snapshot["key"])
+        self.assertEqual(snapshot["data"]["MKSC_SHRN_ISCD"], "005930")
+        self.assertNotIn("key", delta)
+        self.assertEqual(delta["data"], {"STCK_PRPR": 71000.0})
+
+    @override_settings(CACHES=LOCMEM_CACHES)
+    def test_snapshot_from_other_process(self):
+        """
+        [LVC] 캐시(다른 프로세스)에서 읽은 스냅샷 이후 첫 틱은 keyframe 으로 보내는지 / flush 후 조회 테스트
+        """
+        publisher, reader = LastValueCache(), LastValueCache()
+        publisher.update("000660", "exec", 7, {"STCK_PRPR": 200000.0, "PRDY_CTRT": 1.5, "ACML_VOL": 10.0})
+        self.assertEqual(publisher.flush(), 1)
+        self.assertEqual(reader.snapshots(["000660", "999999"]), {"000660": publisher.local("000660")})
+
+        consumer = self._consumer()
+        update = {"stream": "exec", "seq": 8, "data": {"STCK_PRPR": 201000.0}, "delta": {"STCK_PRPR": 201000.0}}
+
+        async def run():
+            with patch("stock_price.consumers.lvc", reader):
+                await consumer.send_snapshot("000660")
+                await consumer.stock_update({"code": "000660", "updates": [update]})
+
+        asyncio.run(run())
+        self.assertTrue(all(json.loads(call.kwargs["text_data"]).get("key") for call in consumer.send.call_args_list))
+
+    @override_settings(CACHES=LOCMEM_CACHES)
+    def test_flush_copies_on_loop_retries_and_prunes_released(self):
+        """
+        [LVC] flush 는 루프에서 만든 복사본을 기록하고, 실패하면 다시 기록하며, 해제된 종목은 로컬에서 정리되는지 테스트
+        """
+        publisher = LastValueCache(flush_sec=0.01)
+        publisher.update("005930", "exec", 1, {"STCK_PRPR": 70000.0})
+        values, codes = publisher.collect()
+        publisher.update("005930", "hoga", 1, {"ASKP1": 70100.0})  # 기록 스레드가 pickle 하는 동안 들어온 스트림
+        self.assertEqual(list(values.values()), [{"exec": {"seq": 1, "data": {"STCK_PRPR": 70000.0}}}])
+
+        async def run():
+            with patch("stock_price.services.last_value_cache.cache") as cache:
+                set_many = cache.set_many
+                set_many.side_effect = [ConnectionError("down"), None]
+                publisher.update("000660", "exec", 1, {"STCK_PRPR": 200000.0})
+                await asyncio.sleep(0.05)
+            return set_many.call_args_list
+
+        calls = asyncio.run(run())
+        print(f"[TEST] LVC flush attempts: {len(calls)}")
+        self.assertEqual(len(calls), 2)
+        self.assertEqual(calls[0].args[0], calls[1].args[0])  # 실패한 종목을 새 틱 없이 다시 기록
+
+        # 해제: 로컬 상태는 정리하되, 아직 기록하지 않은 마지막 값은 다음 flush 때 캐시에 남김
+        publisher.update("035720", "exec", 3, {"STCK_PRPR": 50000.0})
+        publisher.forget("035720", "exec")
+        publisher.forget("005930", "hoga")
+        self.assertIsNone(publisher.local("035720"))
+        self.assertEqual(set(publisher.local("005930")), {"exec"})
+        publisher.flush()
+        self.assertEqual(LastValueCache().snapshots(["035720"])["035720"]["exec"]["seq"], 3)
+
+    @override_settings(CACHES=LOCMEM_CACHES)
+    def test_snapshots_sent_in_one_batch_before_paced_subscribe(self):
+        """
+        [LVC] 여러 종목 구독 시 스냅샷은 한 번에 조회해서 KIS 등록 패킷 전송(속도 제한)을 기다리기 전에 보내는지 테스트
+        """
+        cache = LastValueCache()
+        for code in ("005930", "000660"):
+            cache.update(code, "exec", 1, {"STCK_PRPR": 70000.0})
+        consumer = self._consumer()
+        consumer.subscribed_topics = set()
+        consumer.outbox = None
+        sent_before_subscribe = []
+
+        async def subscribe_many(items):
+            sent_before_subscribe.append(consumer.send.await_count)
+
+        feed = MagicMock(subscribe_many=subscribe_many)
+        cache.snapshots_async = AsyncMock(wraps=cache.snapshots_async)
+
+        async def run():
+            with patch("stock_price.consumers.lvc", cache), \
+                    patch("stock_price.consumers.realtime_feed", return_value=feed), \
+                    patch("stock_price.consumers.local_hub", LocalHub()):
+                await consumer.add_subscriptions(["exec:005930", "exec:000660", "exec:999999"])
+
+        asyncio.run(run())
+        cache.snapshots_async.assert_awaited_once_with(["005930", "000660", "999999"])
+        self.assertEqual(sent_before_subscribe, [2])
+
+
+class OrderBookTest(SimpleTestCase):
+    def _hoga(self, tr_id=TR_ID_HOGA, **overrides):
+        levels = {}
+        for i in range(1, 11):
+            levels[f"ASKP{i}"] = str(70000 + i * 100)
+            levels[f"BIDP{i}"] = str(70000 - (i - 1) * 100)
+            levels[f"ASKP_RSQN{i}"] = str(100 * i)
+            levels[f"BIDP_RSQN{i}"] = str(300 * i)
+        levels.update(TOTAL_ASKP_RSQN="5500", TOTAL_BIDP_RSQN="16500", BSOP_HOUR="090001")
+        levels.update(overrides)
+        return _sample_tick(tr_id, **levels)
+
+    def test_book_metrics(self):
+        """
+        [OrderBook] 호가 틱으로 10단계 호가창을 갱신하고 스프레드/중간가/불균형을 계산하는지 테스트
+        """
+        books = OrderBookStore()
+        book = books.apply(self._hoga())
+        self.assertEqual((book.best_ask, book.best_bid), (70100.0, 70000.0))
+        self.assertEqual(book.spread(), 100.0)
+        self.assertEqual(book.mid(), 70050.0)
+        self.assertAlmostEqual(book.imbalance(), 0.5)
+        self.assertAlmostEqual(book.imbalance(depth=1), (300 - 100) / 400)
+
+        # 빈 값이 섞여도 0 으로 처리하고 같은 배열을 제자리 갱신
+        levels = book.levels
+        books.apply(self._hoga(ASKP1="", ASKP2="70150"))
+        self.assertIs(book.levels, levels)
+        self.assertIsNone(book.spread())
+        snapshot = book.snapshot()
+        self.assertEqual(snapshot["asks"][1], [70150.0, 200.0])
+        self.assertEqual((snapshot["total_ask"], snapshot["hour"]), (5500.0, "090001"))
+
+        books.apply(self._hoga(TR_ID_HOGA_ELW))
+        self.assertEqual(books.get("005930").updates, 3)
+
+    def test_client_updates_book_from_frames(self):
+        """
+        [OrderBook] 수신한 호가 프레임이 conflation 여부와 무관하게 호가창에 반영되는지 테스트
+        """
+        client = KISWebSocketClient()
+        client.channel_layer = MagicMock()
+        frame = f"0|{TR_ID_HOGA}|001|" + "^".join(self._hoga().fields)
+        with patch("stock_price.services.kis_ws_client.order_books", OrderBookStore()) as books:
+            asyncio.run(client._handle_message(frame))
+            self.assertEqual(books.get("005930").best_bid, 70000.0)
+
+    @override_settings(CACHES=LOCMEM_CACHES)
+    def test_book_from_other_process(self):
+        """
+        [OrderBook] KIS 세션이 없는 프로세스(ingest 모드 웹 워커)의 호가창 API 가 캐시에 기록된 스냅샷을 반환하는지 테스트
+        """
+        from django.test import RequestFactory
+        from stock_price.views import StockOrderBookView
+        publisher, reader = OrderBookStore(), OrderBookStore()
+        publisher.apply(self._hoga())
+        self.assertEqual(publisher.mirror.flush(), 1)
+
+        view = StockOrderBookView.as_view()
+        with patch("stock_price.views.order_books", reader):
+            response = view(RequestFactory().get("/"), stock_code="005930")
+            self.assertEqual(response.status_code, 200)
+            self.assertEqual(json.loads(response.content)["bids"][0], [70000.0, 300.0])
+
+            # 해제된 종목은 다음 flush 때 캐시에서도 삭제
+            publisher.forget("005930")
+            publisher.mirror.flush()
+            self.assertEqual(view(RequestFactory().get("/"), stock_code="005930").status_code, 404)
+
+
+class CandleAggregatorTest(SimpleTestCase):
+    def _exec(self, hour, price, volume):
+        return _sample_tick(TR_ID_EXEC, STCK_CNTG_HOUR=hour, STCK_PRPR=str(price), CNTG_VOL=str(volume))
+
+    def test_bars_and_close_events(self):
+        """
+        [Candle] 체결 틱으로 1초/1분/5분 OHLCV 를 집계하고, 새 봉 시작 시 직전 봉을 마감하는지 테스트
+        """
+        agg = CandleAggregator()
+        self.assertEqual(agg.add(self._exec("090000", 70000, 10)), [])
+        self.assertEqual(agg.add(self._exec("090000", 70300, 5)), [])
+        closed = agg.add(self._exec("090001", 69900, 7))
+        self.assertEqual(closed, [("1s", {"t": "09:00:00", "o": 70000.0, "h": 70300.0, "l": 70000.0, "c": 70300.0, "v": 15.0})])
+
+        agg.add(self._exec("090059", 70100, 1))
+        closed = dict(agg.add(self._exec("090100", 70200, 2)))
+        self.assertEqual(set(closed), {"1s", "1m"})
+        self.assertEqual(closed["1m"], {"t": "09:00:00", "o": 70000.0, "h": 70300.0, "l": 69900.0, "c": 70100.0, "v": 23.0})
+
+        bars = agg.series("005930", "1m").bars()
+        self.assertEqual([bar["t"] for bar in bars], ["09:00:00", "09:01:00"])
+        self.assertEqual(agg.series("005930", "5m").bars()[-1]["v"], 25.0)
+
+        # 잘못된 시각 필드는 무시
+        self.assertEqual(agg.add(self._exec("", 70000, 1)), [])
+
+    def test_ring_buffer_wraps_and_resets_on_new_day(self):
+        """
+        [Candle] 링 버퍼가 가득 차면 가장 오래된 봉을 덮어쓰고, 거래일이 바뀌면 초기화되는지 테스트
+        """
+        agg = CandleAggregator(intervals={"1s": (1, 5)})
+        for second in range(8):
+            agg.add(self._exec(f"1529{second:02d}", 70000 + second, 1))
+        series = agg.series("005930", "1s")
+        self.assertEqual([bar["t"] for bar in series.bars()], [f"15:29:{s:02d}" for s in range(3, 8)])
+        self.assertEqual([bar["c"] for bar in series.bars(limit=2)], [70006.0, 70007.0])
+
+        agg.add(self._exec("090000", 71000, 1))
+        self.assertEqual(series.bars(), [{"t": "09:00:00", "o": 71000.0, "h": 71000.0, "l": 71000.0, "c": 71000.0, "v": 1.0}])
+
+    @override_settings(CACHES=LOCMEM_CACHES)
+    def test_bars_survive_release_and_reach_other_process(self):
+        """
+        [Candle] KIS 등록 해제(linger 만료) 후에도 봉이 유지되고, 다른 프로세스의 봉 API 가 캐시에 기록된 봉을 반환하는지 테스트
+        """
+        from django.test import RequestFactory
+        from stock_price.views import StockCandleView
+        publisher, reader = CandleAggregator(max_codes=2), CandleAggregator()
+        client = KISWebSocketClient()
+        with patch("stock_price.services.kis_ws_client.candles", publisher):
+            publisher.add(self._exec("090000", 70000, 10))
+            client._release_slots([(TR_ID_EXEC, "005930")], "linger")
+        self.assertEqual(publisher.series("005930", "1m").bars()[-1]["v"], 10.0)
+        self.assertEqual(publisher.mirror.flush(), 4)  # 종목 키 1개 + 봉 단위별 청크 1개
+
+        # 150개 1초봉 -> 링 전체가 아니라 바뀐 청크만 기록, 다음 flush 는 진행 중인 봉의 청크만
+        for second in range(1, 151):
+            publisher.add(self._exec(f"09{second // 60:02d}{second % 60:02d}", 70000 + second, 1))
+        values, _ = publisher.mirror.collect()
+        chunks = {key: rows for key, rows in values.items() if key.startswith("candles:005930:1s:")}
+        self.assertEqual(sorted(chunks), ["candles:005930:1s:0:0", "candles:005930:1s:0:1", "candles:005930:1s:0:2"])
+        publisher.mirror.write(values, [])
+        publisher.add(self._exec("090230", 71000, 1))
+        values, _ = publisher.mirror.collect()
+        first, rows = values["candles:005930:1s:0:2"]
+        self.assertEqual((first, len(rows), rows[-1][4]), (120, 31, 71000.0))
+        self.assertEqual(len(values), 4)
+        self.assertEqual(values["candles:005930"]["1s"], (0, 151, 151))
+        # 기록 실패 시 전체를 다시 기록
+        publisher.mirror._retry({"005930"}, set())
+        self.assertIn("candles:005930:1s:0:0", publisher.mirror.collect()[0])
+        publisher.mirror.write(values, [])
+
+        with patch("stock_price.views.candles", reader):
+            response = StockCandleView.as_view()(RequestFactory().get("/", {"interval": "1s"}), stock_code="005930")
+            limited = StockCandleView.as_view()(RequestFactory().get("/", {"interval": "1s", "limit": "2"}), stock_code="005930")
+        self.assertEqual(response.status_code, 200)
+        bars = json.loads(response.content)["bars"]
+        self.assertEqual(len(bars), 151)
+        self.assertEqual(bars[0]["o"], 70000.0)
+        self.assertEqual(bars[-1]["t"], "09:02:30")
+        self.assertEqual([bar["c"] for bar in json.loads(limited.content)["bars"]], [70149.0, 71000.0])
+
+        # 최대 종목 수를 넘으면 가장 오래 체결이 없던 종목부터 정리
+        for code in ("000660", "005930", "035720"):
+            publisher.add(_sample_tick(TR_ID_EXEC, MKSC_SHRN_ISCD=code, STCK_CNTG_HOUR="090001"))
+        self.assertIsNone(publisher.series("000660", "1m"))
+        self.assertIsNotNone(publisher.series("005930", "1m"))
+
+    def test_client_pushes_bar_close_to_opted_in_consumers(self):
+        """
+        [Candle] 봉 마감 이벤트가 LocalHub 로 전달되고, 해당 봉 단위를 요청한 Consumer 에게만 전송되는지 테스트
+        """
+        hub = LocalHub()
+        client = KISWebSocketClient()
+        client.channel_layer = MagicMock(group_send=AsyncMock())
+        watchers = []
+        for intervals in ({"1s"}, set()):
+            consumer = StockConsumer()
+            consumer.stream_seqs = {}
+            consumer.wire_format = wire_format.FORMAT_JSON
+            consumer.candle_intervals = intervals
+            consumer.send = AsyncMock()
+            watchers.append(consumer)
+
+        def frame(hour):
+            return f"0|{TR_ID_EXEC}|001|" + "^".join(self._exec(hour, 70000, 1).fields)
+
+        async def run():
+            for consumer in watchers:
+                await hub.subscribe("exec:005930", consumer)
+            with patch("stock_price.services.kis_ws_client.local_hub", hub), \
+                    patch("stock_price.services.kis_ws_client.candles", CandleAggregator()):
+                await client._handle_message(frame("090000"))
+                await client._handle_message(frame("090001"))
+
+        asyncio.run(run())
+        candle_messages = [
+            json.loads(call.kwargs["text_data"]) for call in watchers[0].send.call_args_list
+            if call.kwargs.get("text_data", "").startswith('{"type": "candle"')
+        ]
+        print(f"[TEST] Bar close messages: {candle_messages}")
+        self.assertEqual([(m["interval"], m["bar"]["t"]) for m in candle_messages], [("1s", "09:00:00")])
+        self.assertTrue(all("candle" not in (call.kwargs.get("text_data") or "") for call in watchers[1].send.call_args_list))
+
+
+class TickJournalTest(SimpleTestCase):
+    # 2025-01-02 09:00:00 (로컬 시각) 기준 가짜 시계
+    START_NS = int(time.mktime((2025, 1, 2, 9, 0, 0, 0, 0, -1)) * 1e9)
+
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(self.tmp.cleanup)
+        self.now = self.START_NS
+
+    def _journal(self, name="kis-0"):
+        return TickJournal(self.tmp.name, name=name, clock=lambda: self.now)
+
+    def test_varint_roundtrip(self):
+        """
+        [Journal] varint 인코딩/디코딩 왕복 테스트
+        """
+        buf = bytearray()
+        values = [0, 1, 127, 128, 300, 2 ** 35, 1_735_776_000_000_000]
+        for value in values:
+            put_varint(buf, value)
+        pos, decoded = 0, []
+        while pos < len(buf):
+            value, pos = get_varint(buf, pos)
+            decoded.append(value)
+        self.assertEqual(decoded, values)
+
+    def test_record_and_replay(self):
+        """
+        [Journal] 프레임을 수신 시각과 함께 기록하고 mmap 리더로 순서대로 재생하는지 테스트 (재시작 후 이어쓰기, 일자 분할 포함)
+        """
+        frames = [_sample_frame(DECODERS[TR_ID_EXEC]), _sample_frame(DECODERS[TR_ID_HOGA]), '{"header": {"tr_id": "PINGPONG"}}']
+        journal = self._journal()
+        for i, frame in enumerate(frames):
+            self.now = self.START_NS + i * 1_500_000  # 1.5ms 간격
+            journal.append(frame)
+        journal.flush()
+
+        # 프로세스 재시작: 같은 일자 파일에 이어 씀 + 시계가 뒤로 간 프레임은 직전 시각 유지
+        journal = self._journal()
+        self.now = self.START_NS + 10_000_000
+        journal.append(frames[0])
+        self.now -= 1_000
+        journal.append(frames[1])
+        # 자정 넘어가면 다음 일자 세그먼트
+        self.now = self.START_NS + 15 * 3600 * 10 ** 9
+        journal.append(frames[2])
+        journal.flush()
+
+        segments = journal_segments(self.tmp.name)
+        self.assertEqual([os.path.basename(path) for path in segments], ["20250102-kis-0.kisj", "20250103-kis-0.kisj"])
+        records = list(TickJournalReader(segments[0]))
+        base = self.START_NS // 1000
+        self.assertEqual([ts - base for ts, _ in records], [0, 1500, 3000, 10000, 10000])
+        self.assertEqual([frame for _, frame in records], frames + frames[:2])
+        raw = sum(len(frame) for frame in frames + frames[:2])
+        print(f"[TEST] Journal {os.path.getsize(segments[0])} bytes for {raw} bytes of frames")
+
+        # 기록 중 잘린 마지막 레코드는 건너뜀
+        with open(segments[0], "ab") as f:
+            f.write(b"\x05\x40abc")
+        self.assertEqual(len(list(TickJournalReader(segments[0]))), 5)
+
+    def test_merge_sessions(self):
+        """
+        [Journal] 세션별 세그먼트를 수신 시각 순으로 병합하는지 테스트
+        """
+        journals = [self._journal("kis-0"), self._journal("kis-1")]
+        for i in range(6):
+            self.now = self.START_NS + i * 1000
+            journals[i % 2].append(f"frame-{i}")
+        for journal in journals:
+            journal.flush()
+        merged = [frame for _, frame in read_journal(journal_segments(self.tmp.name, day="20250102"))]
+        self.assertEqual(merged, [f"frame-{i}" for i in range(6)])
+
+    def test_empty_frame_does_not_reset_timestamps(self):
+        """
+        [Journal] 빈 프레임은 기록하지 않아서 (길이 0 = 기준점 재설정 레코드) 이후 프레임 시각이 어긋나지 않는지 테스트
+        """
+        journal = self._journal()
+        for i, frame in enumerate(["a", "", b"", "b"]):
+            self.now = self.START_NS + i * 2_000_000
+            journal.append(frame)
+        journal.flush()
+        records = list(TickJournalReader(journal_segments(self.tmp.name)[0]))
+        base = self.START_NS // 1000
+        self.assertEqual([(ts - base, frame) for ts, frame in records], [(0, "a"), (6000, "b")])
+        self.assertEqual(journal.frames, 2)
+
+    def test_append_cost(self):
+        """
+        [Journal] 수신 루프에서의 기록 비용 (버퍼 추가만, 디코딩/전송 대비 무시할 수준)
+        """
+        frame = _sample_frame(DECODERS[TR_ID_EXEC])
+        journal = TickJournal(self.tmp.name)
+        append, handle = _best_of(
+            lambda: journal.append(frame), lambda: decode_frame(frame), number=2000, repeat=3, timer=time.process_time,
+        )
+        print(f"[TEST] Journal append {append / 2000 * 1e6:.2f}us/frame | decode {handle / 2000 * 1e6:.2f}us/frame")
+        self.assertLess(append, handle)
+        self.assertEqual(journal.flush(), 1)
+
+
+class KISReplayServerTest(SimpleTestCase):
+    def test_synthetic_frames_decode(self):
+        """
+        [Replay] 합성 체결/호가 프레임이 실제 KIS 필드 배치 그대로 디코딩되는지 테스트
+        """
+        feed = SyntheticFeed(seed=1)
+        for tr_id in (TR_ID_EXEC, TR_ID_HOGA, TR_ID_HOGA_ELW):
+            frame = feed.frame(tr_id, "005930")
+            self.assertEqual(frame_key(frame), (tr_id, "005930"))
+            decoder, records = decode_frame(frame)
+            self.assertEqual(len(records[0]), len(decoder.names))
+            self.assertTrue(RESPONSE_SERIALIZERS[tr_id](data=decoder.to_dict(records[0])).is_valid())
+        self.assertEqual((parse_speed("10x"), parse_speed("1"), parse_speed("max")), (10.0, 1.0, None))
+        self.assertIsNone(frame_key('{"header": {"tr_id": "PINGPONG"}}'))
+
+    def test_registration_protocol(self):
+        """
+        [Replay] 등록/해제/중복/한도 초과 응답이 KIS 형식으로 오는지 테스트
+        """
+        server = KISReplayServer(max_registrations=1)
+        conn = MagicMock(registrations=set())
+
+        def request(code, tr_type="1", key="approval"):
+            payload = StockRequestSerializer.build_payload(key, TR_ID_EXEC, code, tr_type=tr_type)
+            return json.loads(server.register(conn, payload))["body"]
+
+        self.assertEqual(request("005930")["msg1"], "SUBSCRIBE SUCCESS")
+        self.assertEqual(request("005930")["msg1"], "ALREADY IN SUBSCRIBE")
+        self.assertEqual((request("000660")["rt_cd"], request("000660")["msg1"]), ("1", "MAX SUBSCRIBE OVER"))
+        self.assertEqual(request("005930", tr_type="2")["msg1"], "UNSUBSCRIBE SUCCESS")
+        self.assertEqual(request("000660", key="")["rt_cd"], "1")
+        self.assertEqual(conn.registrations, set())
+
+    def _run_client_against(self, server, codes, until, streams=("exec", "hoga")):
+        """로컬 리플레이 서버에 실제 KISWebSocketClient 를 붙여 LocalHub 로 받은 틱을 수집"""
+        received = []
+
+        class Collector:
+            async def stock_update(self, event):
+                received.extend((event["code"], update["stream"]) for update in event["updates"])
+
+            async def candle_close(self, event):
+                pass
+
+        async def run():
+            async with websockets.serve(server.handler, "127.0.0.1", 0) as ws_server:
+                port = ws_server.sockets[0].getsockname()[1]
+                with self.settings(KIS_WS_BASE_URL=f"ws://127.0.0.1:{port}", KIS_WS_APPROVAL_KEY="replay",
+                                   KIS_REALTIME_CONFLATION_MS=0):
+                    client = KISWebSocketClient()
+                hub = LocalHub()
+                collector = Collector()
+                with patch("stock_price.services.kis_ws_client.local_hub", hub):
+                    for code in codes:
+                        for stream in streams:
+                            await hub.subscribe(topic(stream, code), collector)
+                        await client.subscribe(code, streams)
+                    loop = asyncio.get_running_loop()
+                    deadline = loop.time() + 5
+                    while not until(received) and loop.time() < deadline:
+                        await asyncio.sleep(0.02)
+                    # max 배속 재생을 멈추고 쌓인 프레임을 읽은 뒤 종료 (close 핸드셰이크가 밀리지 않도록)
+                    for conn in server.connections:
+                        conn.registrations.clear()
+                    await asyncio.sleep(0.1)
+                    client.running = False
+                    await client.ws.close()
+                    client.task.cancel()
+                    for task in client._recv_tasks + [client._linger_task]:
+                        task.cancel()
+            return client
+
+        client = asyncio.run(run())
+        return client, received
+
+    def test_client_streams_synthetic_feed(self):
+        """
+        [Replay] KIS_WS_BASE_URL 로 지정한 로컬 서버에서 등록한 종목의 체결/호가를 받는지 테스트 (max 배속)
+        """
+        server = KISReplayServer(speed=None, seed=7)
+        client, received = self._run_client_against(server, ["005930", "000660"], lambda r: len(r) >= 200)
+        print(f"[TEST] Replay delivered {len(received)} updates, server sent {server.frames_sent} frames")
+        self.assertGreaterEqual(len(received), 200)
+        self.assertEqual({code for code, _ in received}, {"005930", "000660"})
+        self.assertEqual({stream for _, stream in received}, {"exec", "hoga"})
+        self.assertEqual(client.ws_url.split(":")[1], "//127.0.0.1")
+
+    def test_exec_only_subscription_registers_one_tr(self):
+        """
+        [Topic] 체결 토픽만 구독하면 KIS 에는 체결 TR 만 등록되고 호가 프레임은 오지 않는지 테스트 (히트맵)
+        """
+        server = KISReplayServer(speed=None, seed=11)
+        registered = []
+        register = server.register
+
+        def record(conn, message):
+            registered.append(message["body"]["input"]["tr_id"])
+            return register(conn, message)
+
+        server.register = record
+        client, received = self._run_client_against(server, ["005930", "000660"], lambda r: len(r) >= 100, streams=("exec",))
+        print(f"[TEST] Exec-only: registered {registered}, slots {client.slot_usage()['by_tr_id']}")
+        self.assertEqual(registered, [TR_ID_EXEC, TR_ID_EXEC])
+        self.assertEqual(client.slot_usage()["by_tr_id"], {TR_ID_EXEC: 2})
+        self.assertEqual({stream for _, stream in received}, {"exec"})
+
+    def test_replays_journal(self):
+        """
+        [Replay] 저널을 등록된 종목만 골라 기록 순서대로 재생하는지 테스트
+        """
+        tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp.cleanup)
+        journal = TickJournal(tmp.name)
+        feed = SyntheticFeed(seed=3)
+        for _ in range(20):
+            for code in ("005930", "035720"):
+                journal.append(feed.frame(TR_ID_EXEC, code))
+        journal.append('{"header": {"tr_id": "PINGPONG"}}')
+        journal.flush()
+
+        server = KISReplayServer(journal_paths=journal_segments(tmp.name), speed=None)
+        _, received = self._run_client_against(server, ["005930"], lambda r: len(r) >= 20)
+        self.assertGreaterEqual(len(received), 20)
+        self.assertEqual({code for code, _ in received}, {"005930"})
+
+    def test_journal_scan_yields_without_sends(self):
+        """
+        [Replay] max 배속에서 등록되지 않은 종목만 이어지는 구간을 읽는 동안에도 이벤트 루프를 양보하는지 테스트
+        """
+        frame = SyntheticFeed(seed=3).frame(TR_ID_EXEC, "035720")
+        server = KISReplayServer(journal_paths=["unused"], speed=None)
+        conn = MagicMock(registrations={(TR_ID_EXEC, "005930")})
+        turns = []
+
+        def journal(paths):
+            for _ in range(1024):
+                yield 0, frame
+            raise RuntimeError(len(turns))
+
+        async def run():
+            async def other():
+                while True:
+                    turns.append(1)
+                    await asyncio.sleep(0)
+
+            task = asyncio.create_task(other())
+            await asyncio.sleep(0)
+            try:
+                with patch("stock_price.services.kis_replay.read_journal", journal):
+                    await server._play_journal(conn)
+            finally:
+                task.cancel()
+
+        with self.assertRaises(RuntimeError) as raised:
+            asyncio.run(run())
+        print(f"[TEST] Other task turns during 1024-record scan: {raised.exception.args[0]}")
+        self.assertGreaterEqual(raised.exception.args[0], 4)
+
+
+class LatencyHistogramTest(SimpleTestCase):
+    def test_percentiles(self):
+        """
+        [Latency] 로그 버킷 히스토그램의 p50/p99/max 가 실제 분포와 버킷 오차(약 9%) 이내인지 테스트
+        """
+        histogram = LatencyHistogram()
+        for ms in range(1, 1001):  # 1ms ~ 1000ms 균등
+            histogram.record(ms / 1000)
+        summary = histogram.summary()
+        print(f"[TEST] Histogram summary: {summary}")
+        self.assertEqual(summary["count"], 1000)
+        self.assertAlmostEqual(summary["p50"], 500, delta=500 * 0.1)
+        self.assertAlmostEqual(summary["p99"], 990, delta=990 * 0.1)
+        self.assertEqual(summary["max"], 1000)
+        self.assertIsNone(LatencyHistogram().percentile(50))
+
+        histogram.record(0)
+        histogram.record(3600 * 24)  # 범위 밖은 마지막 버킷
+        self.assertEqual(histogram.summary()["max"], 3600 * 24 * 1000)
+
+    def test_exchange_lag(self):
+        """
+        [Latency] 거래소 시각(HHMMSS, KST) 대비 수신 지연 계산 및 비정상 값 제외 테스트
+        """
+        tracker = LatencyTracker()
+        received_at = 20000 * 86400 + 2.5  # UTC 자정 = KST 09:00 -> 09:00:02.5
+        tracker.record_exchange_lag("090001", received_at)
+        tracker.record_exchange_lag("090005", received_at)   # 미래 시각 -> 제외
+        tracker.record_exchange_lag("", received_at)
+        stats = tracker.snapshot()[STAGE_EXCHANGE]
+        self.assertEqual(stats["count"], 1)
+        self.assertAlmostEqual(stats["max"], 1500, delta=1)
+
+    def test_pipeline_stages(self):
+        """
+        [Latency] 수신 -> 디코딩 -> 전송 -> Consumer send 구간이 수신 시각 기준으로 기록되는지 테스트 (conflation 포함)
+        """
+        tracker = LatencyTracker()
+        hub = LocalHub()
+        consumer = StockConsumer()
+        consumer.stream_seqs = {}
+        consumer.wire_format = wire_format.FORMAT_JSON
+        consumer.send = AsyncMock()
+        client = KISWebSocketClient()
+        client.channel_layer = MagicMock(group_send=AsyncMock())
+        client.conflator = TickConflator(10)
+
+        async def run():
+            await hub.subscribe("exec:005930", consumer)
+            await hub.subscribe("book:005930", consumer)
+            with patch("stock_price.services.kis_ws_client.local_hub", hub), \
+                    patch("stock_price.services.kis_ws_client.latency", tracker), \
+                    patch("stock_price.consumers.latency", tracker):
+                received_at = time.time() - 0.05
+                await client._handle_message(_sample_frame(DECODERS[TR_ID_EXEC], count=2), received_at)
+                await client._handle_message(_sample_frame(DECODERS[TR_ID_HOGA]), received_at + 0.01)
+                for stock_code, data in client.conflator.drain():
+                    await client._publish(stock_code, data, client._conflated_since.pop(stock_code, None))
+
+        asyncio.run(run())
+        stats = tracker.snapshot()
+        print(f"[TEST] Stage latency: {stats}")
+        self.assertEqual(stats[STAGE_DECODE]["count"], 2)
+        # publish 는 flush 1회, send 는 체결 / 호가 토픽 이벤트별
+        self.assertEqual((stats[STAGE_PUBLISH]["count"], stats[STAGE_SEND]["count"]), (1, 2))
+        # conflation 된 배치는 가장 오래된 프레임 기준
+        self.assertGreaterEqual(stats[STAGE_SEND]["max"], 50)
+        self.assertEqual(client._conflated_since, {})
+
+
+class MetricsTest(SimpleTestCase):
+    def test_render_exposition_format(self):
+        """
+        [Metrics] 카운터/게이지/서머리가 Prometheus 텍스트 포맷으로 출력되는지 테스트
+        """
+        registry = metrics.MetricsRegistry()
+        frames = registry.counter("frames_total", "Frames", ("tr_id",))
+        gauge = registry.gauge("connected", "Connected")
+        summary = registry.summary("send_seconds", "Send latency", ("group",))
+        frames.inc(TR_ID_EXEC)
+        frames.inc(TR_ID_EXEC, amount=2)
+        gauge.inc()
+        gauge.inc()
+        gauge.dec()
+        summary.observe(0.002, "stock")
+        registry.callback("broken", "Raises", "gauge", (), lambda: 1 / 0)
+
+        text = registry.render()
+        print(f"[TEST] Exposition:\n{text}")
+        self.assertIn("# TYPE frames_total counter", text)
+        self.assertIn(f'frames_total{{tr_id="{TR_ID_EXEC}"}} 3', text)
+        self.assertIn("connected 1", text)
+        self.assertIn('send_seconds{group="stock",quantile="0.99"}', text)
+        self.assertIn('send_seconds_count{group="stock"} 1', text)
+        self.assertNotIn("broken", text)
+
+    def test_realtime_path_metrics(self):
+        """
+        [Metrics] 수신 프레임/디코딩 실패/팬아웃/group_send 지연이 핫패스에서 집계되는지 테스트
+        """
+        hub = LocalHub()
+        consumer = StockConsumer()
+        consumer.stream_seqs = {}
+        consumer.wire_format = wire_format.FORMAT_JSON
+        consumer.send = AsyncMock()
+        client = KISWebSocketClient()
+        client.channel_layer = MagicMock(group_send=AsyncMock())
+        client.conflator = None
+        client.publish_remote = True
+
+        def value(counter, *labels):
+            return counter.values.get(labels, 0)
+
+        before = (value(metrics.kis_frames, TR_ID_EXEC), value(metrics.kis_records, TR_ID_EXEC),
+                  value(metrics.kis_decode_failures), value(metrics.fanout_deliveries, "stock"),
+                  value(metrics.group_sends, "stock"))
+
+        async def run():
+            await hub.subscribe("exec:005930", consumer)
+            with patch("stock_price.services.kis_ws_client.local_hub", hub):
+                await client._handle_message(_sample_frame(DECODERS[TR_ID_EXEC], count=3))
+                await client._handle_message("0|UNKNOWN|001|005930^1")
+
+        asyncio.run(run())
+        after = (value(metrics.kis_frames, TR_ID_EXEC), value(metrics.kis_records, TR_ID_EXEC),
+                 value(metrics.kis_decode_failures), value(metrics.fanout_deliveries, "stock"),
+                 value(metrics.group_sends, "stock"))
+        self.assertEqual([a - b for a, b in zip(after, before)], [1, 3, 1, 1, 1])
+
+        text = metrics.registry.render()
+        for name in ("kis_registrations", "kis_ws_connected", "realtime_consumers_connected",
+                     "channel_layer_group_send_seconds", "realtime_latency_seconds"):
+            self.assertIn(f"# TYPE {name}", text)
+
+    def test_rest_client_metrics(self):
+        """
+        [Metrics] KIS REST 호출 수/지연이 endpoint, 상태(HTTP 코드 / timeout / error)별로 기록되는지 테스트
+        """
+        import httpx
+        endpoint = "/uapi/domestic-stock/v1/quotations/inquire-price"
+        url = f"https://openapi.koreainvestment.com:9443{endpoint}"
+
+        def handler(request):
+            code = request.url.params.get("fid_input_iscd")
+            if code == "timeout":
+                raise httpx.ReadTimeout("timed out", request=request)
+            if code == "error":
+                raise httpx.ConnectError("refused", request=request)
+            return httpx.Response(200, json={"rt_cd": "0", "output": {}})
+
+        transport = httpx.MockTransport(handler)
+        statuses = ("200", "timeout", "error")
+        before = {status: metrics.rest_requests.values.get((endpoint, status), 0) for status in statuses}
+
+        with metrics.RestClient(transport=transport) as http:
+            http.get(url, params={"fid_input_iscd": "005930"})
+            with self.assertRaises(httpx.ReadTimeout):
+                http.get(url, params={"fid_input_iscd": "timeout"})
+
+        async def run():
+            async with metrics.AsyncRestClient(transport=transport) as http:
+                await http.get(url)
+                with self.assertRaises(httpx.ConnectError):
+                    await http.get(url, params={"fid_input_iscd": "error"})
+
+        asyncio.run(run())
+        after = {status: metrics.rest_requests.values[(endpoint, status)] for status in statuses}
+        self.assertEqual({status: after[status] - before[status] for status in statuses}, {"200": 2, "timeout": 1, "error": 1})
+        self.assertGreaterEqual(metrics.rest_seconds.histograms[(endpoint, "200")].count, 2)
+        self.assertGreaterEqual(metrics.rest_seconds.histograms[(endpoint, "timeout")].count, 1)
+
+    def test_counter_cost(self):
+        """
+        [Metrics] 카운터 증가 비용 (핫패스 상시 유지 가능 수준)
+        """
+        counter = metrics.Counter("bench_total", "Bench", ("tr_id",))
+        cost = min(timeit.repeat(lambda: counter.inc(TR_ID_EXEC), number=10000, repeat=5, timer=time.process_time)) / 10000
+        print(f"[TEST] Counter.inc {cost * 1e9:.0f}ns")
+        self.assertLess(cost, 5e-6)
+
+    def test_metrics_endpoint(self):
+        """
+        [Metrics] /metrics 가 Prometheus 텍스트 포맷으로 응답하는지 테스트
+        """
+        response = self.client.get("/metrics")
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response["Content-Type"].startswith("text/plain; version=0.0.4"))
+        self.assertIn(b"# TYPE kis_frames_total counter", response.content)
+
+    def test_metrics_endpoint_restricted(self):
+        """
+        [Metrics] METRICS_ALLOWED_IPS 밖의 주소는 403, staff 사용자는 허용되는지 테스트
+        """
+        self.assertEqual(self.client.get("/metrics", REMOTE_ADDR="203.0.113.5").status_code, 403)
+        with override_settings(METRICS_ALLOWED_IPS=["10.0.0.0/8"]):
+            self.assertEqual(self.client.get("/metrics", REMOTE_ADDR="10.1.2.3").status_code, 200)
+            self.assertEqual(self.client.get("/metrics").status_code, 403)
+
+        from django.test import RequestFactory
+        from stock_price.views import MetricsView
+        request = RequestFactory().get("/metrics", REMOTE_ADDR="203.0.113.5")
+        request.user = MagicMock(is_staff=True)
+        self.assertEqual(MetricsView.as_view()(request).status_code, 200)
+
+
+class OutboundBufferTest(SimpleTestCase):
+    def _event(self, stream, seq, price):
+        update = {"stream": stream, "seq": seq, "data": {"STCK_PRPR": price}, "delta": {"STCK_PRPR": price}}
+        return {"type": "stock_update", "code": "005930", "updates": [update], "encoded": {}}
+
+    def test_coalescing_and_bound(self):
+        """
+        [Outbound] 밀린 업데이트는 종목/스트림별 최신 값만 남기고, 대기 항목 수를 넘으면 가장 오래된 것을 버리는지 테스트
+        """
+        outbox = OutboundBuffer(max_entries=2)
+        first = self._event("exec", 1, 70000.0)
+        latest = self._event("exec", 2, 70100.0)
+        outbox.put("005930", first, merge_stock_events)
+        outbox.put("005930", latest, merge_stock_events)
+        # 같은 스트림 -> delta 를 누적한 업데이트 1건 (합친 구간의 첫 seq 유지)
+        self.assertEqual(outbox.get("005930")["updates"], [
+            {"stream": "exec", "seq": 2, "first_seq": 1, "data": {"STCK_PRPR": 70100.0}, "delta": {"STCK_PRPR": 70100.0}},
+        ])
+
+        outbox.put("005930", self._event("hoga", 5, 70050.0), merge_stock_events)
+        merged = outbox.get("005930")
+        self.assertEqual([(u["stream"], u["seq"]) for u in merged["updates"]], [("exec", 2), ("hoga", 5)])
+        self.assertNotIn("encoded", merged)
+
+        outbox.put("000660", self._event("exec", 1, 1.0), merge_stock_events)
+        outbox.put(("candle", "005930", "1m"), "{}")
+        self.assertEqual(len(outbox), 2)
+        self.assertNotIn("005930", outbox)
+        self.assertEqual((outbox.stats["coalesced"], outbox.stats["dropped"]), (2, 1))
+
+        batch = asyncio.run(outbox.take())
+        self.assertEqual([key for key, _ in batch], ["000660", ("candle", "005930", "1m")])
+        self.assertEqual(len(outbox), 0)
+
+    def test_slow_client_policy(self):
+        """
+        [Outbound] 연속으로 느린 배치 전송이면 전송 간격을 낮추고, 회복되면 복구, 계속 막히면 연결 종료하는지 테스트
+        """
+        outbox = OutboundBuffer(slow_send_sec=0.1, slow_strikes=3, downgrade_interval_sec=1.0,
+                                disconnect_send_sec=2.0, restore_after=2)
+        before = metrics.slow_consumer_actions.values.get((ACTION_DOWNGRADE,), 0)
+        self.assertEqual([outbox.assess(0.2), outbox.assess(0.01), outbox.assess(0.2), outbox.assess(0.2)], [None] * 4)
+        self.assertEqual(outbox.assess(0.3), ACTION_DOWNGRADE)
+        self.assertEqual(outbox.interval, 1.0)
+        self.assertEqual([outbox.assess(0.01), outbox.assess(0.01)], [None, ACTION_RESTORE])
+        self.assertFalse(outbox.downgraded)
+        for _ in range(3):
+            outbox.assess(0.5)
+        self.assertTrue(outbox.downgraded)
+        self.assertIsNone(outbox.assess(1.0))
+        self.assertEqual(outbox.assess(2.5), ACTION_DISCONNECT)
+        self.assertEqual(metrics.slow_consumer_actions.values[(ACTION_DOWNGRADE,)] - before, 2)
+
+    def test_slow_consumer_does_not_block_publisher(self):
+        """
+        [Outbound] 느린 브라우저가 있어도 LocalHub 전달은 막히지 않고, 그 연결에는 밀린 delta 를 합친 최신 상태만 가는지 테스트
+        """
+        hub = LocalHub()
+        client = KISWebSocketClient()
+        client.channel_layer = MagicMock(group_send=AsyncMock())
+        sent = {"fast": [], "slow": []}
+        consumers = {}
+        for name, delay in (("fast", 0), ("slow", 0.03)):
+            consumer = StockConsumer()
+            consumer.stream_seqs = {}
+            consumer.subscribed_topics = {"exec:005930"}
+            consumer.wire_format = wire_format.FORMAT_JSON
+            consumer.outbox = OutboundBuffer(slow_send_sec=0.02, slow_strikes=2, downgrade_interval_sec=0.05,
+                                             disconnect_send_sec=5.0)
+            consumer.close = AsyncMock()
+
+            async def send(text_data=None, bytes_data=None, name=name, delay=delay):
+                if delay:
+                    await asyncio.sleep(delay)
+                sent[name].append(json.loads(text_data))
+            consumer.send = send
+            consumers[name] = consumer
+
+        async def run():
+            writers = []
+            for consumer in consumers.values():
+                await hub.subscribe("exec:005930", consumer)
+                writers.append(asyncio.create_task(consumer._write_loop()))
+            started = time.perf_counter()
+            with patch("stock_price.services.kis_ws_client.local_hub", hub):
+                for i in range(30):
+                    await client._publish("005930", [("exec", _sample_tick(TR_ID_EXEC, STCK_PRPR=str(70000 + i)).to_dict())])
+                    await asyncio.sleep(0.002)
+            publish_time = time.perf_counter() - started
+            await asyncio.sleep(0.2)
+            for writer in writers:
+                writer.cancel()
+            return publish_time
+
+        publish_time = asyncio.run(run())
+        slow = consumers["slow"]
+        print(f"[TEST] Publish 30 ticks {publish_time * 1000:.0f}ms | fast got {len(sent['fast'])}, "
+              f"slow got {len(sent['slow'])} (stats {slow.outbox.stats})")
+        self.assertLess(publish_time, 30 * 0.03)
+        self.assertEqual(len(sent["fast"]), 30)
+        self.assertLess(len(sent["slow"]), 30)
+        # 마지막 상태는 반드시 전달되고, 건너뛴 구간은 keyframe 대신 합친 delta 가 직전 seq(base) 에 이어짐
+        self.assertEqual(sent["slow"][-1]["data"]["STCK_PRPR"], 70029.0)
+        for previous, message in zip(sent["slow"], sent["slow"][1:]):
+            self.assertNotIn("key", message)
+            self.assertEqual(message.get("base", message["seq"] - 1), previous["seq"])
+        self.assertGreater(slow.outbox.stats["coalesced"], 0)
+        self.assertTrue(slow.outbox.downgraded)
+        slow.close.assert_not_called()
+
+
+class WatchlistModeTest(SimpleTestCase):
+    def test_join_payloads(self):
+        """
+        [Watchlist] 종목별 인코딩 결과를 다시 인코딩하지 않고 프레임 1개로 합쳤을 때 원래 메시지 순서대로 복원되는지 테스트
+        """
+        messages = [
+            {"type": "stock_update", "code": code, "stream": "exec", "seq": seq, "key": True,
+             "data": _sample_tick(TR_ID_EXEC, MKSC_SHRN_ISCD=code).to_dict()}
+            for seq, code in enumerate(["005930", "000660", "035420"], 1)
+        ]
+        groups = [messages[:1], messages[1:]]  # 1건 (JSON 은 단일 객체) + 2건 (배열)
+        for fmt in (wire_format.FORMAT_JSON, wire_format.FORMAT_ARRAY, wire_format.FORMAT_MSGPACK):
+            payloads = [wire_format.encode_updates(fmt, group) for group in groups]
+            text_data, bytes_data = wire_format.join_payloads(fmt, payloads)
+            expected_text, expected_bytes = wire_format.encode_updates(fmt, messages)
+            if fmt == wire_format.FORMAT_MSGPACK:
+                self.assertEqual(bytes_data, expected_bytes)
+            else:
+                self.assertEqual(json.loads(text_data), json.loads(expected_text), fmt)
+            self.assertEqual(wire_format.join_payloads(fmt, payloads[:1]), payloads[0])
+
+    def test_watchlist_batches_changed_symbols(self):
+        """
+        [Watchlist] watchlist 모드 Consumer 는 간격마다 바뀐 종목의 최신 값만 프레임 1개로 받는지 테스트
+        """
+        hub = LocalHub()
+        client = KISWebSocketClient()
+        client.channel_layer = MagicMock(group_send=AsyncMock())
+        codes = [f"{i:06d}" for i in range(1, 21)]
+        frames = []
+        consumer = StockConsumer()
+        consumer.stream_seqs = {}
+        consumer.subscribed_topics = {f"exec:{code}" for code in codes}
+        consumer.wire_format = wire_format.FORMAT_JSON
+        consumer.outbox = OutboundBuffer()
+        consumer.close = AsyncMock()
+
+        async def send(text_data=None, bytes_data=None):
+            frames.append(json.loads(text_data))
+        consumer.send = send
+
+        async def run():
+            with self.settings(WS_WATCHLIST_INTERVAL_MS=50):
+                consumer.set_mode("watchlist")
+            for code in codes:
+                await hub.subscribe(f"exec:{code}", consumer)
+            writer = asyncio.create_task(consumer._write_loop())
+            with patch("stock_price.services.kis_ws_client.local_hub", hub):
+                for i in range(10):
+                    for code in codes:
+                        tick = _sample_tick(TR_ID_EXEC, MKSC_SHRN_ISCD=code, STCK_PRPR=str(70000 + i))
+                        await client._publish(code, [("exec", tick.to_dict())])
+                    await asyncio.sleep(0.002)
+            await asyncio.sleep(0.15)
+            writer.cancel()
+
+        asyncio.run(run())
+        print(f"[TEST] Watchlist: 200 ticks for {len(codes)} symbols -> {len(frames)} frame(s)")
+        self.assertEqual(consumer.outbox.base_interval, 0.05)
+        self.assertLessEqual(len(frames), 3)
+        latest = {}
+        for frame in frames:
+            self.assertIsInstance(frame, list)
+            for message in frame:
+                latest[message["code"]] = message["data"].get("STCK_PRPR", latest.get(message["code"]))
+        self.assertEqual(set(latest), set(codes))
+        self.assertTrue(all(price == 70009.0 for price in latest.values()))
+
+        consumer.set_mode("stream")
+        self.assertEqual(consumer.outbox.interval, 0.0)
+
+    def test_watchlist_keeps_delta_continuity(self):
+        """
+        [Watchlist] 간격 동안 합쳐진 delta 가 keyframe 으로 돌아가지 않고, 클라이언트 상태에 이어서 적용되는지 테스트
+        """
+        encoder = DeltaEncoder(keyframe_interval=1000)
+        events = []
+        for i in range(9):
+            # 가격(매 틱)과 거래량(짝수 틱만)이 번갈아 바뀜 -> 중간 틱에만 있던 변경도 누적되어야 함
+            tick = _sample_tick(TR_ID_EXEC, STCK_PRPR=str(70000 + i), ACML_VOL=str(1000 + i // 2))
+            update = encoder.encode("005930", "exec", tick.to_dict())
+            events.append({"type": "stock_update", "code": "005930", "updates": [update]})
+
+        for fmt in (wire_format.FORMAT_JSON, wire_format.FORMAT_ARRAY):
+            consumer = StockConsumer()
+            consumer.stream_seqs = {}
+            consumer.wire_format = fmt
+            outbox = OutboundBuffer()
+            client_state = {}  # RealtimeStreamState.apply 와 같은 규칙으로 적용한 결과
+            keyframes = 0
+            fields = wire_format.schema_message(fmt)["fields"]["exec"] if fmt != wire_format.FORMAT_JSON else None
+            for group in (events[:1], events[1:4], events[4:]):  # 1건 / 3건 / 5건씩 합쳐서 전송
+                for event in group:
+                    outbox.put("005930", dict(event), merge_stock_events)
+                (_, item), = asyncio.run(outbox.take())
+                text_data, _ = consumer._encode_update(item)
+                message = json.loads(text_data)
+                if fmt != wire_format.FORMAT_JSON:
+                    code, stream, seq, key, values, *base = message[0]
+                    data = dict(zip(fields, values)) if key else {fields[i]: v for i, v in zip(values[::2], values[1::2])}
+                    message = {"seq": seq, "key": bool(key), "data": data, **({"base": base[0]} if base else {})}
+                if message.get("key"):
+                    keyframes += 1
+                    client_state = {"seq": message["seq"], "data": dict(message["data"])}
+                    continue
+                self.assertEqual(message.get("base", message["seq"] - 1), client_state["seq"])
+                client_state["data"].update(message["data"])
+                client_state["seq"] = message["seq"]
+            print(f"[TEST] Watchlist continuity ({fmt}): {keyframes} keyframe(s) for 3 flushes")
+            self.assertEqual(keyframes, 1)
+            latest = {
+                name: value for name, value in encoder._streams[("005930", "exec")].snapshot.items()
+                if fields is None or name in fields
+            }
+            self.assertEqual({name: client_state["data"].get(name) for name in latest}, latest)
+
+
+class ThemeAggregatorTest(SimpleTestCase):
+    @staticmethod
+    def _brute_force(aggregator):
+        """멤버십 / 종목 상태로 매번 전체 재계산한 기대값"""
+        expected = {}
+        for theme_id, aggregate in aggregator.themes.items():
+            states = {code: aggregator.stocks[code] for code in aggregate.members if code in aggregator.stocks}
+            if not states:
+                expected[theme_id] = (0, None, None, 0, 0, None)
+                continue
+            rates = [rate for rate, _ in states.values()]
+            weight = sum(w for _, w in states.values())
+            avg = sum(rates) / len(rates)
+            wavg = sum(rate * w for rate, w in states.values()) / weight if weight else avg
+            leader_rate = max(rates)
+            expected[theme_id] = (len(rates), round(avg, 2), round(wavg, 2),
+                                  sum(r > 0 for r in rates), sum(r < 0 for r in rates), leader_rate)
+        return expected
+
+    def test_incremental_matches_recompute(self):
+        """
+        [ThemeAgg] 체결 틱 / 멤버 편입·제외를 증분 반영한 테마 집계가 전체 재계산 결과와 같은지 테스트
+        """
+        rng = random.Random(7)
+        codes = [f"{i:06d}" for i in range(1, 31)]
+        aggregator = ThemeAggregator()
+        aggregator.load("2026-10-17", [(theme_id, f"테마{theme_id}", code)
+                                       for theme_id in range(1, 6) for code in rng.sample(codes, 8)])
+        for step in range(2000):
+            code = rng.choice(codes)
+            rate = round(rng.uniform(-10, 30), 2)
+            value = rng.randint(0, 10) * 1e8
+            aggregator.add(_sample_tick(TR_ID_EXEC, MKSC_SHRN_ISCD=code, PRDY_CTRT=str(rate), ACML_TR_PBMN=str(value)))
+            if step % 97 == 0:
+                aggregator.add_member(rng.randint(1, 6), rng.choice(codes), "신규")
+            if step % 131 == 0:
+                theme_id = rng.randint(1, 5)
+                aggregator.remove_member(theme_id, rng.choice(sorted(aggregator.themes[theme_id].members)))
+
+        expected = self._brute_force(aggregator)
+        for theme_id, row in aggregator.snapshot().items():
+            self.assertEqual((row["count"], row["avg"], row["wavg"], row["up"], row["down"]), expected[theme_id][:5])
+            if row["count"]:
+                self.assertEqual(aggregator.stocks[row["leader"]][0], expected[theme_id][5])
+                self.assertIn(row["leader"], aggregator.themes[theme_id].members)
+
+        # 바뀐 테마만 전송, 새 테마 이름은 처음 한 번만
+        message = aggregator.drain()
+        self.assertEqual(message["type"], "theme_update")
+        self.assertEqual({row[0] for row in message["aggregates"]}, set(aggregator.themes))
+        self.assertIsNone(aggregator.drain())
+        member = next(iter(aggregator.themes[1].members))
+        aggregator.add(_sample_tick(TR_ID_EXEC, MKSC_SHRN_ISCD=member, PRDY_CTRT="99.0"))
+        message = aggregator.drain()
+        self.assertNotIn("names", message)
+        self.assertTrue(all(member in aggregator.themes[row[0]].members for row in message["aggregates"]))
+        self.assertIn([1, member], [[row[0], row[6]] for row in message["aggregates"]])
+
+        # 전체 재적재 시에도 틱으로 받은 등락률은 유지
+        aggregator.load("2026-10-17", [(9, "재분석", member)])
+        self.assertEqual(aggregator.snapshot()[9]["leader_rate"], 99.0)
+
+        # 거래대금 필드 전에 잘린 레코드는 가중치 0 으로 반영
+        tick = _sample_tick(TR_ID_EXEC, MKSC_SHRN_ISCD=member, PRDY_CTRT="-3.5")
+        short = tick.fields[:DECODERS[TR_ID_EXEC].index['ACML_TR_PBMN']]
+        aggregator.add(KISTick(TR_ID_EXEC, member, short))
+        self.assertEqual(aggregator.stocks[member], (-3.5, 0.0))
+        self.assertEqual(aggregator.snapshot()[9]["leader_rate"], -3.5)
+
+    def test_tick_cost(self):
+        """
+        [ThemeAgg] 체결 1건 반영 비용 (테마에 속하지 않은 종목은 상태만 기록)
+        """
+        aggregator = ThemeAggregator()
+        aggregator.load("2026-10-17", [(theme_id, "", f"{code:06d}") for theme_id in range(20) for code in range(40)])
+        ticks = [_sample_tick(TR_ID_EXEC, MKSC_SHRN_ISCD=f"{i % 40:06d}", PRDY_CTRT=str(i % 300 / 10))
+                 for i in range(10000)]
+        started = time.perf_counter()
+        for tick in ticks:
+            aggregator.add(tick)
+        per_tick = (time.perf_counter() - started) / len(ticks)
+        print(f"[TEST] Theme aggregate update {per_tick * 1e6:.2f}us/tick (20 themes x 40 stocks)")
+        self.assertLess(per_tick, 200e-6)
+
+    def test_members_event_and_broadcast(self):
+        """
+        [ThemeAgg] 멤버 변경 메시지 반영 후 집계 루프가 바뀐 테마를 theme_global 로 보내고 Consumer 가 그대로 전달하는지 테스트
+        """
+        aggregator = ThemeAggregator()
+        aggregator.load("2026-10-17", [(1, "반도체", "005930")])
+        self.assertFalse(aggregator.needs_reload({"date": "2026-10-17", "added": []}))
+        self.assertTrue(aggregator.needs_reload({"date": "2026-10-18", "added": []}))
+        aggregator.apply_members({"date": "2026-10-17", "added": [(1, "반도체", "000660"), (2, "AI", "000660")]})
+        aggregator.add(_sample_tick(TR_ID_EXEC, MKSC_SHRN_ISCD="000660", PRDY_CTRT="5.5"))
+        aggregator.apply_members({"date": "2026-10-17", "removed": [(2, "000660")]})
+        self.assertEqual(aggregator.snapshot()[2]["count"], 0)
+        self.assertEqual(aggregator.snapshot()[1]["leader"], "000660")
+
+        channel_layer = MagicMock(group_send=AsyncMock())
+
+        async def run():
+            with patch("stock_price.services.theme_aggregates.load_members", return_value=("2026-10-17", [(1, "반도체", "005930")])), \
+                    patch.object(aggregator, "_members_loop", AsyncMock()):
+                task = asyncio.create_task(aggregator._run(channel_layer, 0.01))
+                await asyncio.sleep(0.05)
+                task.cancel()
+
+        asyncio.run(run())
+        group, event = channel_layer.group_send.call_args_list[0].args
+        self.assertEqual(group, "theme_global")
+        consumer = StockConsumer()
+        consumer.theme_aggregates = True
+        consumer.send = AsyncMock()
+        asyncio.run(consumer.theme_update(event))
+        sent = json.loads(consumer.send.call_args.kwargs["text_data"])
+        self.assertEqual(sent["type"], "theme_update")
+        self.assertEqual(sent["aggregates"][0][:2], [1, 0])
+        self.assertEqual(sent["names"], {"1": "반도체"})
+
+    def test_aggregates_only_to_opted_in_consumers(self):
+        """
+        [ThemeAgg] 테마 집계는 opt-in 한 연결에만 송신 버퍼를 거쳐 가고, 밀리면 테마별 최신 행으로 합쳐지는지 테스트
+        """
+        def event(rows, names=None):
+            message = {"type": "theme_update", "aggregates": rows, **({"names": names} if names else {})}
+            return {**message, "text": json.dumps(message)}
+
+        consumers = []
+        for opted_in in (True, False):
+            consumer = StockConsumer()
+            consumer.outbox = OutboundBuffer()
+            consumer.theme_aggregates = opted_in
+            consumers.append(consumer)
+
+        async def run():
+            for consumer in consumers:
+                await consumer.theme_update(event([[1, 1, 1.0, 1.0, 1, 0, "005930", 1.0]], {1: "반도체"}))
+                await consumer.theme_update(event([[2, 1, -1.0, -1.0, 0, 1, "000660", -1.0], [1, 2, 2.0, 2.0, 2, 0, "005930", 3.0]]))
+                await consumer.theme_update({"type": "theme_update", "data": {"reload": True}})
+            return [await consumer.outbox.take() for consumer in consumers]
+
+        opted_in, opted_out = asyncio.run(run())
+        self.assertEqual([key for key, _ in opted_out], [("theme", "sync")])  # 테마 구성 변경 알림은 모든 연결에
+        merged = dict(opted_in)[("theme", "aggregates")]
+        sent = json.loads(StockConsumer._theme_text(merged))
+        self.assertEqual(sorted(sent["aggregates"]), [[1, 2, 2.0, 2.0, 2, 0, "005930", 3.0], [2, 1, -1.0, -1.0, 0, 1, "000660", -1.0]])
+        self.assertEqual(sent["names"], {"1": "반도체"})
+
+    def test_members_group_refreshed_and_started_once_by_feed_owner(self):
+        """
+        [ThemeAgg] 멤버 변경 그룹 가입을 주기적으로 갱신하고, 집계는 세션 연결이 아니라 피드를 가진 풀에서 1회만 시작되는지 테스트
+        """
+        aggregator = ThemeAggregator()
+        aggregator.members_refresh_sec = 0.01
+        channel_layer = MagicMock(new_channel=AsyncMock(return_value="theme-channel"), group_add=AsyncMock())
+
+        async def receive(channel):
+            await asyncio.Event().wait()
+        channel_layer.receive = receive
+
+        async def run():
+            task = asyncio.create_task(aggregator._members_loop(channel_layer))
+            await asyncio.sleep(0.05)
+            task.cancel()
+
+        asyncio.run(run())
+        print(f"[TEST] theme_members group_add calls: {channel_layer.group_add.await_count}")
+        self.assertGreaterEqual(channel_layer.group_add.await_count, 3)
+        self.assertTrue(all(call.args == ("theme_members", "theme-channel") for call in channel_layer.group_add.await_args_list))
+
+        sessions = [MagicMock(channel_layer="layer", slots=MagicMock(has_room=MagicMock(return_value=True)),
+                              reserve=MagicMock(return_value=[])) for _ in range(2)]
+        pool = KISSessionPool(sessions)
+        with patch("stock_price.services.kis_session_pool.theme_aggregates") as aggregates:
+            asyncio.run(pool.subscribe_many([("005930", ("exec",)), ("000660", ("exec",))]))
+        aggregates.start.assert_called_once_with("layer")
+
+
+class BatchSubscribeTest(SimpleTestCase):
+    def _client(self, rate, burst, capacity=200):
+        client = KISWebSocketClient()
+        client.slots = KISSlotManager(capacity=capacity)
+        client.pacer = TokenBucket(rate, burst)
+        client.ws = MagicMock(send=AsyncMock())
+        client.connected = True
+        client.running = True
+        client.approval_key = "key"
+        return client
+
+    def test_token_bucket(self):
+        """
+        [Pacer] 토큰 버킷이 burst 개까지는 바로, 이후에는 rate 간격으로 대기 시간을 주는지 테스트
+        """
+        now = [0.0]
+        bucket = TokenBucket(10, burst=3, clock=lambda: now[0])
+        self.assertEqual([bucket.take() for _ in range(3)], [0.0] * 3)
+        self.assertAlmostEqual(bucket.take(), 0.1)
+        self.assertAlmostEqual(bucket.take(), 0.2)
+        now[0] = 1.0  # 1초 동안 10개 충전되지만 burst(3) 까지만 쌓임
+        self.assertEqual([bucket.take() for _ in range(3)], [0.0] * 3)
+        self.assertGreater(bucket.take(), 0)
+        self.assertEqual(TokenBucket(0).take(), 0.0)
+
+    def test_batch_is_paced_and_does_not_block_other_subscribers(self):
+        """
+        [Pacer] 40종목 일괄 구독은 패킷을 토큰 버킷 속도로 보낸 뒤 한 번에 끝나고, 그 사이 다른 구독은 기다리지 않는지 테스트
+        """
+        client = self._client(rate=400, burst=10)
+        codes = [f"{i:06d}" for i in range(40)]
+        sent_at = []
+
+        async def send(packet):
+            sent_at.append(time.perf_counter())
+        client.ws.send = send
+
+        async def run():
+            await client.subscribe("999999", ("exec",))
+            started = time.perf_counter()
+            batch = asyncio.create_task(client.subscribe_many([(code, ("exec",)) for code in codes]))
+            await asyncio.sleep(0)
+            # 이미 등록된 종목의 추가 시청자는 일괄 구독이 전송 중이어도 바로 끝남 (전역 락 없음)
+            other_started = time.perf_counter()
+            await client.subscribe("999999", ("exec",))
+            other_time = time.perf_counter() - other_started
+            await batch
+            return time.perf_counter() - started, other_time
+
+        batch_time, other_time = asyncio.run(run())
+        print(f"[TEST] Batch subscribe 40 codes {batch_time * 1000:.0f}ms (pacer waited {client.pacer.waited * 1000:.0f}ms) | "
+              f"concurrent subscribe {other_time * 1000:.2f}ms")
+        self.assertEqual(len(sent_at), 41)
+        self.assertGreaterEqual(batch_time, (41 - 10) / 400 * 0.8)
+        self.assertLess(other_time, 0.01)
+        self.assertEqual(client.slots.watchers((TR_ID_EXEC, "999999")), 2)
+        self.assertEqual(client.slot_usage()["used"], 41)
+
+    def test_in_flight_packet_is_dropped_after_reconnect(self):
+        """
+        [Pacer] pacer 대기 중이던 등록 패킷은 그 사이 재연결되면 새 세션으로 보내지 않고 미전송(False)으로 끝나는지 테스트
+        """
+        client = self._client(rate=20, burst=1)
+        old_ws = client.ws
+
+        async def run():
+            pending = client._queue_registrations([(TR_ID_EXEC, "005930"), (TR_ID_EXEC, "000660")])
+            await asyncio.sleep(0.01)  # 첫 패킷은 바로 전송, 두 번째는 pacer 대기 중
+            client.ws = MagicMock(send=AsyncMock())
+            await client._resubscribe_all()
+            return await asyncio.gather(*pending)
+
+        self.assertEqual(asyncio.run(run()), [True, False])
+        self.assertEqual(old_ws.send.await_count, 1)
+        client.ws.send.assert_not_awaited()
+
+    def test_pool_batch_spreads_codes_and_ingest_sends_one_intent(self):
+        """
+        [Pacer] 세션 풀 일괄 구독은 앞 종목 예약을 반영해 세션을 배정하고, ingest 워커는 intent 1건만 보내는지 테스트
+        """
+        sessions = [self._client(rate=0, burst=1, capacity=4) for _ in range(2)]
+        for i, session in enumerate(sessions):
+            session.name = f"kis-{i}"
+        pool = KISSessionPool(sessions)
+        with patch("stock_price.services.kis_session_pool.theme_aggregates"):
+            asyncio.run(pool.subscribe_many([(code, ALL_STREAMS) for code in ("000001", "000002", "000003", "000004")]))
+        self.assertEqual([u["used"] for u in pool.slot_usage()["by_session"].values()], [4, 4])
+        self.assertEqual(sum(session.slots.evicted for session in sessions), 0)
+
+        worker = IngestIntentClient(heartbeat_sec=60)
+        worker._send = AsyncMock()
+        worker._ensure_heartbeat = MagicMock()
+        asyncio.run(worker.subscribe_many([("005930", ("exec",)), ("000660", ALL_STREAMS)]))
+        worker._send.assert_awaited_once_with(
+            {"type": "ingest.subscribe", "topics": ["exec:005930", "exec:000660", "book:000660"]})
+
+    def test_ingest_intents_not_blocked_by_pacing(self):
+        """
+        [Pacer] ingest 서버는 등록 패킷 전송(토큰 버킷)을 기다리지 않고 다음 워커 intent / heartbeat 를 바로 처리하는지 테스트
+        """
+        session = self._client(rate=20, burst=1)
+        sent = []
+
+        async def send(packet):
+            sent.append(json.loads(packet)["body"]["input"]["tr_key"])
+        session.ws.send = send
+        pool = KISSessionPool([session])
+        server = IngestServer(pool)
+        codes = [f"{i:06d}" for i in range(10)]
+
+        async def run():
+            started = time.perf_counter()
+            await server.apply({"type": "ingest.subscribe", "topics": [f"exec:{code}" for code in codes], "worker": "a:1"})
+            await server.apply({"type": "ingest.heartbeat", "topics": ["exec:999999"], "worker": "b:1"})
+            applied = time.perf_counter() - started
+            await asyncio.sleep(0.6)
+            session._registration_task.cancel()
+            return applied
+
+        with patch("stock_price.services.kis_session_pool.theme_aggregates"):
+            applied = asyncio.run(run())
+        print(f"[TEST] 2 intents applied in {applied * 1000:.1f}ms, {len(sent)} packets sent after pacing")
+        self.assertLess(applied, 0.1)  # 11개 패킷을 초당 20개로 보내면 0.5초
+        self.assertEqual(server.refs.workers(), 2)
+        self.assertEqual(session.slots.watchers((TR_ID_EXEC, "999999")), 1)
+        self.assertEqual(sent, codes + ["999999"])
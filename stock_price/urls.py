@@ -13,4 +13,8 @@ urlpatterns = [
     path('stock/detail/', views.StockDetailView.as_view(), name='stock_detail_default'),
     path('stock/detail/<str:stock_code>/', views.StockDetailView.as_view(), name='stock_detail'),
     path('stock/ranking/', views.StockRankingView.as_view(), name='stock_ranking'),
+    path('stock/realtime/slots/', views.StockRealtimeSlotView.as_view(), name='stock_realtime_slots'),
+    path('stock/realtime/latency/', views.StockLatencyView.as_view(), name='stock_realtime_latency'),
+    path('stock/realtime/orderbook/<str:stock_code>/', views.StockOrderBookView.as_view(), name='stock_orderbook'),
+    path('stock/realtime/candles/<str:stock_code>/', views.StockCandleView.as_view(), name='stock_candles'),
 ]
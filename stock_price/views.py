@@ -3,8 +3,14 @@ import asyncio
 import json
 # from auth.kis_auth import get_current_price
 from .services import kis_rest_client
+from .services.kis_ingest import realtime_feed
+from .services.order_book import order_books
+from .services.candle_aggregator import candles
+from .services.latency import latency
+from .services import metrics
 from django.views.generic import TemplateView, View
 from django.template.response import TemplateResponse
+from django.http import JsonResponse, HttpResponse
 
 class StockRealtimeView(TemplateView):
     template_name = "stock_realtime.html"
@@ -64,3 +70,71 @@ class StockRankingView(View):
         }
 
         return TemplateResponse(request, self.template_name, context)
+
+
+class StockRealtimeSlotView(View):
+    """KIS 실시간 등록 슬롯 사용 현황 (이 프로세스의 KIS 웹소켓 세션 기준)"""
+
+    def get(self, request, *args, **kwargs):
+        return JsonResponse(realtime_feed().slot_usage())
+
+
+class StockLatencyView(View):
+    """
+    실시간 경로 구간별 지연 히스토그램 (이 프로세스 기준, ms)
+    decode / publish 는 KIS 세션을 가진 프로세스, send 는 Consumer 가 있는 웹 워커에서 집계됨
+    ?reset=1 이면 조회 후 초기화
+    """
+
+    def get(self, request, *args, **kwargs):
+        snapshot = latency.snapshot()
+        if request.GET.get('reset'):
+            latency.reset()
+        return JsonResponse({"unit": "ms", "stages": snapshot})
+
+
+class MetricsView(View):
+    """
+    Prometheus 스크레이프용 지표 (이 프로세스 기준, text exposition format)
+    METRICS_ALLOWED_IPS 의 주소 또는 staff 로그인 사용자만 조회 가능 (그 외 403)
+    """
+
+    def get(self, request, *args, **kwargs):
+        user = getattr(request, 'user', None)
+        if not metrics.is_allowed(request.META.get('REMOTE_ADDR')) and not (user and user.is_staff):
+            return HttpResponse("Forbidden", status=403, content_type="text/plain")
+        return HttpResponse(metrics.registry.render(), content_type=metrics.CONTENT_TYPE)
+
+
+class StockOrderBookView(View):
+    """
+    10단계 호가창 스냅샷 + 스프레드/중간가/잔량 불균형
+    KIS 세션을 가진 프로세스는 메모리에서, 그 외(ingest 모드 웹 워커)는 캐시에 기록된 스냅샷에서 조회
+    """
+
+    def get(self, request, stock_code, *args, **kwargs):
+        snapshot = order_books.snapshot(stock_code)
+        if snapshot is None:
+            return JsonResponse({"code": stock_code, "error": "no order book"}, status=404)
+        return JsonResponse(snapshot)
+
+
+class StockCandleView(View):
+    """
+    당일 분봉/초봉 시계열 (KIS 세션을 가진 프로세스는 메모리에서, 그 외는 캐시에 기록된 봉에서 조회)
+    ?interval=1s|1m|5m (기본 1m), ?limit=N (최근 N개, 마지막 봉은 진행 중)
+    """
+
+    def get(self, request, stock_code, *args, **kwargs):
+        interval = request.GET.get('interval', '1m')
+        if interval not in candles.intervals:
+            return JsonResponse({"error": f"interval must be one of {', '.join(candles.intervals)}"}, status=400)
+        try:
+            limit = int(request.GET['limit']) if 'limit' in request.GET else None
+        except ValueError:
+            return JsonResponse({"error": "limit must be an integer"}, status=400)
+
+        bars = candles.bars(stock_code, interval, limit)
+        if bars is None:
+            return JsonResponse({"code": stock_code, "error": "no candles"}, status=404)
+        return JsonResponse({"code": stock_code, "interval": interval, "bars": bars})
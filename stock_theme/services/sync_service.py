@@ -1,8 +1,11 @@
+import json
 import logging
 from django.core.cache import cache
 from .analyze_service import ThemeAnalyzeService
 from stock_theme.models import Theme, ThemeStock
 from stock_price.models import StockInfo
+from stock_price.services import metrics
+from stock_price.services.theme_aggregates import THEME_MEMBERS_GROUP
 
 logger = logging.getLogger(__name__)
 
@@ -24,6 +27,27 @@ class ThemeSyncService:
             return set()
         return cached_data
 
+    @staticmethod
+    def _theme_event(data):
+        """theme_global 브로드캐스트 이벤트 (Consumer 가 그대로 전달할 JSON 텍스트를 미리 인코딩)"""
+        message = {"type": "theme_update", "data": data}
+        return {**message, "text": json.dumps(message)}
+
+    @staticmethod
+    def _members_event(today, codes=None):
+        """
+        테마 집계(theme_aggregates) 에 보낼 멤버 변경 이벤트
+        codes 가 없으면 전체 재적재(reload), 있으면 그 종목들의 오늘자 편입 (테마 id, 테마명, 종목코드) 만 전달
+        """
+        event = {"type": "theme.members", "date": str(today)}
+        if codes is None:
+            event["reload"] = True
+        else:
+            event["added"] = list(ThemeStock.objects.filter(
+                theme__date=today, stock__short_code__in=codes
+            ).values_list('theme_id', 'theme__name', 'stock__short_code'))
+        return event
+
     def _update_cached_top30(self, stock_codes_list):
         """새로운 Top 30 리스트로 캐시를 갱신한다."""
         cache.set(self.CACHE_KEY_TOP30, set(stock_codes_list), self.CACHE_TIMEOUT)
@@ -72,13 +96,12 @@ class ThemeSyncService:
             # Broadcast Refresh
             from channels.layers import get_channel_layer
             channel_layer = get_channel_layer()
-            await channel_layer.group_send(
-                "theme_global",
-                {
-                    "type": "theme_update",
-                    "data": {"message": "Full theme analysis completed", "new_stocks": []}
-                }
+            await metrics.group_send(
+                channel_layer, "theme_global",
+                self._theme_event({"message": "Full theme analysis completed", "new_stocks": []})
             )
+            # 테마가 통째로 바뀌었으므로 집계는 멤버십 전체 재적재
+            await metrics.group_send(channel_layer, THEME_MEMBERS_GROUP, self._members_event(today))
             return list(all_current_codes)
 
         logger.info(f"[ThemeSync] New entrants detected: {new_entrants_codes}")
@@ -115,15 +138,15 @@ class ThemeSyncService:
             from channels.layers import get_channel_layer
             channel_layer = get_channel_layer()
             
-            await channel_layer.group_send(
-                "theme_global",
-                {
-                    "type": "theme_update",
-                    "data": {
-                        "message": "New theme data available",
-                        "new_stocks": processed_stocks
-                    }
-                }
+            await metrics.group_send(
+                channel_layer, "theme_global",
+                self._theme_event({
+                    "message": "New theme data available",
+                    "new_stocks": processed_stocks
+                })
             )
+            # 새로 편입된 종목만 집계에 반영 (전체 재계산 없이 해당 종목 기여분만 더함)
+            members_event = await sync_to_async(self._members_event)(today, processed_stocks)
+            await metrics.group_send(channel_layer, THEME_MEMBERS_GROUP, members_event)
             
         return processed_stocks
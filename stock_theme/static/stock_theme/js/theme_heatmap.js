@@ -109,38 +109,65 @@ document.addEventListener('DOMContentLoaded', () => {
         const protocol = window.location.protocol === 'https:' ? 'wss:' : 'ws:';
         const wsUrl = `${protocol}//${window.location.host}/ws/stock/`;
         const socket = new WebSocket(wsUrl);
+        socket.binaryType = 'arraybuffer';  // msgpack 프레임을 ArrayBuffer 로 받아 RealtimeStreamState 가 디코딩
+
+        const streamState = new RealtimeStreamState();
 
         socket.onopen = function (e) {
             console.log("[WS] Connected");
             if (targetStockCodes.length > 0) {
-                targetStockCodes.forEach(code => {
-                    socket.send(JSON.stringify({ 'type': 'subscribe', 'code': code }));
-                });
+                // 종목 수가 많으므로 compact(msgpack 위치 배열) 포맷 + 히트맵 필드 프로필(등락률/거래량 등) 요청
+                // 서버에 msgpack 이 없으면 array(JSON 텍스트) 로 협상되어도 같은 decode 경로로 처리됨
+                // 히트맵은 호가를 그리지 않으므로 체결 토픽만 구독 (KIS 호가 등록 슬롯도 사용하지 않음)
+                // watchlist 모드: 틱마다가 아니라 일정 간격으로 바뀐 종목만 프레임 1개로 받음
+                const topics = targetStockCodes.map(code => `exec:${code}`);
+                // theme_aggregates: 테마별 등락률 집계(theme_update aggregates) 수신 opt-in
+                socket.send(JSON.stringify({ 'type': 'subscribe', 'data': { 'topics': topics, 'format': 'msgpack', 'profile': 'heatmap', 'mode': 'watchlist', 'theme_aggregates': true } }));
             }
         };
 
         socket.onmessage = function (e) {
-            const data = JSON.parse(e.data);
-            if (data.type === 'stock_update') {
-                updateStockBlock(data.data);
-            } else if (data.type === 'theme_update') {
-                console.log("[WS] Theme Update Received! Reloading...", data);
-                // Simple sync strategy: Reload page to fetch new structure
-                // Use a short delay or toast in future
-                window.location.reload();
-            }
+            streamState.decode(e.data).forEach(msg => {
+                if (msg.type === 'stock_update') {
+                    // 체결 스트림만 구독 (delta 병합 후 렌더링)
+                    const data = streamState.apply(msg);
+                    if (data && msg.stream === 'exec') updateStockBlock(msg.code, data);
+                } else if (msg.type === 'theme_update' && msg.aggregates) {
+                    // 서버가 체결 틱으로 증분 집계한 테마 지표 (바뀐 테마만)
+                    msg.aggregates.forEach(updateThemeStats);
+                } else if (msg.type === 'theme_update') {
+                    console.log("[WS] Theme Update Received! Reloading...", msg);
+                    // Simple sync strategy: Reload page to fetch new structure
+                    // Use a short delay or toast in future
+                    window.location.reload();
+                }
+            });
         };
     } else {
         console.log("[WS] Market is Closed. WebSocket connection skipped.");
     }
 
-    function updateStockBlock(data) {
-        const code = data.stock_code;
-        const priceData = data.output;
-        if (!priceData) return;
+    function updateThemeStats(row) {
+        // [id, count, avg, wavg, up, down, leader, leader_rate] (theme_aggregates.AGGREGATE_FIELDS)
+        const [id, count, avg, wavg, up, down, leader] = row;
+        const el = document.getElementById(`theme-stats-${id}`);
+        if (!el) return;
+        if (!count) {
+            el.textContent = '';
+            return;
+        }
+        const leaderBlock = document.querySelector(`.stock-block[data-code="${leader}"]`);
+        const leaderName = leaderBlock ? leaderBlock.dataset.name : leader;
+        el.textContent = `${wavg > 0 ? '+' : ''}${wavg.toFixed(2)}% (평균 ${avg > 0 ? '+' : ''}${avg.toFixed(2)}%) · ▲${up} ▼${down} · ${leaderName}`;
+        el.classList.toggle('up', wavg > 0);
+        el.classList.toggle('down', wavg < 0);
+    }
+
+    function updateStockBlock(code, data) {
+        if (data.PRDY_CTRT === undefined || data.PRDY_CTRT === null) return;
 
-        const rate = parseFloat(priceData.prdy_ctrt);
-        const volume = parseInt(priceData.acml_vol);
+        const rate = parseFloat(data.PRDY_CTRT);
+        const volume = parseInt(data.ACML_VOL);
 
         document.querySelectorAll(`#rate-${code}`).forEach(el => {
             el.textContent = `${rate > 0 ? '+' : ''}${rate}%`;
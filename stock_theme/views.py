@@ -8,6 +8,7 @@ import asyncio
 from django.db.models import Count
 
 from stock_price.services.kis_rest_client import kis_rest_client
+from stock_price.services.last_value_cache import lvc
 from stock_price.utils import is_market_open, is_market_open_async
 
 import time
@@ -101,21 +102,25 @@ class ThemeHeatmapView(View):
         latest_themes, stock_codes = await get_theme_data()
         logger.info(f"[ThemeHeatmapView] DB Fetch took {time.time() - step1_start:.4f}s")
         
-        # 3. Parallel Execution: Rank API + All Theme Stocks Price API + Market Status
+        # 3. Last Value Cache: 실시간 수집 중인 종목은 REST 조회 없이 마지막 체결 스냅샷 사용
+        lvc_prices = await self._lvc_prices(stock_codes)
+        missing_codes = [code for code in stock_codes if code not in lvc_prices]
+
+        # 4. Parallel Execution: Rank API + (LVC 에 없는) Theme Stocks Price API + Market Status
         step2_start = time.time()
         
         task_rank = asyncio.create_task(kis_rest_client.get_fluctuation_rank())
-        task_prices = asyncio.create_task(kis_rest_client.fetch_prices_batch(list(stock_codes)))
+        task_prices = asyncio.create_task(kis_rest_client.fetch_prices_batch(missing_codes))
         task_market = asyncio.create_task(is_market_open_async())
         
         rank_data, batch_prices, is_open = await asyncio.gather(task_rank, task_prices, task_market)
-        logger.info(f"[ThemeHeatmapView] Parallel API Fetch (Rank + {len(stock_codes)} Stocks + MarketStatus) took {time.time() - step2_start:.4f}s")
+        logger.info(f"[ThemeHeatmapView] Parallel API Fetch (Rank + {len(missing_codes)} Stocks + MarketStatus, LVC hit {len(lvc_prices)}) took {time.time() - step2_start:.4f}s")
         
-        # 4. Merge Data
+        # 5. Merge Data
         top_30_list = []
         initial_price_data = {}
         
-        # 4-1. Process Rank Data (For Top 30 List + identifying overlapping stocks)
+        # 5-1. Process Rank Data (For Top 30 List + identifying overlapping stocks)
         if rank_data:
             for item in rank_data:
                 code = item.get('stck_shrt_cd') or item.get('STCK_SHRT_CD') or item.get('stck_shrn_iscd') or item.get('STCK_SHRN_ISCD')
@@ -139,7 +144,7 @@ class ThemeHeatmapView(View):
                             'volume': '0' # Rank API might not give volume in same format, or we ignore
                         }
         
-        # 4-2. Process Batch Price Data (Fill in the rest or overwrite)
+        # 5-2. Process Batch Price Data (Fill in the rest or overwrite)
         if batch_prices:
             for code, data in batch_prices.items():
                 # If we prefer the dedicated price API data (usually more detailed), execute this:
@@ -152,7 +157,10 @@ class ThemeHeatmapView(View):
                     'volume': data.get('acml_vol', '0'),
                 }
 
-        # 5. Build Context & Return Response
+        # 5-3. LVC 스냅샷 (실시간 체결 기준이므로 가장 최신)
+        initial_price_data.update(lvc_prices)
+
+        # 6. Build Context & Return Response
         context = {
             'themes': latest_themes,
             'is_market_open': is_open,
@@ -163,3 +171,24 @@ class ThemeHeatmapView(View):
         
         logger.info(f"[ThemeHeatmapView] Total Execution took {time.time() - start_total:.4f}s")
         return TemplateResponse(request, self.template_name, context)
+
+    @staticmethod
+    async def _lvc_prices(stock_codes):
+        """Last Value Cache 의 체결 스냅샷을 initial_price_data 형식으로 변환"""
+        try:
+            snapshots = await asyncio.to_thread(lvc.snapshots, list(stock_codes))
+        except Exception as e:
+            logger.warning(f"[ThemeHeatmapView] LVC lookup failed: {e}")
+            return {}
+
+        prices = {}
+        for code, streams in snapshots.items():
+            data = (streams.get('exec') or {}).get('data') or {}
+            if data.get('STCK_PRPR') is None:
+                continue
+            prices[code] = {
+                'rate': f"{data.get('PRDY_CTRT') or 0:.2f}",
+                'current_price': f"{data['STCK_PRPR']:.0f}",
+                'volume': f"{data.get('ACML_VOL') or 0:.0f}",
+            }
+        return prices